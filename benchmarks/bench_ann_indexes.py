@@ -0,0 +1,79 @@
+"""Recall@k and query latency of IVF/HNSW indexes against the exact Flat index.
+
+    python -m benchmarks.bench_ann_indexes --vectors 100000 --dim 384
+
+Uses clustered synthetic embeddings (documents tend to cluster by topic) and
+the same FaissStore.optimize() path that ingestion uses to convert indexes.
+"""
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks.common import print_table, summarize, timed
+from ragapp.utils.rag import FaissStore
+
+
+def clustered_vectors(n, dim, clusters=200, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype('float32')
+    labels = rng.integers(0, clusters, n)
+    return (centers[labels] + 0.35 * rng.standard_normal((n, dim))).astype('float32')
+
+
+def build(vectors, index_type):
+    store = FaissStore(dim=vectors.shape[1])
+    store.add(vectors, [{'page': 0, 'text': ''}] * len(vectors))
+    return store.optimize(index_type)
+
+
+def search_all(store, queries, k, **knobs):
+    params = store._search_params(**knobs)
+    ids = []
+    latencies = []
+    for q in queries:
+        start = time.perf_counter()
+        if params is None:
+            _, found = store.index.search(q[None, :], k)
+        else:
+            _, found = store.index.search(q[None, :], k, params=params)
+        latencies.append(time.perf_counter() - start)
+        ids.append(found[0])
+    return np.array(ids), latencies
+
+
+def recall(found, truth):
+    k = truth.shape[1]
+    return float(np.mean([len(set(f) & set(t)) / k for f, t in zip(found, truth)]))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--vectors', type=int, default=100000)
+    parser.add_argument('--dim', type=int, default=384)
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--k', type=int, default=10)
+    args = parser.parse_args()
+
+    vectors = clustered_vectors(args.vectors, args.dim)
+    queries = clustered_vectors(args.queries, args.dim, seed=1)
+
+    flat, flat_build = timed(build, vectors, 'flat')
+    truth, flat_lat = search_all(flat, queries, args.k)
+    rows = [('flat (exact)', {'build_s': flat_build, 'recall': 1.0, **summarize(flat_lat)})]
+
+    ivf, ivf_build = timed(build, vectors, 'ivf')
+    for nprobe in (1, 4, 16, 64):
+        found, lat = search_all(ivf, queries, args.k, nprobe=nprobe)
+        rows.append((f"ivf nprobe={nprobe}", {'build_s': ivf_build, 'recall': recall(found, truth), **summarize(lat)}))
+
+    hnsw, hnsw_build = timed(build, vectors, 'hnsw')
+    for ef in (16, 64, 256):
+        found, lat = search_all(hnsw, queries, args.k, ef_search=ef)
+        rows.append((f"hnsw efSearch={ef}", {'build_s': hnsw_build, 'recall': recall(found, truth), **summarize(lat)}))
+
+    print_table(f"recall@{args.k} vs latency, {args.vectors} x {args.dim}", rows)
+
+
+if __name__ == '__main__':
+    main()
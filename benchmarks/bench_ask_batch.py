@@ -0,0 +1,76 @@
+"""Answering many questions about one document: sequential /ask/-style calls vs the batch path.
+
+    python -m benchmarks.bench_ask_batch --questions 50 --chunks 5000
+
+Runs against a local stub of the OpenAI API. Sequential mode does what an
+evaluation job looping over /ask/ does (embed, search, answer per question);
+batch mode uses retrieve_contexts (one embedding call, one matrix search) and
+ask_llm_batch. Query and answer caches are off so both modes do the same work.
+"""
+import argparse
+import os
+import random
+
+import numpy as np
+
+from benchmarks.common import print_table, timed
+from ragapp.test_support import StubEmbeddingServer, fake_vector
+from benchmarks.synthetic import paragraph
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--questions', type=int, default=50)
+    parser.add_argument('--chunks', type=int, default=5000)
+    parser.add_argument('--embed-latency', type=float, default=0.05)
+    parser.add_argument('--llm-latency', type=float, default=0.5)
+    parser.add_argument('--concurrency', type=int, default=8)
+    args = parser.parse_args()
+
+    with StubEmbeddingServer(latency=args.embed_latency, chat_latency=args.llm_latency) as stub:
+        os.environ['OPENAI_API_KEY'] = 'stub'
+        os.environ['OPENAI_BASE_URL'] = stub.base_url
+        from ragapp.utils import rag
+        from ragapp.utils.bm25 import BM25Index
+
+        rag.QUERY_EMBEDDING_CACHE_SIZE = 0
+        rag.ANSWER_CACHE_ENABLED = False
+
+        rng = random.Random(0)
+        texts = [f"Clause {i}. {paragraph(rng, 3)}" for i in range(args.chunks)]
+        store = rag.FaissStore(dim=stub.dim)
+        store.add(np.vstack([fake_vector(t, stub.dim) for t in texts]),
+                  [{'page': i // 5 + 1, 'text': t, 'chunk_id': i + 1} for i, t in enumerate(texts)])
+        store.bm25 = BM25Index.build(texts)
+        store.optimize()
+        questions = [f"What does clause {rng.randrange(args.chunks)} say about payment?" for _ in range(args.questions)]
+
+        def sequential():
+            answers = []
+            for question in questions:
+                context, citations = rag.retrieve_context(store, question, top_k=5)
+                answers.append(rag.ask_llm(question, context))
+            return answers
+
+        def batch():
+            retrieved = rag.retrieve_contexts(store, questions, top_k=5)
+            return rag.ask_llm_batch(questions, [context for context, _ in retrieved], concurrency=args.concurrency)
+
+        rows = []
+        for label, fn in (('sequential', sequential), (f"batch, concurrency={args.concurrency}", batch)):
+            embed_before, chat_before = stub.requests, stub.chat_requests
+            answers, elapsed = timed(fn)
+            rows.append((label, {
+                'answers': sum(1 for a in answers if a.startswith('Stub answer')),
+                'embedding_requests': stub.requests - embed_before,
+                'chat_requests': stub.chat_requests - chat_before,
+                'seconds': elapsed,
+                'questions_per_sec': len(questions) / elapsed,
+            }))
+
+    print_table(f"{args.questions} questions, {args.chunks} chunks, stub embed {args.embed_latency * 1000:.0f} ms, "
+                f"LLM {args.llm_latency * 1000:.0f} ms", rows)
+
+
+if __name__ == '__main__':
+    main()
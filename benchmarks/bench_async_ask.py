@@ -0,0 +1,140 @@
+"""Concurrent /ask/ throughput: sync views under WSGI vs async views under ASGI, with a slow stub LLM.
+
+    python -m benchmarks.bench_async_ask --requests 400 --concurrency 200 --wsgi-threads 16
+
+Each mode runs in its own process against a throwaway test database and a
+local stub of the OpenAI API (chat completions take --llm-latency seconds).
+WSGI is modelled as a threaded server with --wsgi-threads workers driving
+Django's WSGI handler; ASGI drives the ASGI handler from one event loop with
+--concurrency requests in flight and ASYNC_VIEWS=True.
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.common import print_table, summarize
+
+
+def setup_document(dim):
+    """One indexed document with a chat session; returns the session id"""
+    import numpy as np
+    from ragapp.ingest import save_chunks
+    from ragapp.models import ChatSession, Document
+    from ragapp.utils.rag import build_index
+    from ragapp.test_support import fake_vector
+
+    document = Document.objects.create(title='bench', file='documents/bench.pdf', num_pages=50)
+    chunks = [{'page': i // 4 + 1, 'text': f"Section {i} of the contract covers clause {i * 7}."}
+              for i in range(200)]
+    vectors = np.vstack([fake_vector(c['text'], dim) for c in chunks])
+    save_chunks(document, chunks, vectors)
+    build_index(document, [{'page': c['page'], 'text': c['text'], 'chunk_id': c['chunk_id']} for c in chunks],
+                vectors)
+    return ChatSession.objects.create(document=document, session_id=uuid.uuid4().hex).session_id
+
+
+def run_mode(mode, args):
+    from ragapp.test_support import StubEmbeddingServer
+
+    with StubEmbeddingServer(latency=0.005, per_item_latency=0, chat_latency=args.llm_latency) as stub:
+        os.environ['OPENAI_API_KEY'] = 'stub'
+        os.environ['OPENAI_BASE_URL'] = stub.base_url
+        os.environ['ASYNC_VIEWS'] = 'True' if mode == 'asgi' else 'False'
+        os.environ['ANSWER_CACHE_ENABLED'] = 'False'
+
+        import django
+        django.setup()
+        from django.conf import settings
+        from django.db import connection
+        from django.test.utils import setup_test_environment
+
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0)
+        media = tempfile.TemporaryDirectory()
+        settings.MEDIA_ROOT = media.name  # keep bench indexes away from real ones
+        try:
+            session_id = setup_document(stub.dim)
+            bodies = [json.dumps({'session_id': session_id, 'question': f"What does clause {i} say?"})
+                      for i in range(args.requests)]
+            samples, failures, elapsed = (drive_wsgi if mode == 'wsgi' else drive_asgi)(bodies, args)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            media.cleanup()
+
+    print(json.dumps({
+        'requests': args.requests,
+        'failed': failures,
+        'seconds': elapsed,
+        'req_per_sec': args.requests / elapsed,
+        **summarize(samples),
+    }))
+
+
+def drive_wsgi(bodies, args):
+    from django.test import Client
+
+    def one(body):
+        start = time.perf_counter()
+        response = Client().post('/ask/', data=body, content_type='application/json')
+        return time.perf_counter() - start, response.json().get('ok')
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.wsgi_threads) as pool:
+        results = list(pool.map(one, bodies))
+    elapsed = time.perf_counter() - start
+    return [r[0] for r in results], sum(1 for r in results if not r[1]), elapsed
+
+
+def drive_asgi(bodies, args):
+    from django.test import AsyncClient
+
+    async def main():
+        client = AsyncClient()
+        gate = asyncio.Semaphore(args.concurrency)
+
+        async def one(body):
+            async with gate:
+                start = time.perf_counter()
+                response = await client.post('/ask/', data=body, content_type='application/json')
+                return time.perf_counter() - start, response.json().get('ok')
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*(one(body) for body in bodies))
+        return results, time.perf_counter() - start
+
+    results, elapsed = asyncio.run(main())
+    return [r[0] for r in results], sum(1 for r in results if not r[1]), elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--concurrency', type=int, default=200)
+    parser.add_argument('--wsgi-threads', type=int, default=16)
+    parser.add_argument('--llm-latency', type=float, default=1.0)
+    parser.add_argument('--mode', choices=['wsgi', 'asgi'], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        return run_mode(args.mode, args)
+
+    rows = []
+    for mode in ('wsgi', 'asgi'):
+        out = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.bench_async_ask', '--mode', mode, *sys.argv[1:]],
+            check=True, capture_output=True, text=True,
+        ).stdout
+        label = f"wsgi, {args.wsgi_threads} threads" if mode == 'wsgi' else f"asgi, {args.concurrency} in flight"
+        rows.append((label, json.loads(out.strip().splitlines()[-1])))
+    print_table(f"{args.requests} asks, stub LLM latency {args.llm_latency:.1f}s", rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""Chunk insert throughput: per-row create() vs transactional bulk_create with embeddings.
+
+    python -m benchmarks.bench_chunk_inserts --chunks 10000
+
+Runs against a throwaway test database created from the configured
+DATABASES setting (MySQL in the default settings), then drops it.
+"""
+import argparse
+import random
+
+from benchmarks.common import print_table, timed
+
+import django  # noqa: E402
+
+django.setup()
+
+import numpy as np  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test.utils import setup_test_environment, teardown_test_environment  # noqa: E402
+
+from benchmarks.synthetic import paragraph  # noqa: E402
+from ragapp.ingest import save_chunks  # noqa: E402
+from ragapp.models import Chunk, Document  # noqa: E402
+
+
+def insert_per_row(document, chunks, vectors):
+    # The pre-bulk upload path: one INSERT (and autocommit) per chunk, no embedding
+    for chunk in chunks:
+        Chunk.objects.create(document=document, page_num=chunk['page'], content=chunk['text'])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--chunks', type=int, default=10000)
+    parser.add_argument('--dim', type=int, default=384)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    chunks = [{'page': i // 8 + 1, 'text': paragraph(rng, 6)} for i in range(args.chunks)]
+    vectors = np.random.default_rng(0).random((args.chunks, args.dim), dtype='float32')
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        rows = []
+        for label, fn in (('per-row create()', insert_per_row), ('bulk_create + embeddings', save_chunks)):
+            document = Document.objects.create(title=label, file='documents/bench.pdf')
+            _, elapsed = timed(fn, document, chunks, vectors)
+            stored = Chunk.objects.filter(document=document).count()
+            rows.append((label, {'chunks': stored, 'seconds': elapsed, 'chunks_per_sec': stored / elapsed}))
+        print_table(f"Chunk inserts ({connection.vendor}, {args.chunks} chunks)", rows)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+if __name__ == '__main__':
+    main()
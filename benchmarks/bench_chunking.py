@@ -0,0 +1,125 @@
+"""Chunking throughput: the previous chunkers against the offset-based engine.
+
+    python -m benchmarks.bench_chunking --mb 100
+
+Text is synthetic prose in ~3 KB pages (the unit ingestion chunks), cycled
+from a pool of distinct pages up to --mb megabytes, in two shapes: paragraphs
+separated by blank lines, and the same pages with single line breaks only
+(common in PDF extraction), which sends every page down the sentence-splitting
+path. Every implementation
+chunks every page at 800 chars / 150 overlap; the token mode runs at
+200 / 40 tokens (estimated from length if the tiktoken BPE file can't be loaded).
+"""
+import argparse
+import random
+import re
+import time
+
+from benchmarks.common import print_table
+from benchmarks.synthetic import page_text
+from ragapp.utils.chunker import chunk_text, iter_chunk_spans
+
+
+def legacy_chunk_text(text, chunk_size=600, chunk_overlap=150):
+    """chunker.chunk_text before the offset-based engine"""
+    paragraphs = [p.strip() for p in text.split('\n\n') if p.strip()]
+    chunks = []
+    current_chunk = []
+    current_length = 0
+    for paragraph in paragraphs:
+        para_length = len(paragraph)
+        if para_length > chunk_size * 1.5:
+            for sentence in re.split(r'(?<=[.!?])\s+', paragraph):
+                sentence = sentence.strip()
+                if not sentence:
+                    continue
+                if current_length + len(sentence) > chunk_size and current_chunk:
+                    chunks.append(' '.join(current_chunk))
+                    current_chunk = current_chunk[-2:] if len(current_chunk) > 2 else []
+                    current_length = sum(len(s) for s in current_chunk)
+                current_chunk.append(sentence)
+                current_length += len(sentence) + 1
+        else:
+            if current_length + para_length > chunk_size and current_chunk:
+                chunks.append(' '.join(current_chunk))
+                current_chunk = current_chunk[-1:] if current_chunk else []
+                current_length = sum(len(s) for s in current_chunk)
+            current_chunk.append(paragraph)
+            current_length += para_length + 2
+    if current_chunk:
+        chunks.append(' '.join(current_chunk))
+    return chunks
+
+
+def legacy_text_chunker(text, chunk_size=1000, chunk_overlap=200):
+    """TextChunker.chunk_text before the offset-based engine"""
+    if not text.strip():
+        return []
+    text = re.sub(r'\s+', ' ', text).strip()
+    chunks = []
+    start = 0
+    text_length = len(text)
+    while start < text_length:
+        end = start + chunk_size
+        if end < text_length:
+            sentence_end = text.rfind('. ', start, end)
+            if sentence_end != -1 and sentence_end > start + chunk_size // 2:
+                end = sentence_end + 2
+            else:
+                for break_char in ['? ', '! ', '\n\n', '; ']:
+                    break_pos = text.rfind(break_char, start, end)
+                    if break_pos != -1:
+                        end = break_pos + len(break_char)
+                        break
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        start = end - chunk_overlap
+        if start < 0:
+            start = 0
+        if start >= text_length:
+            break
+    return chunks
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--mb', type=float, default=100)
+    parser.add_argument('--distinct-pages', type=int, default=500)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    pool = [page_text(rng) for _ in range(args.distinct_pages)]
+    shapes = (('paragraphs', pool), ('no blank lines', [page.replace('\n\n', '\n') for page in pool]))
+
+    implementations = (
+        ('legacy chunk_text', lambda t: legacy_chunk_text(t, 800, 150)),
+        ('legacy TextChunker', lambda t: legacy_text_chunker(t, 800, 150)),
+        ('chunk_text (strings)', lambda t: chunk_text(t, 800, 150, unit='chars')),
+        ('iter_chunk_spans (offsets)', lambda t: list(iter_chunk_spans(t, 800, 150, unit='chars'))),
+        ('iter_chunk_spans (tokens)', lambda t: list(iter_chunk_spans(t, 200, 40, unit='tokens'))),
+    )
+    for shape, shape_pool in shapes:
+        pages = []
+        size = 0
+        while size < args.mb * 1024 * 1024:
+            page = shape_pool[len(pages) % len(shape_pool)]
+            pages.append(page)
+            size += len(page)
+        mb = size / 1024 / 1024
+
+        rows = []
+        for label, fn in implementations:
+            chunks = 0
+            start = time.perf_counter()
+            for page in pages:
+                chunks += len(fn(page))
+            seconds = time.perf_counter() - start
+            rows.append((label, {'chunks': chunks, 'seconds': seconds,
+                                 'chunks_per_sec': chunks / seconds, 'mb_per_sec': mb / seconds}))
+
+        print_table(f"Chunking {mb:.0f} MB in {len(pages)} pages, {shape}", rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""Prompt context size: plain top-k concatenation vs deduplicated, token-budgeted assembly.
+
+    python -m benchmarks.bench_context_tokens --pages 200 --questions 100
+
+Pages of numbered synthetic clauses are chunked exactly as ingestion does
+(chunk_text, 800 chars, 150 overlap) and retrieved with BM25 (no embedding
+model needed) for questions about one clause each; the context for each
+question is built both ways.
+"""
+import argparse
+import random
+import statistics
+
+from benchmarks.common import print_table
+from benchmarks.synthetic import paragraph
+from ragapp.utils.bm25 import BM25Index
+from ragapp.utils.chunker import chunk_text
+from ragapp.utils.context_builder import CONTEXT_MAX_TOKENS, assemble_context
+from ragapp.utils.tokens import count_tokens, get_encoding
+
+
+def concatenate(results):
+    # retrieve_context before this change: every chunk, verbatim, no limit
+    return ''.join(f"[p:{r['page']}] {r['text']}\n\n" for r in results)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pages', type=int, default=200)
+    parser.add_argument('--questions', type=int, default=100)
+    parser.add_argument('--top-k', type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    chunks = []
+    for page_num in range(1, args.pages + 1):
+        # Number each paragraph so questions can target one, like "what does clause 12 say"
+        paragraphs = [f"Clause {page_num * 10 + i}. {paragraph(rng, 5)}" for i in range(4)]
+        for piece in chunk_text('\n\n'.join(paragraphs), chunk_size=800, chunk_overlap=150):
+            chunks.append({'page': page_num, 'text': piece})
+    bm25 = BM25Index.build([c['text'] for c in chunks])
+    questions = [f"What does clause {rng.randint(1, args.pages) * 10 + rng.randint(0, 3)} say about "
+                 f"{rng.choice(['payment', 'warranty', 'termination', 'liability'])}?"
+                 for _ in range(args.questions)]
+
+    sizes = {'concatenated': [], 'assembled (no cap)': [], f"assembled ({CONTEXT_MAX_TOKENS} cap)": []}
+    labels = list(sizes)
+    for question in questions:
+        results = [{**chunks[i], 'position': i} for i, _ in bm25.search(question, k=args.top_k)]
+        sizes[labels[0]].append(count_tokens(concatenate(results)))
+        sizes[labels[1]].append(count_tokens(assemble_context(results, max_tokens=10 ** 9)[0]))
+        sizes[labels[2]].append(count_tokens(assemble_context(results)[0]))
+
+    baseline = statistics.fmean(sizes[labels[0]])
+    rows = []
+    for label, samples in sizes.items():
+        mean = statistics.fmean(samples)
+        rows.append((label, {'mean_tokens': mean, 'max_tokens': max(samples),
+                             'reduction_pct': 100.0 * (1 - mean / baseline)}))
+    counter = 'tiktoken' if get_encoding() is not None else 'length estimate'
+    print_table(f"Context tokens per question ({len(chunks)} chunks, top {args.top_k}, {counter})", rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""Prompt size and LLM latency per turn over a long conversation: last-six-messages history vs rolling summary.
+
+    python -m benchmarks.bench_conversation --turns 30 --ms-per-1k-tokens 100
+
+Each turn asks a question against a fixed ~1.5k-token retrieved context; the
+answers are synthetic paragraphs of --answer-sentences sentences (long, like
+real answers near max_tokens). 'last 6 messages' is the history the views
+sent before rolling summaries; 'summary' is conversation.history_messages
+with the summary folded after every turn, as chat_history.fold_summary does.
+The fake chat client sleeps --ms-per-1k-tokens per 1000 prompt tokens, so
+latency tracks prompt size the way prompt processing does. Summaries are
+extractive here (the fake model can't summarize); in 'llm' mode they are
+capped at the same SUMMARY_MAX_TOKENS.
+"""
+import argparse
+import random
+
+from benchmarks.common import print_table, summarize, timed
+from benchmarks.synthetic import page_text, paragraph
+from ragapp.utils import conversation, fake_providers
+from ragapp.utils.rag import build_messages
+from ragapp.utils.tokens import count_tokens
+
+
+def legacy_history(exchanges):
+    """The views' history before rolling summaries: the six newest messages, newest first"""
+    history = []
+    for question, answer in reversed(exchanges[-6:]):
+        history.append({'role': 'user', 'content': question})
+        history.append({'role': 'assistant', 'content': answer})
+    return history
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--turns', type=int, default=30)
+    parser.add_argument('--answer-sentences', type=int, default=16)
+    parser.add_argument('--ms-per-1k-tokens', type=float, default=100)
+    args = parser.parse_args()
+
+    fake_providers.FAKE_LLM_LATENCY_PER_1K_TOKENS = args.ms_per_1k_tokens / 1000
+    conversation.SUMMARY_MODE = 'extractive'
+    client = fake_providers.FakeChatClient()
+    rng = random.Random(0)
+    context = page_text(rng, 12)
+    turns = [(' '.join(paragraph(rng, 1).split()[:12]) + '?', paragraph(rng, args.answer_sentences))
+             for _ in range(args.turns)]
+
+    rows = []
+    for label in ('last 6 messages', 'summary'):
+        exchanges = []
+        summary, summarized = '', 0
+        tokens, latencies = [], []
+        for turn, (question, answer) in enumerate(turns, 1):
+            if label == 'summary':
+                history = conversation.history_messages(summary, exchanges[summarized:])
+            else:
+                history = legacy_history(exchanges)
+            messages = build_messages(question, context, history)
+            tokens.append(sum(count_tokens(message['content']) for message in messages))
+            _, seconds = timed(client.chat.completions.create, messages=messages)
+            latencies.append(seconds)
+
+            exchanges.append((question, answer))
+            boundary = len(exchanges) - conversation.HISTORY_RECENT_EXCHANGES
+            if label == 'summary' and boundary > summarized:
+                summary = conversation.update_summary(summary, exchanges[summarized:boundary])
+                summarized = boundary
+
+        for turn in (1, 10, 20, args.turns):
+            if turn <= args.turns:
+                rows.append((f"{label}, turn {turn}", {'prompt_tokens': tokens[turn - 1],
+                                                       'llm_ms': latencies[turn - 1] * 1000}))
+        stats = summarize(latencies)
+        rows.append((f"{label}, all turns", {'mean_prompt_tokens': sum(tokens) / len(tokens),
+                                             'max_prompt_tokens': max(tokens),
+                                             'total_prompt_tokens': sum(tokens),
+                                             'mean_llm_ms': stats['mean_ms'], 'p95_llm_ms': stats['p95_ms']}))
+
+    print_table(f"{args.turns}-turn conversation, history budget {conversation.HISTORY_TOKEN_BUDGET} tokens, "
+                f"{conversation.HISTORY_RECENT_EXCHANGES} recent exchanges verbatim", rows)
+
+
+if __name__ == '__main__':
+    main()
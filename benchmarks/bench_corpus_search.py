@@ -0,0 +1,103 @@
+"""Cross-document query latency as the corpus grows from 10 to 1,000 documents.
+
+    python -m benchmarks.bench_corpus_search --docs 10 100 1000 --chunks-per-doc 100
+
+Compares the sharded corpus index (all documents, and a 5-document subset)
+against the alternative it replaces: searching every per-document index in
+turn (already loaded in memory) and merging the results. Also reports the
+add_document time per ingested document, query latency over the resulting
+one-shard-per-document layout before merge_shards() runs (the worst case
+between merges; ingest merges past CORPUS_MERGE_SMALL_SHARDS small shards),
+and the merge itself.
+"""
+import argparse
+import heapq
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.common import print_table, summarize
+from ragapp.utils import sharded_index
+from ragapp.utils.rag import FaissStore
+
+
+def per_document_search(stores, query, k):
+    hits = []
+    for doc_id, store in stores.items():
+        distances, found = store.index.search(query[None, :], k)
+        hits.extend((float(d), int(i), doc_id) for d, i in zip(distances[0], found[0]) if i >= 0)
+    return heapq.nsmallest(k, hits)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--docs', type=int, nargs='+', default=[10, 100, 1000])
+    parser.add_argument('--chunks-per-doc', type=int, default=100)
+    parser.add_argument('--dim', type=int, default=384)
+    parser.add_argument('--queries', type=int, default=50)
+    parser.add_argument('--shard-size', type=int, default=50000)
+    parser.add_argument('--k', type=int, default=7)
+    args = parser.parse_args()
+
+    sharded_index.CORPUS_SHARD_MAX_VECTORS = args.shard_size
+    rng = np.random.default_rng(0)
+    queries = rng.random((args.queries, args.dim), dtype='float32')
+
+    rows = []
+    for n_docs in args.docs:
+        with tempfile.TemporaryDirectory() as tmp:
+            corpus = sharded_index.ShardedIndex(os.path.join(tmp, 'corpus'))
+            stores = {}
+            next_id = 1
+            adds = []
+            for doc_id in range(1, n_docs + 1):
+                vectors = rng.random((args.chunks_per_doc, args.dim), dtype='float32')
+                start = time.perf_counter()
+                corpus.add_document(doc_id, np.arange(next_id, next_id + len(vectors)), vectors)
+                adds.append(time.perf_counter() - start)
+                store = FaissStore(dim=args.dim)
+                store.add(vectors, [{'page': 0, 'text': ''}] * len(vectors))
+                stores[doc_id] = store
+                next_id += len(vectors)
+            # What a query sees between merges: one shard per document added since the last one
+            unmerged_shards = corpus.stats()['shards']
+            corpus.search(queries[0], k=args.k)
+            unmerged = []
+            for q in queries:
+                start = time.perf_counter()
+                corpus.search(q, k=args.k)
+                unmerged.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            corpus.merge_shards()
+            merge_seconds = time.perf_counter() - start
+            corpus.search(queries[0], k=args.k)  # open shards once, like a warm worker
+
+            subset = list(range(1, min(n_docs, 5) + 1))
+            timings = {'corpus (all docs)': [], 'corpus (5 docs)': [], 'per-document loop': []}
+            for q in queries:
+                start = time.perf_counter()
+                corpus.search(q, k=args.k)
+                timings['corpus (all docs)'].append(time.perf_counter() - start)
+                start = time.perf_counter()
+                corpus.search(q, k=args.k, document_ids=subset)
+                timings['corpus (5 docs)'].append(time.perf_counter() - start)
+                start = time.perf_counter()
+                per_document_search(stores, q, args.k)
+                timings['per-document loop'].append(time.perf_counter() - start)
+
+            shards = corpus.stats()['shards']
+            rows.append((f"{n_docs} docs, add_document", {'shards': unmerged_shards, **summarize(adds)}))
+            rows.append((f"{n_docs} docs, corpus unmerged (all docs)",
+                         {'shards': unmerged_shards, **summarize(unmerged)}))
+            rows.append((f"{n_docs} docs, merge_shards", {'shards': shards, 'ms': merge_seconds * 1000}))
+            for label, samples in timings.items():
+                rows.append((f"{n_docs} docs, {label}", {'shards': shards, **summarize(samples)}))
+
+    print_table(f"Corpus query latency ({args.chunks_per_doc} chunks/doc, dim {args.dim})", rows)
+
+
+if __name__ == '__main__':
+    main()
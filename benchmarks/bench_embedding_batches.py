@@ -0,0 +1,61 @@
+"""Embedding a large document against a local stub of the OpenAI embeddings API.
+
+    python -m benchmarks.bench_embedding_batches --chunks 5000
+
+Compares one request for the whole document (what rag.embed_texts used to
+send), token-budgeted batches sent sequentially, and the same batches sent
+concurrently. Also checks that batched output rows stay in input order.
+"""
+import argparse
+import random
+
+from benchmarks.common import print_table, timed
+from ragapp.test_support import StubEmbeddingServer, fake_vector
+from benchmarks.synthetic import paragraph
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--chunks', type=int, default=5000)
+    parser.add_argument('--concurrency', type=int, default=4)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    texts = [f"[{i}] " + paragraph(rng, 6) for i in range(args.chunks)]
+
+    with StubEmbeddingServer() as stub:
+        from openai import OpenAI
+        from ragapp.utils.embed_batcher import embed_in_batches
+
+        client = OpenAI(api_key='stub', base_url=stub.base_url, max_retries=0)
+
+        def request(batch):
+            response = client.embeddings.create(model='stub-embedding', input=batch)
+            return [item.embedding for item in response.data]
+
+        rows = []
+        try:
+            _, elapsed = timed(request, texts)
+            rows.append(('single request', {'seconds': elapsed, 'status': 'ok'}))
+        except Exception as e:
+            rows.append(('single request', {'status': f'failed ({type(e).__name__})'}))
+
+        for concurrency in (1, args.concurrency):
+            before = stub.requests
+            vectors, elapsed = timed(embed_in_batches, texts, request, concurrency=concurrency)
+            in_order = all(
+                abs(float(vectors[i] @ fake_vector(texts[i], stub.dim)) - 1.0) < 1e-4
+                for i in range(0, len(texts), max(1, len(texts) // 50))
+            )
+            rows.append((f"batched, concurrency={concurrency}", {
+                'requests': stub.requests - before,
+                'seconds': elapsed,
+                'chunks_per_sec': len(texts) / elapsed,
+                'order_preserved': in_order,
+            }))
+
+    print_table(f"Embedding {args.chunks} chunks via stub API", rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+"""Per-question embedding latency: fresh SentenceTransformer per call vs the shared registry.
+
+    python -m benchmarks.bench_embedding_registry --questions 20
+
+Runs against the local encoder (OPENAI_API_KEY is ignored) so the numbers
+reflect model load cost rather than network latency.
+"""
+import argparse
+import os
+
+from benchmarks.common import print_table, summarize, timed
+
+os.environ.pop('OPENAI_API_KEY', None)
+
+from ragapp.utils import model_registry  # noqa: E402
+from ragapp.utils.rag import EMBEDDING_MODEL, embed_texts  # noqa: E402
+
+
+def embed_uncached(texts):
+    # What rag.embed_texts did before the registry: construct the encoder every call
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(EMBEDDING_MODEL).encode(texts)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--questions', type=int, default=20)
+    args = parser.parse_args()
+
+    questions = [f"What does section {i} say about the warranty terms?" for i in range(args.questions)]
+
+    before = [timed(embed_uncached, [q])[1] for q in questions]
+
+    model_registry.clear()
+    _, first_load = timed(embed_texts, [questions[0]])
+    after = [timed(embed_texts, [q])[1] for q in questions]
+
+    print_table(f"Question embedding latency ({EMBEDDING_MODEL})", [
+        ('before (load per call)', summarize(before)),
+        ('after (registry, warm)', summarize(after)),
+        ('after (first call)', {'load_ms': first_load * 1000}),
+    ])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""Latency of the two retrieval legs (FAISS and BM25) and their fusion on a 50k-chunk document.
+
+    python -m benchmarks.bench_hybrid_retrieval --chunks 50000 --queries 200
+
+Chunks are synthetic paragraphs with a sprinkling of rare reference numbers,
+vectors are random. Reports BM25 build/save/load cost and per-query latency
+of dense search (flat and the auto-selected ANN index), BM25, and full
+hybrid retrieve_context with a precomputed query vector.
+"""
+import argparse
+import os
+import random
+import tempfile
+
+import numpy as np
+
+from benchmarks.common import print_table, summarize, timed
+from benchmarks.synthetic import paragraph
+from ragapp.utils import rag
+from ragapp.utils.bm25 import BM25Index
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--chunks', type=int, default=50000)
+    parser.add_argument('--dim', type=int, default=384)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--top-k', type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    texts = [f"{paragraph(rng, 4)} Reference {rng.randint(0, 20000)}." for _ in range(args.chunks)]
+    vectors = np.random.default_rng(0).random((args.chunks, args.dim), dtype='float32')
+    questions = [f"What is the {rng.choice(['warranty', 'payment', 'termination', 'insurance'])} "
+                 f"{rng.choice(['deadline', 'schedule', 'coverage', 'notice'])} in reference {rng.randint(0, 20000)}?"
+                 for _ in range(args.queries)]
+    query_vectors = np.random.default_rng(1).random((args.queries, args.dim), dtype='float32')
+
+    rows = []
+    bm25, build_s = timed(BM25Index.build, texts)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench_bm25.npz')
+        _, save_s = timed(bm25.save, path)
+        _, load_s = timed(BM25Index.load, path)
+        size_mb = os.path.getsize(path) / 1024 / 1024
+    rows.append(('bm25 index', {'build_s': build_s, 'save_s': save_s, 'load_s': load_s,
+                                'file_mb': size_mb, 'terms': len(bm25.vocab)}))
+
+    flat = rag.FaissStore(dim=args.dim)
+    flat.add(vectors, [{'page': 1, 'text': t} for t in texts])
+    flat.bm25 = bm25
+    ann = rag.FaissStore(dim=args.dim)
+    ann.index = flat.index
+    ann.payloads, ann.bm25 = flat.payloads, bm25
+    ann.optimize()
+
+    candidates = args.top_k * rag.HYBRID_CANDIDATES
+    for label, fn in (
+        ('dense, flat', lambda q, v: flat.search(v, k=candidates)),
+        (f"dense, {ann.index_type}", lambda q, v: ann.search(v, k=candidates)),
+        ('bm25', lambda q, v: bm25.search(q, k=candidates)),
+    ):
+        rows.append((label, summarize([timed(fn, q, v)[1] for q, v in zip(questions, query_vectors)])))
+
+    # Full hybrid retrieval (both legs, fusion, context assembly) with the embedding call stubbed out
+    vectors_by_question = dict(zip(questions, query_vectors))
+    rag.embed_queries = lambda qs: np.vstack([vectors_by_question[q] for q in qs])
+    for label, store in (('hybrid retrieve, flat', flat), (f"hybrid retrieve, {ann.index_type}", ann)):
+        samples = [timed(rag.retrieve_context, store, q, args.top_k, 'hybrid')[1] for q in questions]
+        rows.append((label, summarize(samples)))
+
+    print_table(f"Retrieval legs, {args.chunks} chunks, dim {args.dim}, {args.queries} queries", rows)
+
+
+if __name__ == '__main__':
+    main()
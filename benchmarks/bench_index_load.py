@@ -0,0 +1,107 @@
+"""Index load time and RSS: JSON payloads + read_index vs binary payloads + mmap.
+
+    python -m benchmarks.bench_index_load --chunks 50000 --dim 384
+
+Each load runs in a fresh subprocess (cold Python heap, warm OS page cache)
+and reports the time to open the index plus one search, and the RSS growth.
+Private (anonymous) RSS is what each extra worker process pays; mmapped
+file pages show up in total RSS but are shared through the page cache.
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+
+from benchmarks.common import print_table, timed
+
+
+def current_rss_mb():
+    """(total RSS, private anonymous RSS) in MiB; file-backed mmap pages are shared across processes"""
+    fields = {}
+    with open('/proc/self/status') as f:
+        for line in f:
+            name, _, value = line.partition(':')
+            if name in ('VmRSS', 'RssAnon'):
+                fields[name] = int(value.split()[0]) / 1024
+    return fields['VmRSS'], fields['RssAnon']
+
+
+def build(tmp, chunks, dim):
+    import numpy as np
+    from benchmarks.synthetic import paragraph
+    from ragapp.utils.rag import FaissStore
+
+    rng = random.Random(0)
+    payloads = [{'page': i // 4 + 1, 'text': paragraph(rng, 6), 'chunk_id': i + 1} for i in range(chunks)]
+    store = FaissStore(dim=dim)
+    store.add(np.random.default_rng(0).random((chunks, dim), dtype='float32'), payloads)
+
+    path = os.path.join(tmp, '1.index')
+    store.save(path)
+    # The pre-binary layout: same index, payloads as one JSON list
+    legacy_dir = os.path.join(tmp, 'legacy')
+    os.makedirs(legacy_dir)
+    import faiss
+    faiss.write_index(store.index, os.path.join(legacy_dir, '1.index'))
+    with open(os.path.join(legacy_dir, '1_payloads.json'), 'w') as f:
+        json.dump([{'page': p['page'], 'text': p['text']} for p in payloads], f)
+    return path, os.path.join(legacy_dir, '1.index')
+
+
+def measure(path, mmap):
+    import numpy as np
+    import ragapp.utils.rag as rag
+
+    rag.FAISS_MMAP = mmap
+    before = current_rss_mb()
+
+    def load_and_search():
+        store = rag.FaissStore()
+        store.load(path)
+        store.search(np.zeros(store.dim, dtype='float32'), k=5)
+        return store
+
+    store, elapsed = timed(load_and_search)  # keep it alive for the RSS reading
+    after = current_rss_mb()
+    print(json.dumps({
+        'load_ms': elapsed * 1000,
+        'rss_growth_mb': after[0] - before[0],
+        'private_rss_growth_mb': after[1] - before[1],
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--chunks', type=int, default=50000)
+    parser.add_argument('--dim', type=int, default=384)
+    parser.add_argument('--measure', help=argparse.SUPPRESS)
+    parser.add_argument('--mmap', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        return measure(args.measure, args.mmap)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        binary_path, legacy_path = build(tmp, args.chunks, args.dim)
+        sizes = {
+            'json payloads': os.path.getsize(legacy_path.replace('.index', '_payloads.json')),
+            'binary payloads': os.path.getsize(binary_path.replace('.index', '_payloads.bin')),
+        }
+        rows = []
+        for label, path, mmap in (('json + read_index', legacy_path, False),
+                                  ('binary + read_index', binary_path, False),
+                                  ('binary + mmap', binary_path, True)):
+            cmd = [sys.executable, '-m', 'benchmarks.bench_index_load', '--measure', path]
+            if mmap:
+                cmd.append('--mmap')
+            out = subprocess.run(cmd, check=True, capture_output=True, text=True).stdout
+            rows.append((label, json.loads(out.strip().splitlines()[-1])))
+        rows.append(('payload file bytes', sizes))
+    print_table(f"Index load, {args.chunks} chunks x {args.dim}", rows)
+
+
+if __name__ == '__main__':
+    main()
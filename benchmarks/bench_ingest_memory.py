@@ -0,0 +1,109 @@
+"""Peak memory of ingesting a large PDF: accumulate-everything vs the windowed pipeline.
+
+    python -m benchmarks.bench_ingest_memory --pages 2000
+
+Each mode runs in its own subprocess so peak RSS is measured independently;
+tracemalloc peak (Python + NumPy allocations) is reported alongside. The
+embedding model is replaced by a deterministic in-process fake so the
+numbers reflect the pipeline, not the encoder.
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import tracemalloc
+
+from benchmarks.common import print_table, timed
+
+DIM = 384
+
+
+def fake_embed(texts, cache=True):
+    import numpy as np
+    rng = np.random.default_rng(len(texts))
+    return rng.random((len(texts), DIM), dtype='float32')
+
+
+def ingest_accumulate(pdf_path):
+    # Shape of the old upload path: every chunk dict, then texts, payloads,
+    # the full matrix and a Python list copy of it before indexing
+    import numpy as np
+    from ragapp.utils.chunker import chunk_text
+    from ragapp.utils.pdf_loader import extract_pdf_text_with_pages
+    from ragapp.utils.rag import FaissStore
+
+    chunks = []
+    for page_num, text in extract_pdf_text_with_pages(pdf_path):
+        for piece in chunk_text(text, chunk_size=800, chunk_overlap=150):
+            if piece.strip():
+                chunks.append({'page': page_num, 'text': piece})
+    texts = [c['text'] for c in chunks]
+    payloads = [{'page': c['page'], 'text': c['text']} for c in chunks]
+    vectors = fake_embed(texts)
+    store = FaissStore(dim=vectors.shape[1])
+    store.add(np.array(vectors.tolist()).astype('float32'), payloads)
+    return store.index.ntotal
+
+
+def ingest_windowed(pdf_path):
+    from ragapp import ingest
+    from ragapp.utils.rag import FaissStore
+
+    ingest.embed_texts = fake_embed
+    store = None
+    for _, chunks in ingest.iter_chunk_windows(pdf_path):
+        if not chunks:
+            continue
+        vectors = ingest.embed_chunks(chunks)
+        if store is None:
+            store = FaissStore(dim=vectors.shape[1])
+        store.add(vectors, [{'page': c['page'], 'text': c['text']} for c in chunks])
+    return store.index.ntotal
+
+
+MODES = {'accumulate': ingest_accumulate, 'windowed': ingest_windowed}
+
+
+def run_mode(mode, pdf_path):
+    import django
+    django.setup()
+    tracemalloc.start()
+    chunks, elapsed = timed(MODES[mode], pdf_path)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(json.dumps({
+        'chunks': chunks,
+        'seconds': elapsed,
+        'tracemalloc_peak_mb': peak / 1024 / 1024,
+        'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pages', type=int, default=2000)
+    parser.add_argument('--mode', choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument('--pdf', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        return run_mode(args.mode, args.pdf)
+
+    from benchmarks.synthetic import make_pdf
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf_path = make_pdf(os.path.join(tmp, f'synthetic_{args.pages}.pdf'), args.pages)
+        rows = []
+        for mode in MODES:
+            out = subprocess.run(
+                [sys.executable, '-m', 'benchmarks.bench_ingest_memory', '--mode', mode, '--pdf', pdf_path],
+                check=True, capture_output=True, text=True,
+            ).stdout
+            rows.append((mode, json.loads(out.strip().splitlines()[-1])))
+    print_table(f"Ingestion memory, {args.pages}-page PDF", rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""Cost of the timing spans: a bare span, and retrieve_context with metrics on and off.
+
+    python -m benchmarks.bench_metrics_overhead --chunks 2000 --queries 500
+
+retrieve_context runs over a synthetic document with the fake embedding
+provider, so every stage span (query embedding, FAISS, BM25, context
+assembly) fires on each call. Modes are interleaved to even out drift.
+"""
+import argparse
+import random
+import time
+
+from benchmarks.common import print_table, summarize
+from benchmarks.synthetic import paragraph
+from ragapp.utils import metrics, rag
+from ragapp.utils.bm25 import BM25Index
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--chunks', type=int, default=2000)
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--spans', type=int, default=200000)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    rag.EMBEDDING_PROVIDER = 'fake'
+    texts = [paragraph(rng, 4) for _ in range(args.chunks)]
+    store = rag.FaissStore(dim=rag.get_embedding_model()[0].dim)
+    store.add(rag.embed_texts(texts, cache=False), [{'page': i // 4 + 1, 'text': t} for i, t in enumerate(texts)])
+    store.bm25 = BM25Index.build(texts)
+    questions = [f"What about the {rng.choice(['warranty', 'payment', 'notice'])} in clause {i}?"
+                 for i in range(args.queries)]
+    for q in questions:
+        rag.retrieve_context(store, q, top_k=5)  # warm the query cache and tokenizer
+
+    rows = []
+    for enabled in (True, False):
+        metrics.METRICS_ENABLED = enabled
+        start = time.perf_counter()
+        for _ in range(args.spans):
+            with metrics.span('bench'):
+                pass
+        rows.append((f"bare span, metrics {'on' if enabled else 'off'}",
+                     {'ns_per_span': (time.perf_counter() - start) / args.spans * 1e9}))
+
+    samples = {True: [], False: []}
+    for q in questions:
+        for enabled in (True, False):
+            metrics.METRICS_ENABLED = enabled
+            start = time.perf_counter()
+            rag.retrieve_context(store, q, top_k=5)
+            samples[enabled].append(time.perf_counter() - start)
+    for enabled in (True, False):
+        rows.append((f"retrieve_context, metrics {'on' if enabled else 'off'}", summarize(samples[enabled])))
+
+    print_table(f"Timing span overhead, {args.chunks} chunks, {args.queries} queries", rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,41 @@
+"""Page extraction throughput (pages/sec) per backend, serial vs process pool.
+
+    python -m benchmarks.bench_pdf_extraction --pages 300 600
+"""
+import argparse
+import os
+import tempfile
+
+from benchmarks.common import print_table, timed
+from benchmarks.synthetic import make_pdf
+from ragapp.utils.pdf_loader import _BACKENDS, extract_pdf_text_with_pages
+
+
+def run(pdf_path, backend, workers):
+    return sum(1 for _ in extract_pdf_text_with_pages(pdf_path, backend=backend, workers=workers))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pages', type=int, nargs='+', default=[300, 600])
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 2)
+    args = parser.parse_args()
+
+    backends = [name for name, (_, _, available) in _BACKENDS.items() if available()]
+    with tempfile.TemporaryDirectory() as tmp:
+        for pages in args.pages:
+            pdf_path = make_pdf(os.path.join(tmp, f'synthetic_{pages}.pdf'), pages)
+            rows = []
+            for backend in backends:
+                for workers in (1, args.workers):
+                    extracted, elapsed = timed(run, pdf_path, backend, workers)
+                    rows.append((f"{backend} workers={workers}", {
+                        'pages': extracted,
+                        'seconds': elapsed,
+                        'pages_per_sec': extracted / elapsed if elapsed else 0.0,
+                    }))
+            print_table(f"Extraction throughput, {pages}-page PDF", rows)
+
+
+if __name__ == '__main__':
+    main()
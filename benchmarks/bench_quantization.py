@@ -0,0 +1,80 @@
+"""Memory and recall of the FaissStore vector storage modes (float32, fp16, sq8, pq), with and without re-ranking.
+
+    python -m benchmarks.bench_quantization --chunks 50000 --queries 200
+
+Chunks are synthetic paragraphs embedded with the deterministic fake
+embedder (dim 384); queries are short word samples from other paragraphs.
+Recall@k is measured against exact float32 flat search. Re-ranking reads
+exact vectors from an in-memory map instead of Chunk.embedding, so its
+latency excludes the DB round trip the app pays.
+"""
+import argparse
+import random
+
+import numpy as np
+
+from benchmarks.common import print_table, summarize, timed
+from benchmarks.synthetic import paragraph
+from ragapp.utils import rag
+from ragapp.utils.fake_providers import FakeEmbedder
+
+
+def recall(results, truth, k):
+    return np.mean([len({r['position'] for r in row[:k]} & set(exact[:k])) / k
+                    for row, exact in zip(results, truth)])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--chunks', type=int, default=50000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=10)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    embedder = FakeEmbedder()
+    texts = [paragraph(rng, 3) for _ in range(args.chunks)]
+    vectors = embedder.encode(texts)
+    questions = [' '.join(rng.sample(paragraph(rng, 2).split(), 6)) for _ in range(args.queries)]
+    query_vectors = embedder.encode(questions)
+    payloads = [{'page': 1, 'text': t, 'chunk_id': i} for i, t in enumerate(texts)]
+
+    exact = rag.FaissStore(dim=vectors.shape[1])
+    exact.add(vectors, payloads)
+    truth = [[r['position'] for r in row] for row in exact.search_many(query_vectors, k=args.k)]
+    baseline_bytes = exact.index.ntotal * rag.index_code_size(exact.index)
+
+    by_chunk_id = dict(enumerate(vectors))
+    rag.set_exact_vector_source(lambda ids: {i: by_chunk_id[i] for i in ids})
+    rows = []
+    for index_type in ('flat', 'ivf'):
+        for quantization in ('none', 'fp16', 'sq8', 'pq'):
+            store = rag.FaissStore(dim=vectors.shape[1])
+            store.add(vectors, payloads)
+            _, build_s = timed(store.optimize, index_type, quantization)
+            vector_bytes = store.index.ntotal * rag.index_code_size(store.index)
+
+            for rerank in (False, True) if quantization != 'none' else (False,):
+                rag.FAISS_RERANK = rerank
+                samples = []
+                results = []
+                for query in query_vectors:
+                    result, seconds = timed(store.search, query, args.k)
+                    results.append(result)
+                    samples.append(seconds)
+                label = f"{index_type}/{store.quantization}" + (' +rerank' if rerank else '')
+                rows.append((label, {
+                    'bytes_per_vector': rag.index_code_size(store.index),
+                    'vectors_mb': vector_bytes / 1024 / 1024,
+                    'saved_pct': 100 * (1 - vector_bytes / baseline_bytes),
+                    f'recall@{args.k}': recall(results, truth, args.k),
+                    'p50_ms': summarize(samples)['p50_ms'],
+                    'build_s': build_s,
+                }))
+
+    print_table(f"Vector storage modes, {args.chunks} chunks, dim {vectors.shape[1]}, "
+                f"{args.queries} queries (recall vs exact flat)", rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""Ask-path question embedding with and without the query embedding cache.
+
+    python -m benchmarks.bench_query_cache --asks 300 --distinct 20
+
+Questions are drawn from a skewed (Zipf-like) set of distinct phrasings, with
+case/whitespace variations, and embedded through rag.embed_query against a
+local stub of the OpenAI embeddings API.
+"""
+import argparse
+import os
+import random
+
+from benchmarks.common import print_table, summarize, timed
+from ragapp.test_support import StubEmbeddingServer
+
+QUESTIONS = [
+    "Summarize this document", "What are the key dates?", "Who are the parties involved?",
+    "What is the main conclusion?", "List the action items", "What are the risks?",
+    "What does section 2 say?", "What is the budget?", "Who wrote this?", "What is the deadline?",
+]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--asks', type=int, default=300)
+    parser.add_argument('--distinct', type=int, default=20)
+    parser.add_argument('--latency', type=float, default=0.05)
+    args = parser.parse_args()
+
+    os.environ['OPENAI_API_KEY'] = 'stub'
+    from openai import OpenAI
+    from ragapp.utils import model_registry, rag
+
+    rng = random.Random(0)
+    pool = [QUESTIONS[i % len(QUESTIONS)] + (f" (v{i // len(QUESTIONS)})" if i >= len(QUESTIONS) else "")
+            for i in range(args.distinct)]
+    weights = [1.0 / (rank + 1) for rank in range(len(pool))]
+    asks = []
+    for _ in range(args.asks):
+        question = rng.choices(pool, weights)[0]
+        asks.append(question.upper() if rng.random() < 0.2 else f"  {question} ")
+
+    rows = []
+    with StubEmbeddingServer(latency=args.latency) as stub:
+        model_registry._models[('openai', None)] = OpenAI(api_key='stub', base_url=stub.base_url, max_retries=0)
+        for size in (0, 1024):
+            rag.QUERY_EMBEDDING_CACHE_SIZE = size
+            rag._query_caches.clear()
+            before = stub.requests
+            samples = [timed(rag.embed_query, question)[1] for question in asks]
+            stats = rag.query_cache_stats().get(rag.OPENAI_EMBEDDING_MODEL, {})
+            rows.append((f"cache size {size}", {
+                'api_requests': stub.requests - before,
+                'hit_rate': stats.get('hit_rate', 0.0),
+                **summarize(samples),
+            }))
+
+    print_table(f"{args.asks} questions ({args.distinct} distinct), stub API latency {args.latency * 1000:.0f} ms", rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+# benchmarks/common.py
+# Benchmarks are run from the project root, e.g. `python -m benchmarks.bench_embedding_registry`
+import os
+import time
+import statistics
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'pdfqa.settings')
+
+
+def timed(fn, *args, **kwargs):
+    """Run fn once and return (result, elapsed seconds)"""
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    idx = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * (len(ordered) - 1)))))
+    return ordered[idx]
+
+
+def summarize(samples):
+    """Latency summary in milliseconds"""
+    return {
+        'n': len(samples),
+        'mean_ms': statistics.fmean(samples) * 1000 if samples else 0.0,
+        'p50_ms': percentile(samples, 50) * 1000,
+        'p95_ms': percentile(samples, 95) * 1000,
+        'p99_ms': percentile(samples, 99) * 1000,
+    }
+
+
+def print_table(title, rows):
+    """rows: list of (label, dict) pairs"""
+    print(f"\n{title}")
+    print('-' * len(title))
+    for label, stats in rows:
+        parts = ', '.join(
+            f"{k}={v:.2f}" if isinstance(v, float) else f"{k}={v}" for k, v in stats.items()
+        )
+        print(f"{label:<28} {parts}")
@@ -0,0 +1,187 @@
+"""End-to-end performance suite: synthetic PDF -> extraction -> chunking -> embedding -> index -> retrieval -> ask.
+
+    python manage.py ragbench --pages 200 --questions 50 --json bench.json
+
+Everything runs offline: the PDF is generated locally and, unless --real is
+given, embeddings and answers come from the deterministic fake providers.
+Django models live in a throwaway test database and indexes in a temporary
+MEDIA_ROOT, so the suite never touches real data.
+"""
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timezone
+
+from benchmarks.common import summarize
+from benchmarks.synthetic import make_pdf
+
+
+class Stages:
+    """Collects one result dict per stage: wall time, throughput and Python peak memory"""
+
+    def __init__(self, trace_memory=True):
+        self.trace_memory = trace_memory
+        self.results = {}
+
+    def _start(self):
+        if self.trace_memory:
+            tracemalloc.start()
+
+    def _stop(self):
+        if not self.trace_memory:
+            return {}
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return {'peak_mb': peak / 1024 / 1024}
+
+    def run(self, name, fn, *args, units=None, **kwargs):
+        """Time one call; `units` maps a label ('pages', 'chunks') to how many the call processed"""
+        self._start()
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        seconds = time.perf_counter() - start
+        record = {'seconds': seconds, **self._stop()}
+        for unit, count in (units(result) if callable(units) else units or {}).items():
+            record[unit] = count
+            record[f"{unit}_per_sec"] = count / seconds if seconds else 0.0
+        self.results[name] = record
+        return result
+
+    def run_each(self, name, fn, items):
+        """Time fn(item) per item and report latency percentiles"""
+        self._start()
+        samples = []
+        for item in items:
+            start = time.perf_counter()
+            fn(item)
+            samples.append(time.perf_counter() - start)
+        self.results[name] = {**summarize(samples), **self._stop()}
+        return samples
+
+
+def _git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run_suite(pages=100, questions=30, real=False, backend=None, workers=None, trace_memory=True, seed=0):
+    """Run every stage and return {'meta': ..., 'stages': {...}}"""
+    from django.conf import settings
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    from ragapp.chat_history import wait_for_summary_updates
+    from ragapp.ingest import save_chunks
+    from ragapp.models import ChatSession, Document
+    from ragapp.utils import rag
+    from ragapp.utils.chunker import chunk_text
+    from ragapp.utils.pdf_loader import PDF_BACKEND, extract_pdf_text_with_pages
+
+    if not real:
+        rag.EMBEDDING_PROVIDER = 'fake'
+        rag.LLM_PROVIDER = 'fake'
+    rag.ANSWER_CACHE_ENABLED = False  # every ask should reach the (fake) LLM
+
+    rng = random.Random(seed)
+    stages = Stages(trace_memory)
+    media = tempfile.TemporaryDirectory()
+    old_media_root = settings.MEDIA_ROOT
+    settings.MEDIA_ROOT = media.name
+    setup_test_environment()
+    old_db_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        pdf_path = stages.run('generate_pdf', make_pdf, os.path.join(media.name, 'bench.pdf'), pages,
+                              seed=seed, units={'pages': pages})
+
+        page_texts = stages.run(
+            'extract', lambda: list(extract_pdf_text_with_pages(pdf_path, backend=backend, workers=workers)),
+            units=lambda result: {'pages': len(result)})
+
+        def chunk_all():
+            chunks = []
+            for page_num, text in page_texts:
+                for piece in chunk_text(text, chunk_size=800, chunk_overlap=150):
+                    if piece.strip():
+                        chunks.append({'page': page_num, 'text': piece})
+            return chunks
+        chunks = stages.run('chunk', chunk_all, units=lambda result: {'chunks': len(result)})
+
+        texts = [c['text'] for c in chunks]
+        vectors = stages.run('embed', rag.embed_texts, texts, units={'chunks': len(texts)})
+
+        document = Document.objects.create(title='ragbench.pdf', file='documents/ragbench.pdf', num_pages=pages)
+        save_chunks(document, chunks, vectors)
+        payloads = [{'page': c['page'], 'text': c['text'], 'chunk_id': c['chunk_id']} for c in chunks]
+        stages.run('index_build', rag.build_index, document, payloads, vectors, units={'chunks': len(chunks)})
+
+        # build_or_load_index on an existing index: cold from disk, then from the in-process cache
+        rag._index_cache.clear()
+        stages.run('index_load_cold', rag.build_or_load_index, document, chunks)
+        stages.run('index_load_warm', rag.build_or_load_index, document, chunks)
+        store = rag.load_index(document)
+
+        retrieve_questions = [f"What does page {rng.randint(1, pages)} say about {word}?"
+                              for word in rng.choices(['warranty', 'payment', 'liability', 'deadline'], k=questions)]
+        stages.run_each('retrieve_context', lambda q: rag.retrieve_context(store, q, top_k=5), retrieve_questions)
+
+        session = ChatSession.objects.create(document=document, session_id=uuid.uuid4().hex)
+        client = Client()
+        ask_questions = [f"Summarize the {word} terms near clause {rng.randint(1, 10 ** 6)}"
+                         for word in rng.choices(['warranty', 'payment', 'liability', 'deadline'], k=questions)]
+        rag._query_caches.clear()
+
+        def ask(question):
+            response = client.post('/ask/', data={'session_id': session.session_id, 'question': question},
+                                   content_type='application/json')
+            data = response.json()
+            if not data.get('ok'):
+                raise RuntimeError(f"/ask/ failed: {data.get('error')}")
+        stages.run_each('ask', ask, ask_questions)
+        wait_for_summary_updates()  # folds queued by the asks still need the test database
+    finally:
+        connection.creation.destroy_test_db(old_db_name, verbosity=0)
+        teardown_test_environment()
+        settings.MEDIA_ROOT = old_media_root
+        media.cleanup()
+
+    return {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'git_revision': _git_revision(),
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'database': connection.vendor,
+            'pages': pages,
+            'questions': questions,
+            'chunks': len(chunks),
+            'pdf_backend': backend or PDF_BACKEND,
+            'embedding_provider': 'fake' if not real else rag.EMBEDDING_PROVIDER,
+            'llm_provider': 'fake' if not real else rag.LLM_PROVIDER,
+            'index_type': store.index_type,
+            'trace_memory': trace_memory,
+            'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        },
+        'stages': stages.results,
+    }
+
+
+def write_json(report, path):
+    if path == '-':
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+        return
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
@@ -0,0 +1,22 @@
+# benchmarks/synthetic.py - locally generated inputs, no downloads or API keys needed
+import random
+
+from ragapp.test_support import page_text, paragraph  # noqa: F401 (re-exported for the benchmarks)
+
+
+def make_pdf(path, pages, paragraphs_per_page=4, seed=0):
+    """Write a text-only PDF with `pages` pages of pseudo-random prose"""
+    try:
+        import pymupdf as fitz
+    except ImportError:
+        import fitz
+
+    rng = random.Random(seed)
+    doc = fitz.open()
+    for page_num in range(pages):
+        page = doc.new_page()
+        text = f"Page {page_num + 1}\n\n" + page_text(rng, paragraphs_per_page)
+        page.insert_textbox(fitz.Rect(54, 54, 558, 790), text, fontsize=9)
+    doc.save(path)
+    doc.close()
+    return path
@@ -71,6 +71,13 @@ MEDIA_URL = os.getenv('MEDIA_URL', '/media/')
 
 CSRF_TRUSTED_ORIGINS = ['http://localhost:8000','http://127.0.0.1:8000']
 
+# Hash uploads as they stream in (duplicate PDFs reuse the existing index), then store as usual
+FILE_UPLOAD_HANDLERS = [
+    'ragapp.uploads.HashingUploadHandler',
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+
 
 import os
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
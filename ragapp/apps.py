@@ -0,0 +1,17 @@
+from django.apps import AppConfig
+from django.db.models.signals import post_delete
+
+
+class RagappConfig(AppConfig):
+    name = 'ragapp'
+
+    def ready(self):
+        from .ingest import chunk_embeddings
+        from .models import Document
+        from .signals import document_deleted
+        from .utils.rag import set_exact_vector_source
+
+        # Quantized indexes re-rank against the exact vectors kept in Chunk.embedding
+        set_exact_vector_source(chunk_embeddings)
+        # Index files, cache entries and the upload go with the Document row
+        post_delete.connect(document_deleted, sender=Document, dispatch_uid='ragapp.document_deleted')
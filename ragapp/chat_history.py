@@ -0,0 +1,125 @@
+# ragapp/chat_history.py - per-session rolling summary and the history sent with each question
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import OperationalError, close_old_connections
+
+from .models import ChatSession, ChatMessage
+from .utils.conversation import HISTORY_RECENT_EXCHANGES, SUMMARY_FOLD_BATCH, history_messages, update_summary
+from .utils.metrics import span
+from .utils.rag import CHAT_MODEL, get_llm_client
+
+logger = logging.getLogger(__name__)
+
+# At most this many not-yet-summarized exchanges are folded in one update (e.g. the first
+# update of a session from before summaries existed); older ones are skipped
+SUMMARY_FOLD_MAX_EXCHANGES = SUMMARY_FOLD_BATCH * 4
+# SQLite refuses a write while another connection writes; such DB steps are retried
+SUMMARY_DB_ATTEMPTS = 4
+
+# Folds run one at a time on their own thread: a slow summary call never takes a slot in
+# the blocking pool that retrieval uses, and folds never compete with each other for the DB
+_summary_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='ragapp-summary')
+_pending = set()
+_pending_lock = threading.Lock()
+
+
+def _recent(session):
+    return (ChatMessage.objects.filter(session=session, id__gt=session.summarized_through)
+            .order_by('-id').values_list('question', 'answer')[:HISTORY_RECENT_EXCHANGES])
+
+
+def load_history(session):
+    """Prompt history for the session's next question: its summary plus the latest exchanges"""
+    with span('history'):
+        # Newest first from the DB, so reverse into conversation order
+        exchanges = list(_recent(session))[::-1]
+        return history_messages(session.summary, exchanges)
+
+
+async def aload_history(session):
+    """load_history for async views"""
+    with span('history'):
+        exchanges = [row async for row in _recent(session)][::-1]
+        return history_messages(session.summary, exchanges)
+
+
+def _retry_locked(fn, *args):
+    for attempt in range(SUMMARY_DB_ATTEMPTS):
+        try:
+            return fn(*args)
+        except OperationalError as e:
+            # 'database is locked' / 'database table is locked' (SQLite); anything else is a real error
+            if 'locked' not in str(e) or attempt == SUMMARY_DB_ATTEMPTS - 1:
+                raise
+            time.sleep(0.05 * 2 ** attempt)
+
+
+def _unsummarized(session_pk):
+    """(session, new summarized_through, [(question, answer)]) or None when nothing needs folding"""
+    session = ChatSession.objects.get(pk=session_pk)
+    boundary = list(ChatMessage.objects.filter(session=session).order_by('-id')
+                    .values_list('id', flat=True)[HISTORY_RECENT_EXCHANGES:HISTORY_RECENT_EXCHANGES + 1])
+    if not boundary or boundary[0] <= session.summarized_through:
+        return None
+    rows = list(ChatMessage.objects.filter(session=session, id__gt=session.summarized_through,
+                                           id__lte=boundary[0])
+                .order_by('id').values_list('question', 'answer'))[-SUMMARY_FOLD_MAX_EXCHANGES:]
+    return session, boundary[0], rows
+
+
+def _save_summary(session, summary, summarized_through):
+    # Compare-and-set: if a concurrent update for this session saved first, keep that one
+    return ChatSession.objects.filter(pk=session.pk, summarized_through=session.summarized_through).update(
+        summary=summary, summarized_through=summarized_through) == 1
+
+
+def fold_summary(session_pk):
+    """Fold the session's exchanges older than the recent window into its summary and save it"""
+    try:
+        pending = _retry_locked(_unsummarized, session_pk)
+        if pending is None:
+            return False
+        session, summarized_through, rows = pending
+
+        # The LLM calls run with no DB work in flight
+        summary = session.summary
+        client = get_llm_client()
+        for start in range(0, len(rows), SUMMARY_FOLD_BATCH):
+            summary = update_summary(summary, rows[start:start + SUMMARY_FOLD_BATCH], client, CHAT_MODEL)
+
+        return _retry_locked(_save_summary, session, summary, summarized_through)
+    except Exception as e:
+        logger.warning(f"Updating the summary of chat session {session_pk} failed: {e}")
+        return False
+
+
+def _run_fold(session_pk):
+    with _pending_lock:
+        _pending.discard(session_pk)
+    try:
+        fold_summary(session_pk)
+    finally:
+        # Not a request thread, so nothing else closes this thread's connection
+        close_old_connections()
+
+
+def schedule_summary_update(session):
+    """Queue a fold of the session's older exchanges; call it once the answer is on its way out
+
+    A session with a fold already queued is skipped: that fold reads the
+    messages when it runs, so it covers this one too.
+    """
+    with _pending_lock:
+        if session.pk in _pending:
+            return
+        _pending.add(session.pk)
+    _summary_pool.submit(_run_fold, session.pk)
+
+
+def wait_for_summary_updates(timeout=None):
+    """Block until every fold queued so far has finished (tests, benchmarks, shutdown)"""
+    # One worker runs jobs in order, so a no-op queued now finishes after all of them
+    _summary_pool.submit(lambda: None).result(timeout)
@@ -0,0 +1,85 @@
+# ragapp/corpus.py - retrieval across many documents through the sharded corpus index
+import os
+import logging
+
+import numpy as np
+from django.conf import settings
+
+from .models import Chunk
+from .utils.rag import embed_query
+from .utils.context_builder import assemble_context
+from .utils.sharded_index import ShardedIndex
+
+logger = logging.getLogger(__name__)
+
+# Add every ingested document to the corpus index
+CORPUS_INDEX_ENABLED = os.getenv('CORPUS_INDEX_ENABLED', 'True') == 'True'
+# Each document is added as a shard of its own; past this many small shards they are merged,
+# since every shard adds to each search's fan-out
+CORPUS_MERGE_SMALL_SHARDS = int(os.getenv('CORPUS_MERGE_SMALL_SHARDS', '16'))
+
+_corpus_index = None
+
+
+def get_corpus_index():
+    global _corpus_index
+    if _corpus_index is None:
+        _corpus_index = ShardedIndex(os.path.join(settings.MEDIA_ROOT, 'indices', 'corpus'))
+    return _corpus_index
+
+
+def add_document_to_corpus(document, merge=True):
+    """Index a document's stored chunk embeddings in the corpus; False if any are missing
+
+    With merge, small shards are merged once more than CORPUS_MERGE_SMALL_SHARDS exist.
+    """
+    chunk_ids = []
+    vectors = []
+    for chunk_id, embedding in (Chunk.objects.filter(document=document)
+                                .order_by('id').values_list('id', 'embedding').iterator(chunk_size=2000)):
+        if not embedding:
+            return False
+        chunk_ids.append(chunk_id)
+        vectors.append(np.frombuffer(bytes(embedding), dtype='<f4'))
+    if not vectors:
+        return False
+    corpus = get_corpus_index()
+    corpus.add_document(document.id, chunk_ids, np.vstack(vectors))
+    if merge and corpus.small_shard_count() > CORPUS_MERGE_SMALL_SHARDS:
+        corpus.merge_shards()
+    return True
+
+
+def retrieve_corpus_context(question, document_ids=None, top_k=7):
+    """Like rag.retrieve_context, but over the whole corpus (or a subset of documents)"""
+    query_embedding = embed_query(question)
+    hits = get_corpus_index().search(query_embedding, k=top_k, document_ids=document_ids)[0]
+
+    rows = Chunk.objects.select_related('document').in_bulk([chunk_id for _, chunk_id, _ in hits])
+
+    results = []
+    for distance, chunk_id, _ in hits:
+        chunk = rows.get(chunk_id)
+        if chunk is None:  # deleted since the shard was written
+            continue
+        results.append({
+            'document_id': chunk.document_id,
+            'chunk_id': chunk.id,
+            'title': chunk.document.title,
+            'page': chunk.page_num,
+            'text': chunk.content,
+            'label': f"{chunk.document.title} p:{chunk.page_num}",
+        })
+    context, used = assemble_context(results)
+
+    citations = []
+    for result in used:
+        citations.append({
+            'document_id': result['document_id'],
+            'chunk_id': result['chunk_id'],
+            'title': result['title'],
+            'page': result['page'],
+            'snippet': result['text'][:200] + '...' if len(result['text']) > 200 else result['text']
+        })
+
+    return context, citations
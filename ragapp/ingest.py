@@ -0,0 +1,257 @@
+# ragapp/ingest.py - background PDF ingestion backed by the IngestionJob table
+import os
+import uuid
+import logging
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Chunk, ChatSession, Document, IngestionJob
+from .corpus import CORPUS_INDEX_ENABLED, add_document_to_corpus
+from .utils.pdf_loader import extract_pdf_text_with_pages, count_pdf_pages
+from .utils.chunker import iter_chunk_spans
+from .utils.rag import FaissStore, embed_texts, save_index
+from .utils.metrics import span
+
+logger = logging.getLogger(__name__)
+
+EMBED_BATCH_SIZE = int(os.getenv('INGEST_EMBED_BATCH_SIZE', '64'))
+CHUNK_BULK_BATCH_SIZE = int(os.getenv('CHUNK_BULK_BATCH_SIZE', '500'))
+# Pages extracted, chunked, embedded and indexed together; bounds peak memory per job
+INGEST_PAGE_WINDOW = int(os.getenv('INGEST_PAGE_WINDOW', '50'))
+# Run jobs inside the upload request instead of waiting for `manage.py ingest_worker`;
+# on by default under DEBUG so a bare `runserver` ingests uploads
+INGEST_INLINE = os.getenv('INGEST_INLINE', str(settings.DEBUG)) == 'True'
+
+
+def enqueue(document):
+    """Queue a document for ingestion and return the job"""
+    return IngestionJob.objects.create(document=document, job_id=uuid.uuid4().hex)
+
+
+def find_ingested_copy(sha256):
+    """The most recent fully ingested document with these file contents, or None"""
+    if not sha256:
+        return None
+    return (Document.objects.filter(sha256=sha256, jobs__status='done')
+            .order_by('-id').first())
+
+
+def reuse_document(document):
+    """Open a new chat session on an already ingested document; returns a finished job for it
+
+    Nothing is extracted or embedded: the document's chunks and index are shared.
+    The job mirrors the original one so status polling works as for a fresh upload.
+    """
+    original = document.jobs.filter(status='done').order_by('-id').first()
+    sid = uuid.uuid4().hex[:16]
+    ChatSession.objects.create(document=document, session_id=sid)
+    now = timezone.now()
+    return IngestionJob.objects.create(
+        document=document, job_id=uuid.uuid4().hex, status='done', stage='done',
+        pages_total=original.pages_total, pages_extracted=original.pages_extracted,
+        chunks_total=original.chunks_total, chunks_embedded=original.chunks_embedded,
+        index_built=True, session_id=sid, started_at=now, finished_at=now,
+    )
+
+
+def claim_next_job():
+    """Atomically mark the oldest queued job as running and return it (or None)"""
+    with transaction.atomic():
+        job = (IngestionJob.objects
+               .select_for_update(skip_locked=True)
+               .filter(status='queued')
+               .order_by('created_at')
+               .first())
+        if job is None:
+            return None
+        job.status = 'running'
+        job.attempts += 1
+        job.started_at = timezone.now()
+        job.save(update_fields=['status', 'attempts', 'started_at', 'updated_at'])
+    return job
+
+
+def requeue_stale_jobs(older_than_minutes):
+    """Put back jobs left 'running' by a worker that died"""
+    cutoff = timezone.now() - timedelta(minutes=older_than_minutes)
+    return (IngestionJob.objects
+            .filter(status='running', updated_at__lt=cutoff)
+            .update(status='queued', stage=''))
+
+
+def _progress(job, **fields):
+    for name, value in fields.items():
+        setattr(job, name, value)
+    job.save(update_fields=list(fields) + ['updated_at'])
+
+
+def save_chunks(document, chunks, vectors):
+    """Insert chunks with their float32 embeddings in one transaction, in batches
+
+    Sets chunk['chunk_id'] on each chunk dict so index payloads can point at the rows.
+    """
+    rows = []
+    for chunk, vector in zip(chunks, vectors):
+        row = Chunk(document=document, page_num=chunk['page'], content=chunk['text'])
+        row.set_embedding(vector)
+        rows.append(row)
+    with span('save_chunks'), transaction.atomic():
+        Chunk.objects.bulk_create(rows, batch_size=CHUNK_BULK_BATCH_SIZE)
+        if rows and rows[0].pk is None:
+            # MySQL doesn't return ids from bulk INSERTs; ours are this document's newest rows
+            ids = list(Chunk.objects.filter(document=document)
+                       .order_by('-id').values_list('id', flat=True)[:len(rows)])[::-1]
+            for row, pk in zip(rows, ids):
+                row.pk = pk
+    for chunk, row in zip(chunks, rows):
+        chunk['chunk_id'] = row.pk
+    return len(rows)
+
+
+def chunk_embeddings(chunk_ids):
+    """Stored float32 embeddings by chunk id (for re-ranking quantized search results)"""
+    return {chunk_id: np.frombuffer(bytes(embedding), dtype='<f4')
+            for chunk_id, embedding in Chunk.objects.filter(id__in=chunk_ids).values_list('id', 'embedding')
+            if embedding}
+
+
+def rebuild_index_from_db(document, window=2000, quantization=None):
+    """Rebuild a document's index from stored chunk embeddings; None if any are missing"""
+    store = None
+    payloads = []
+    vectors = []
+
+    def flush():
+        nonlocal store
+        if store is None:
+            store = FaissStore(dim=len(vectors[0]))
+        store.add(np.vstack(vectors), payloads)
+        payloads.clear()
+        vectors.clear()
+
+    for chunk in Chunk.objects.filter(document=document).order_by('id').iterator(chunk_size=window):
+        vector = chunk.get_embedding()
+        if vector is None:
+            return None
+        payloads.append({'page': chunk.page_num, 'text': chunk.content, 'chunk_id': chunk.id})
+        vectors.append(vector)
+        if len(vectors) >= window:
+            flush()
+    if vectors:
+        flush()
+    if store is None:
+        return None
+    return save_index(document, store, quantization)
+
+
+def iter_chunk_windows(pdf_path, window_pages=None):
+    """Yield (last_page_num, chunks) for consecutive windows of extracted pages"""
+    window_pages = window_pages or INGEST_PAGE_WINDOW
+    chunks = []
+    pages_in_window = 0
+    page_num = 0
+    pages = extract_pdf_text_with_pages(pdf_path)
+    while True:
+        with span('extract_page'):
+            page = next(pages, None)
+        if page is None:
+            break
+        page_num, text = page
+        with span('chunk_page'):
+            # Sized by CHUNK_SIZE / CHUNK_OVERLAP / CHUNK_UNIT
+            for start, end in iter_chunk_spans(text):
+                chunks.append({'page': page_num, 'text': text[start:end]})
+        pages_in_window += 1
+        if pages_in_window >= window_pages:
+            yield page_num, chunks
+            chunks = []
+            pages_in_window = 0
+    if chunks or pages_in_window:
+        yield page_num, chunks
+
+
+def embed_chunks(chunks, on_batch=None):
+    """Embed a window of chunks in EMBED_BATCH_SIZE pieces; returns one float32 matrix"""
+    batches = []
+    for start in range(0, len(chunks), EMBED_BATCH_SIZE):
+        batch = chunks[start:start + EMBED_BATCH_SIZE]
+        batches.append(np.asarray(embed_texts([c['text'] for c in batch]), dtype='float32'))
+        if on_batch:
+            on_batch(len(batch))
+    return np.vstack(batches)
+
+
+def run_job(job):
+    """Stream the job's document through extract -> chunk -> embed -> index, one page window at a time"""
+    document = job.document
+    try:
+        _progress(job, stage='processing', pages_total=count_pdf_pages(document.file.path),
+                  pages_extracted=0, chunks_total=0, chunks_embedded=0, index_built=False, error='')
+        # A previous attempt may have died half-way
+        Chunk.objects.filter(document=document).delete()
+
+        store = None
+        page_count = 0
+        for page_count, chunks in iter_chunk_windows(document.file.path):
+            _progress(job, pages_extracted=page_count, chunks_total=job.chunks_total + len(chunks))
+            if not chunks:
+                continue
+
+            def on_batch(n):
+                _progress(job, chunks_embedded=job.chunks_embedded + n)
+            vectors = embed_chunks(chunks, on_batch)
+
+            save_chunks(document, chunks, vectors)
+            if store is None:
+                store = FaissStore(dim=vectors.shape[1])
+            store.add(vectors, [{'page': c['page'], 'text': c['text'], 'chunk_id': c['chunk_id']}
+                                for c in chunks])
+
+        if store is None:
+            raise ValueError("No text could be extracted from the PDF")
+
+        _progress(job, stage='indexing')
+        document.num_pages = page_count
+        document.save()
+        save_index(document, store)
+        if CORPUS_INDEX_ENABLED:
+            try:
+                with span('corpus_add'):
+                    add_document_to_corpus(document)
+            except Exception as e:
+                # Per-document search still works; the corpus can be rebuilt later
+                logger.warning(f"Adding document {document.id} to the corpus index failed: {e}")
+
+        sid = uuid.uuid4().hex[:16]
+        ChatSession.objects.create(document=document, session_id=sid)
+        _progress(job, stage='done', status='done', index_built=True,
+                  session_id=sid, finished_at=timezone.now())
+
+    except Exception as e:
+        logger.exception(f"Ingestion job {job.job_id} failed")
+        Chunk.objects.filter(document=document).delete()
+        _progress(job, status='failed', error=f'PDF processing failed: {str(e)}',
+                  finished_at=timezone.now())
+    return job
+
+
+def job_status(job):
+    """JSON-friendly view of a job's progress"""
+    return {
+        'job_id': job.job_id,
+        'status': job.status,
+        'stage': job.stage,
+        'title': job.document.title,
+        'pages_total': job.pages_total,
+        'pages_extracted': job.pages_extracted,
+        'chunks_total': job.chunks_total,
+        'chunks_embedded': job.chunks_embedded,
+        'index_built': job.index_built,
+        'session_id': job.session_id or None,
+        'num_pages': job.document.num_pages,
+        'error': job.error or None,
+    }
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from ragapp.corpus import add_document_to_corpus, get_corpus_index
+from ragapp.models import Document
+
+
+class Command(BaseCommand):
+    help = "Add existing documents to the cross-document corpus index from their stored embeddings"
+
+    def add_arguments(self, parser):
+        parser.add_argument('document_ids', nargs='*', type=int,
+                            help="Only these documents (default: all)")
+
+    def handle(self, *args, **options):
+        documents = Document.objects.order_by('id')
+        if options['document_ids']:
+            documents = documents.filter(id__in=options['document_ids'])
+
+        added = skipped = 0
+        for document in documents.iterator():
+            if add_document_to_corpus(document, merge=False):
+                added += 1
+            else:
+                skipped += 1
+                self.stdout.write(f"Skipped {document.id} ({document.title}): no stored embeddings")
+
+        corpus = get_corpus_index()
+        # Every added document got a shard of its own; pack them into full-size shards once, at the end
+        merged = corpus.merge_shards()
+        stats = corpus.stats()
+        self.stdout.write(self.style.SUCCESS(
+            f"Added {added} document(s), skipped {skipped}, merged away {merged} shard(s). "
+            f"Corpus: {stats['documents']} documents, "
+            f"{stats['vectors']} vectors in {stats['shards']} shard(s)"))
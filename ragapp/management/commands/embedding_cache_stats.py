@@ -0,0 +1,34 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from ragapp.utils import embedding_cache
+
+
+class Command(BaseCommand):
+    help = "Report (or clear) the persistent embedding cache"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--json', action='store_true', help="Print the report as JSON")
+        parser.add_argument('--clear', action='store_true', help="Delete cached vectors and counters")
+        parser.add_argument('--model', help="Limit --clear to one embedding model")
+
+    def handle(self, *args, **options):
+        if options['clear']:
+            embedding_cache.clear(options['model'])
+            self.stdout.write(self.style.SUCCESS("Embedding cache cleared"))
+            return
+
+        report = embedding_cache.stats()
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        self.stdout.write(f"Cache file: {report['path']} ({report['file_bytes'] / 1024 / 1024:.1f} MiB)")
+        if not report['models']:
+            self.stdout.write("No cached embeddings")
+        for model, entry in sorted(report['models'].items()):
+            self.stdout.write(
+                f"{model}: {entry['entries']} vectors, {entry['bytes'] / 1024 / 1024:.1f} MiB, "
+                f"hits={entry['hits']} misses={entry['misses']} hit_rate={entry['hit_rate']:.1%}"
+            )
@@ -0,0 +1,26 @@
+import hashlib
+
+from django.core.management.base import BaseCommand
+
+from ragapp.models import Document
+
+
+class Command(BaseCommand):
+    help = "Fill in the SHA-256 of documents uploaded before content hashing, so re-uploads of them are detected"
+
+    def handle(self, *args, **options):
+        hashed = missing = 0
+        for document in Document.objects.filter(sha256='').order_by('id').iterator():
+            sha256 = hashlib.sha256()
+            try:
+                with document.file.open('rb') as f:
+                    for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                        sha256.update(chunk)
+            except (FileNotFoundError, ValueError):
+                missing += 1
+                self.stdout.write(f"Skipped {document.id} ({document.title}): file missing")
+                continue
+            Document.objects.filter(pk=document.pk).update(sha256=sha256.hexdigest())
+            hashed += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Hashed {hashed} document(s), {missing} without a file"))
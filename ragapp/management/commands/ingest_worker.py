@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from ragapp.ingest import claim_next_job, requeue_stale_jobs, run_job
+
+
+class Command(BaseCommand):
+    help = "Process queued PDF ingestion jobs"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help="Drain the queue once and exit instead of polling forever")
+        parser.add_argument('--poll-interval', type=float, default=2.0,
+                            help="Seconds to sleep when the queue is empty")
+        parser.add_argument('--stale-minutes', type=int, default=30,
+                            help="Requeue jobs stuck in 'running' for longer than this at startup")
+
+    def handle(self, *args, **options):
+        requeued = requeue_stale_jobs(options['stale_minutes'])
+        if requeued:
+            self.stdout.write(f"Requeued {requeued} stale job(s)")
+
+        while True:
+            job = claim_next_job()
+            if job is None:
+                if options['once']:
+                    return
+                time.sleep(options['poll_interval'])
+                continue
+
+            self.stdout.write(f"Processing job {job.job_id} ({job.document.title})")
+            run_job(job)
+            if job.status == 'done':
+                self.stdout.write(self.style.SUCCESS(
+                    f"Job {job.job_id} done: {job.pages_extracted} pages, {job.chunks_total} chunks"))
+            else:
+                self.stdout.write(self.style.ERROR(f"Job {job.job_id} failed: {job.error}"))
@@ -0,0 +1,58 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ragapp.ingest import rebuild_index_from_db
+from ragapp.models import Document
+from ragapp.utils import rag
+
+
+class Command(BaseCommand):
+    help = ("Re-encode existing document indexes with a vector storage mode (none, fp16, sq8, pq), "
+            "from the stored chunk embeddings where available")
+
+    def add_arguments(self, parser):
+        parser.add_argument('document_ids', nargs='*', type=int, help="Only these documents (default: all)")
+        parser.add_argument('--quantization', default=rag.FAISS_QUANTIZATION,
+                            help="Target storage mode (default: FAISS_QUANTIZATION)")
+        parser.add_argument('--from-index', action='store_true',
+                            help="Re-encode the vectors in the index files instead of Chunk.embedding")
+
+    def handle(self, *args, **options):
+        quantization = options['quantization'].lower()
+        try:
+            rag.choose_quantization(0, quantization)
+        except ValueError as e:
+            raise CommandError(str(e))
+        # IVF indexes need an in-memory direct map to hand their vectors back
+        rag.FAISS_MMAP = False
+
+        documents = Document.objects.order_by('id')
+        if options['document_ids']:
+            documents = documents.filter(id__in=options['document_ids'])
+
+        converted = skipped = 0
+        before_total = after_total = 0
+        for document in documents.iterator():
+            index_path = rag.get_index_path(document)
+            if not os.path.exists(index_path):
+                skipped += 1
+                continue
+            before = os.path.getsize(index_path)
+
+            store = None if options['from_index'] else rebuild_index_from_db(document, quantization=quantization)
+            if store is None:
+                store = rag.FaissStore()
+                store.load(index_path)
+                store = rag.save_index(document, store, quantization)
+
+            after = os.path.getsize(index_path)
+            before_total += before
+            after_total += after
+            converted += 1
+            self.stdout.write(f"{document.id} ({document.title}): {store.index_type}/{store.quantization}, "
+                              f"{before / 1024 / 1024:.1f} -> {after / 1024 / 1024:.1f} MiB")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Converted {converted} index(es), skipped {skipped} without one: "
+            f"{before_total / 1024 / 1024:.1f} -> {after_total / 1024 / 1024:.1f} MiB"))
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+
+from benchmarks.common import print_table
+from benchmarks.suite import run_suite, write_json
+
+
+class Command(BaseCommand):
+    help = "Run the offline end-to-end performance suite (synthetic PDF, fake embedding/LLM providers)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pages', type=int, default=100, help="Pages in the synthetic PDF")
+        parser.add_argument('--questions', type=int, default=30, help="Questions for the retrieval and ask stages")
+        parser.add_argument('--json', metavar='PATH', help="Write the report as JSON ('-' for stdout)")
+        parser.add_argument('--real', action='store_true',
+                            help="Use the configured embedding/LLM providers instead of the fakes")
+        parser.add_argument('--backend', help="PDF backend (pymupdf or pypdf2)")
+        parser.add_argument('--workers', type=int, help="PDF extraction worker processes")
+        parser.add_argument('--no-memory', action='store_true',
+                            help="Skip tracemalloc peak-memory tracking (it slows Python-heavy stages)")
+
+    def handle(self, *args, **options):
+        report = run_suite(
+            pages=options['pages'],
+            questions=options['questions'],
+            real=options['real'],
+            backend=options['backend'],
+            workers=options['workers'],
+            trace_memory=not options['no_memory'],
+        )
+
+        if options['json']:
+            write_json(report, options['json'])
+            if options['json'] == '-':
+                return
+
+        meta = report['meta']
+        print_table(
+            f"ragbench: {meta['pages']} pages, {meta['chunks']} chunks, {meta['questions']} questions "
+            f"({meta['embedding_provider']} embeddings, {meta['llm_provider']} LLM, {meta['index_type']} index)",
+            list(report['stages'].items()),
+        )
+        self.stdout.write(f"max RSS {meta['max_rss_mb']:.0f} MB")
+        if options['json']:
+            self.stdout.write(self.style.SUCCESS(f"Report written to {options['json']}"))
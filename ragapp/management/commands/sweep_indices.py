@@ -0,0 +1,78 @@
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from ragapp.corpus import get_corpus_index
+from ragapp.models import Document
+from ragapp.utils import rag
+
+
+class Command(BaseCommand):
+    help = ("Remove index files left behind by deleted documents or interrupted saves, "
+            "compact and merge the corpus index shards, and report the disk space reclaimed")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Report what would be removed, change nothing")
+        parser.add_argument('--tmp-age', type=float, default=60,
+                            help="Minutes after which a live document's .tmp files count as abandoned (default 60)")
+        parser.add_argument('--min-stale', type=float, default=0.0,
+                            help="Only compact corpus shards with more than this fraction of stale vectors")
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        index_dir = os.path.join(settings.MEDIA_ROOT, 'indices')
+
+        start = time.perf_counter()
+        files = {}  # document id -> [(path, size, mtime, is_tmp)]
+        if os.path.isdir(index_dir):
+            with os.scandir(index_dir) as entries:
+                for entry in entries:
+                    match = rag.INDEX_FILE_RE.match(entry.name)
+                    if match is None or not entry.is_file():
+                        continue
+                    stat = entry.stat()
+                    files.setdefault(int(match.group(1)), []).append(
+                        (entry.path, stat.st_size, stat.st_mtime, match.group(3) is not None))
+        scan_ms = (time.perf_counter() - start) * 1000
+        live = set(Document.objects.values_list('id', flat=True))
+
+        cutoff = time.time() - options['tmp_age'] * 60
+        orphans = [(path, size) for document_id, entries in files.items() if document_id not in live
+                   for path, size, _, _ in entries]
+        abandoned = [(path, size) for document_id, entries in files.items() if document_id in live
+                     for path, size, mtime, is_tmp in entries if is_tmp and mtime < cutoff]
+        removed_bytes = 0
+        for path, size in orphans + abandoned:
+            if not dry_run:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    continue
+            removed_bytes += size
+        orphan_documents = len({document_id for document_id in files if document_id not in live})
+        self.stdout.write(f"Scanned {sum(len(e) for e in files.values())} index files in {scan_ms:.1f} ms: "
+                          f"{len(orphans)} from {orphan_documents} deleted document(s), "
+                          f"{len(abandoned)} abandoned .tmp file(s), {removed_bytes / 1024 / 1024:.1f} MiB")
+
+        corpus = get_corpus_index()
+        missing = [int(d) for shard in corpus.manifest()['shards'] for d in shard['documents'] if int(d) not in live]
+        if dry_run:
+            stats = corpus.stats()
+            self.stdout.write(f"Corpus: {len(missing)} deleted document(s) still listed, "
+                              f"{stats['stale_vectors']} stale vector(s) in {stats['shards']} shard(s)")
+            compacted_bytes = 0
+        else:
+            for document_id in missing:
+                corpus.remove_document(document_id)
+            compacted_bytes = corpus.compact(options['min_stale'])
+            # Documents ingested since the last sweep each sit in a small shard of their own
+            merged = corpus.merge_shards()
+            self.stdout.write(f"Corpus: dropped {len(missing)} deleted document(s), "
+                              f"compaction reclaimed {compacted_bytes / 1024 / 1024:.1f} MiB, "
+                              f"merged away {merged} small shard(s)")
+
+        verb = "Would reclaim" if dry_run else "Reclaimed"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {(removed_bytes + compacted_bytes) / 1024 / 1024:.1f} MiB"))
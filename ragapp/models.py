@@ -1,5 +1,6 @@
 from django.db import models
 import os
+import numpy as np
 
 class Document(models.Model):
     title = models.CharField(max_length=255, blank=True)
@@ -7,6 +8,8 @@ class Document(models.Model):
     uploaded_at = models.DateTimeField(auto_now_add=True)
     num_pages = models.IntegerField(default=0)
     index_path = models.CharField(max_length=500, blank=True)  # Add this field
+    # SHA-256 of the PDF bytes, for reusing an already ingested copy of the same file
+    sha256 = models.CharField(max_length=64, blank=True, default='', db_index=True)
     
     def save(self, *args, **kwargs):
         if not self.title:
@@ -22,14 +25,27 @@ class Chunk(models.Model):
     page_num = models.IntegerField()
     content = models.TextField()
     embedding_dim = models.IntegerField(default=3072) # for text-embedding-3-large
-    # Optional: store embedding bytes for audit/debug (not used for retrieval at runtime)
+    # float32 vector bytes, so an index can be rebuilt without re-embedding
     embedding = models.BinaryField(null=True, blank=True)
 
+    def set_embedding(self, vector):
+        vector = np.asarray(vector, dtype='<f4')
+        self.embedding = vector.tobytes()
+        self.embedding_dim = vector.shape[0]
+
+    def get_embedding(self):
+        if not self.embedding:
+            return None
+        return np.frombuffer(bytes(self.embedding), dtype='<f4')
+
 
 class ChatSession(models.Model):
     document = models.ForeignKey(Document, on_delete=models.CASCADE, related_name='sessions')
     session_id = models.CharField(max_length=64, unique=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Rolling summary of the exchanges up to and including ChatMessage id summarized_through
+    summary = models.TextField(blank=True, default='')
+    summarized_through = models.IntegerField(default=0)
 
 
 class ChatMessage(models.Model):
@@ -39,4 +55,33 @@ class ChatMessage(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     
     def __str__(self):
-        return f"Q: {self.question[:50]}..."
\ No newline at end of file
+        return f"Q: {self.question[:50]}..."
+
+class IngestionJob(models.Model):
+    """DB-backed queue entry for processing an uploaded PDF outside the request"""
+    STATUS_CHOICES = [
+        ('queued', 'queued'),
+        ('running', 'running'),
+        ('done', 'done'),
+        ('failed', 'failed'),
+    ]
+
+    job_id = models.CharField(max_length=32, unique=True)
+    document = models.ForeignKey(Document, on_delete=models.CASCADE, related_name='jobs')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued', db_index=True)
+    stage = models.CharField(max_length=20, blank=True, default='')
+    pages_total = models.IntegerField(default=0)
+    pages_extracted = models.IntegerField(default=0)
+    chunks_total = models.IntegerField(default=0)
+    chunks_embedded = models.IntegerField(default=0)
+    index_built = models.BooleanField(default=False)
+    session_id = models.CharField(max_length=64, blank=True, default='')  # chat session created on completion
+    error = models.TextField(blank=True, default='')
+    attempts = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.job_id} ({self.status})"
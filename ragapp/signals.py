@@ -0,0 +1,44 @@
+# ragapp/signals.py - keep the files stored for a document in step with its row
+import logging
+
+from django.db import transaction
+
+from .corpus import get_corpus_index
+from .utils import rag
+from .utils.answer_cache import get_answer_cache
+
+logger = logging.getLogger(__name__)
+
+
+def delete_document_files(document_id, file=None):
+    """Remove what a document keeps outside the database; returns the bytes freed
+
+    Its index files and uploaded PDF are deleted and it is evicted from the
+    index and answer caches. In the corpus index it is only hidden: shards are
+    compacted in bulk by `manage.py sweep_indices`.
+    """
+    freed = rag.delete_index(document_id)
+    get_corpus_index().remove_document(document_id)
+    get_answer_cache().forget_document(document_id)
+    if file and file.storage.exists(file.name):
+        freed += file.size
+        file.storage.delete(file.name)
+    return freed
+
+
+def document_deleted(sender, instance, **kwargs):
+    """post_delete receiver for Document (connected in RagappConfig.ready)"""
+    # Captured now: Django clears instance.pk once the delete returns, which can be before commit
+    document_id, file = instance.id, instance.file
+
+    def cleanup():
+        try:
+            freed = delete_document_files(document_id, file)
+        except Exception as e:
+            # The row is gone either way; sweep_indices picks up whatever is left
+            logger.warning(f"Cleaning up files of deleted document {document_id} failed: {e}")
+            return
+        logger.info(f"Deleted document {document_id}: {freed / 1024 / 1024:.1f} MiB of files removed")
+
+    # Only once the delete is committed: a rolled-back delete keeps its files
+    transaction.on_commit(cleanup)
@@ -55,17 +55,8 @@ document.addEventListener('DOMContentLoaded', function() {
         .then(response => response.json())
         .then(data => {
             if (data.ok) {
-                sessionId = data.session_id;
-                documentTitle = data.title;
-                uploadStatus.textContent = `Upload successful! Document: ${data.title}, Pages: ${data.num_pages}`;
-                uploadStatus.style.color = 'green';
-                
-                showChatSection(data.title);
-                // In your upload success handler, update the welcome message call:
-addMessage(`I've processed "${data.title}" (${data.num_pages} pages). Ask me anything about this document!`, 'bot', '');
-
-// And in the initial load:
-addMessage("Welcome! I'm ready to answer questions about your document. Ask me anything about the content.", 'bot', '');
+                uploadStatus.textContent = `Uploaded ${data.title}, processing...`;
+                pollJobStatus(data.status_url);
             } else {
                 // Handle different error formats
                 let errorMessage = 'Upload failed: ';
@@ -89,6 +80,45 @@ addMessage("Welcome! I'm ready to answer questions about your document. Ask me a
         });
     });
 
+    // Poll the ingestion job until the document is ready to chat with
+    function pollJobStatus(statusUrl) {
+        fetch(statusUrl)
+        .then(response => response.json())
+        .then(data => {
+            if (!data.ok || data.status === 'failed') {
+                uploadStatus.textContent = 'Upload failed: ' + (data.error || 'Unknown error occurred');
+                uploadStatus.style.color = 'red';
+                return;
+            }
+            if (data.status !== 'done') {
+                let progress = `Processing ${data.title}: `;
+                if (data.stage === 'processing') {
+                    progress += `${data.pages_extracted}/${data.pages_total} pages, ${data.chunks_embedded} chunks embedded`;
+                } else if (data.stage === 'indexing') {
+                    progress += 'saving index';
+                } else {
+                    progress += 'waiting in queue';
+                }
+                uploadStatus.textContent = progress;
+                setTimeout(() => pollJobStatus(statusUrl), 1000);
+                return;
+            }
+
+            sessionId = data.session_id;
+            documentTitle = data.title;
+            uploadStatus.textContent = `Upload successful! Document: ${data.title}, Pages: ${data.num_pages}`;
+            uploadStatus.style.color = 'green';
+            
+            showChatSection(data.title);
+            addMessage(`I've processed "${data.title}" (${data.num_pages} pages). Ask me anything about this document!`, 'bot', '');
+            addMessage("Welcome! I'm ready to answer questions about your document. Ask me anything about the content.", 'bot', '');
+        })
+        .catch(error => {
+            uploadStatus.textContent = 'Status error: ' + error;
+            uploadStatus.style.color = 'red';
+        });
+    }
+
     // Handle sending messages
     sendButton.addEventListener('click', sendMessage);
     chatInput.addEventListener('keypress', function(e) {
@@ -106,7 +136,39 @@ function sendMessage() {
     addMessage(question, 'user');
     chatInput.value = '';
     
-    fetch('/ask/', {
+    // The answer is streamed as Server-Sent Events: citations, tokens, then done
+    const botDiv = document.createElement('div');
+    botDiv.className = 'message bot-message';
+    chatMessages.appendChild(botDiv);
+    let answer = '';
+    
+    function handleEvent(raw) {
+        let event = 'message';
+        let data = '';
+        raw.split('\n').forEach(line => {
+            if (line.startsWith('event: ')) {
+                event = line.slice(7);
+            } else if (line.startsWith('data: ')) {
+                data += line.slice(6);
+            }
+        });
+        const payload = data ? JSON.parse(data) : {};
+        
+        if (event === 'token') {
+            answer += payload.text;
+            botDiv.textContent = answer;
+            chatMessages.scrollTop = chatMessages.scrollHeight;
+        } else if (event === 'done') {
+            // Re-render the complete answer with formatting and highlights
+            botDiv.remove();
+            addMessage(answer, 'bot', question);
+        } else if (event === 'error') {
+            botDiv.remove();
+            addMessage('Error: ' + (payload.error || 'Unknown error'), 'bot', question);
+        }
+    }
+    
+    fetch('/ask/stream/', {
         method: 'POST',
         headers: {
             'Content-Type': 'application/json',
@@ -117,15 +179,35 @@ function sendMessage() {
             question: question
         })
     })
-    .then(response => response.json())
-    .then(data => {
-        if (data.ok) {
-            addMessage(data.answer, 'bot', question); // Pass the question here
-        } else {
-            addMessage('Error: ' + (data.error || 'Unknown error'), 'bot', question);
+    .then(response => {
+        const contentType = response.headers.get('Content-Type') || '';
+        if (!contentType.startsWith('text/event-stream')) {
+            // Bad requests are answered with plain JSON
+            return response.json().then(data => {
+                botDiv.remove();
+                addMessage('Error: ' + (data.error || 'Unknown error'), 'bot', question);
+            });
+        }
+        
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        function read() {
+            return reader.read().then(({ done, value }) => {
+                if (done) return;
+                buffer += decoder.decode(value, { stream: true });
+                let boundary;
+                while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                    handleEvent(buffer.slice(0, boundary));
+                    buffer = buffer.slice(boundary + 2);
+                }
+                return read();
+            });
         }
+        return read();
     })
     .catch(error => {
+        botDiv.remove();
         addMessage('Error sending message: ' + error, 'bot', question);
     });
 }
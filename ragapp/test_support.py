@@ -0,0 +1,131 @@
+# ragapp/test_support.py - offline stand-ins for tests and benchmarks: synthetic prose and a stub OpenAI server
+import json
+import time
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+
+_WORDS = (
+    "warranty contract invoice delivery payment schedule clause party agreement "
+    "termination notice period liability insurance coverage premium renewal "
+    "section appendix exhibit schedule supplier customer service level report "
+    "quarter revenue forecast budget approval review meeting deadline milestone"
+).split()
+
+
+def paragraph(rng, sentences=5):
+    out = []
+    for _ in range(sentences):
+        words = rng.choices(_WORDS, k=rng.randint(8, 18))
+        out.append(' '.join(words).capitalize() + '.')
+    return ' '.join(out)
+
+
+def page_text(rng, paragraphs=4):
+    return '\n\n'.join(paragraph(rng) for _ in range(paragraphs))
+
+
+def fake_vector(text, dim):
+    """Deterministic unit vector derived from the text"""
+    seed = int.from_bytes(hashlib.sha256(text.encode('utf-8')).digest()[:8], 'little')
+    vec = np.random.default_rng(seed).standard_normal(dim).astype('float32')
+    return vec / np.linalg.norm(vec)
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024  # load tests open hundreds of connections at once
+
+
+class StubEmbeddingServer:
+    """Serves POST /v1/embeddings with fixed latency and an OpenAI-like request size limit.
+
+    The first `transient_failures` embedding requests get a 503 (with a short
+    retry-after), like an overloaded API. Also answers POST /v1/chat/completions
+    after `chat_latency` seconds with a canned reply.
+    """
+
+    def __init__(self, dim=64, latency=0.05, per_item_latency=0.0005, max_chars_per_request=1_200_000,
+                 chat_latency=0.5, transient_failures=0):
+        self.dim = dim
+        self.latency = latency
+        self.per_item_latency = per_item_latency
+        self.max_chars_per_request = max_chars_per_request
+        self.chat_latency = chat_latency
+        self.transient_failures = transient_failures
+        self.batch_sizes = []  # inputs per accepted embedding request
+        self.chat_requests = 0
+        self.requests = 0
+        self.rejected = 0
+        self._server = None
+
+    def __enter__(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # keep-alive, so clients pool connections as with the real API
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                if self.path.endswith('/chat/completions'):
+                    return self._chat(body)
+                inputs = body['input'] if isinstance(body['input'], list) else [body['input']]
+                stub.requests += 1
+                if stub.requests <= stub.transient_failures:
+                    return self._send(503, {'error': {'message': 'overloaded', 'type': 'server_error'}},
+                                      {'retry-after-ms': '10'})
+                if sum(len(text) for text in inputs) > stub.max_chars_per_request:
+                    stub.rejected += 1
+                    return self._send(400, {'error': {'message': 'maximum request size exceeded',
+                                                      'type': 'invalid_request_error'}})
+                stub.batch_sizes.append(len(inputs))
+                time.sleep(stub.latency + stub.per_item_latency * len(inputs))
+                self._send(200, {
+                    'object': 'list',
+                    'model': body.get('model'),
+                    'data': [{'object': 'embedding', 'index': i, 'embedding': fake_vector(text, stub.dim).tolist()}
+                             for i, text in enumerate(inputs)],
+                    'usage': {'prompt_tokens': 0, 'total_tokens': 0},
+                })
+
+            def _chat(self, body):
+                stub.chat_requests += 1
+                time.sleep(stub.chat_latency)
+                self._send(200, {
+                    'id': f"chatcmpl-stub-{stub.chat_requests}",
+                    'object': 'chat.completion',
+                    'created': int(time.time()),
+                    'model': body.get('model'),
+                    'choices': [{'index': 0, 'finish_reason': 'stop',
+                                 'message': {'role': 'assistant', 'content': 'Stub answer [p:1].'}}],
+                    'usage': {'prompt_tokens': 0, 'completion_tokens': 0, 'total_tokens': 0},
+                })
+
+            def _send(self, status, payload, headers=None):
+                data = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        self._server = _Server(('127.0.0.1', 0), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}/v1"
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
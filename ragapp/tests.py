@@ -0,0 +1,333 @@
+import os
+import random
+import asyncio
+import tempfile
+from types import SimpleNamespace
+from unittest import mock
+
+import numpy as np
+import tiktoken
+from django.db import OperationalError
+from django.test import SimpleTestCase, TestCase
+
+from . import chat_history, corpus, views
+from .test_support import StubEmbeddingServer, fake_vector, paragraph
+from .models import ChatMessage, ChatSession, Chunk, Document
+from .utils import chunker, conversation, embed_batcher, model_registry, rag, sharded_index
+from .utils.embed_batcher import embed_in_batches, pack_batches
+from .utils.tokens import count_tokens
+from .utils.answer_cache import get_answer_cache
+
+
+class AnswerCacheWithoutEmbedderTests(SimpleTestCase):
+    """With no usable embedding model, retrieval falls back to BM25; the answer cache must too"""
+
+    def test_ask_llm_answers_when_query_embedding_fails(self):
+        with mock.patch.object(rag, 'EMBEDDING_PROVIDER', 'local'), \
+                mock.patch.object(rag, 'LLM_PROVIDER', 'fake'), \
+                mock.patch.object(rag, 'get_local_model', side_effect=ModuleNotFoundError('sentence_transformers')), \
+                self.assertLogs('ragapp.utils.rag', 'WARNING'):
+            answer = rag.ask_llm('What is covered by the warranty?', '[p:1] The warranty covers parts.',
+                                 cache_scope='no-embedder-test', chunk_ids=[1, 2])
+            self.assertIn('warranty', answer)
+            # Stored in the exact tier, so asking again is a cache hit
+            hits = get_answer_cache().stats()['exact_hits']
+            self.assertEqual(rag.ask_llm('What is covered by the warranty?', '[p:1] The warranty covers parts.',
+                                         cache_scope='no-embedder-test', chunk_ids=[1, 2]), answer)
+            self.assertEqual(get_answer_cache().stats()['exact_hits'], hits + 1)
+
+
+class AnswerCacheHistoryTests(SimpleTestCase):
+    """A follow-up means different things in different conversations, so history is part of the key"""
+
+    def test_same_follow_up_in_two_sessions_gets_each_sessions_answer(self):
+        def create(model=None, messages=None, **kwargs):
+            # Answers depend on the conversation so far, like a real model's would
+            earlier = [m['content'] for m in messages if m['role'] == 'assistant']
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(
+                content=f"More about: {earlier[-1] if earlier else 'nothing yet'}"))])
+
+        client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+        context = '[p:1] Parts are covered for two years. [p:2] Labour is covered for one year.'
+        sessions = {
+            'parts': conversation.history_messages('', [('What about parts?', 'Parts: two years [p:1].')]),
+            'labour': conversation.history_messages('', [('What about labour?', 'Labour: one year [p:2].')]),
+        }
+        with mock.patch.object(rag, 'EMBEDDING_PROVIDER', 'fake'), \
+                mock.patch.object(rag, 'get_llm_client', return_value=client):
+            answers = {name: rag.ask_llm('Tell me more', context, history, cache_scope='history-test',
+                                         chunk_ids=[1, 2])
+                       for name, history in sessions.items()}
+            self.assertIn('two years', answers['parts'])
+            self.assertIn('one year', answers['labour'])
+            # The same session asking again is still served from the cache
+            hits = get_answer_cache().stats()['exact_hits']
+            self.assertEqual(rag.ask_llm('Tell me more', context, sessions['parts'], cache_scope='history-test',
+                                         chunk_ids=[1, 2]), answers['parts'])
+            self.assertEqual(get_answer_cache().stats()['exact_hits'], hits + 1)
+
+
+class AsyncClientPerLoopTests(SimpleTestCase):
+    """The AsyncOpenAI connection pool is bound to one event loop; each loop needs its own client"""
+
+    def test_aask_llm_works_from_successive_event_loops(self):
+        with StubEmbeddingServer(chat_latency=0) as stub, \
+                mock.patch.dict(os.environ, {'OPENAI_API_KEY': 'sk-stub', 'OPENAI_BASE_URL': stub.base_url}), \
+                mock.patch.object(rag, 'LLM_PROVIDER', 'openai'):
+            model_registry.clear()
+            self.addCleanup(model_registry.clear)
+            # async_to_sync and repeated asyncio.run calls each run (then close) a fresh loop
+            answers = [asyncio.run(rag.aask_llm('What is covered?', '[p:1] Parts.')) for _ in range(3)]
+        self.assertEqual(answers, ['Stub answer [p:1].'] * 3)
+        self.assertEqual(stub.chat_requests, 3)
+
+    def test_one_client_per_loop(self):
+        async def client_pair():
+            return model_registry.get_async_openai_client(), model_registry.get_async_openai_client()
+
+        with mock.patch.dict(os.environ, {'OPENAI_API_KEY': 'sk-stub'}):
+            model_registry.clear()
+            self.addCleanup(model_registry.clear)
+            first, again = asyncio.run(client_pair())
+            second, _ = asyncio.run(client_pair())
+        self.assertIs(first, again)
+        self.assertIsNot(first, second)
+        # The first loop is closed, so its client was dropped
+        self.assertEqual(len(model_registry._async_clients), 1)
+
+def _byte_encoding():
+    """Byte-level BPE whose only merge is '\\n\\n': a paragraph break costs 1 token alone, 2 in context"""
+    ranks = {bytes([i]): i for i in range(256)}
+    ranks[b'\n\n'] = 256
+    return tiktoken.Encoding('bytes-test', pat_str=r"""'s|'t| ?\p{L}+| ?\p{N}+| ?[^\s\p{L}\p{N}]+|\s+(?!\S)|\s+""",
+                             mergeable_ranks=ranks, special_tokens={})
+
+
+class TokenChunkingTests(SimpleTestCase):
+    def test_token_chunks_fit_chunk_size(self):
+        encoding = _byte_encoding()
+        rng = random.Random(0)
+        with mock.patch.object(chunker, 'get_encoding', return_value=encoding):
+            for chunk_size in (12, 40, 200):
+                for _ in range(20):
+                    text = '\n\n'.join(paragraph(rng, rng.randint(1, 6)) for _ in range(rng.randint(1, 8)))
+                    spans = chunker.chunk_spans(text, chunk_size, chunk_size // 5, unit='tokens')
+                    for start, end in spans:
+                        self.assertLessEqual(len(encoding.encode(text[start:end])), chunk_size)
+                    # Chunks advance and together cover every word
+                    self.assertTrue(all(a[1] < b[1] for a, b in zip(spans, spans[1:])))
+                    covered = set()
+                    for start, end in spans:
+                        covered.update(range(start, end))
+                    self.assertFalse([i for i, c in enumerate(text) if not c.isspace() and i not in covered])
+
+
+class PackBatchesTests(SimpleTestCase):
+    def test_batches_respect_token_and_item_limits(self):
+        rng = random.Random(0)
+        counts = [rng.randint(1, 300) for _ in range(1000)]
+        ranges = pack_batches(counts, max_tokens=1000, max_items=16)
+        # Contiguous and complete, in order
+        self.assertEqual(ranges[0][0], 0)
+        self.assertEqual(ranges[-1][1], len(counts))
+        self.assertTrue(all(a[1] == b[0] for a, b in zip(ranges, ranges[1:])))
+        for start, end in ranges:
+            self.assertLessEqual(end - start, 16)
+            self.assertLessEqual(sum(counts[start:end]), 1000)
+
+    def test_item_over_token_budget_gets_its_own_batch(self):
+        self.assertEqual(pack_batches([10, 5000, 10], max_tokens=100, max_items=10), [(0, 1), (1, 2), (2, 3)])
+
+    def test_oversize_input_is_truncated_before_sending(self):
+        sent = []
+
+        def embed(batch):
+            sent.extend(batch)
+            return np.ones((len(batch), 4))
+
+        with mock.patch.object(embed_batcher, 'EMBED_MAX_TOKENS_PER_INPUT', 50):
+            embed_in_batches(['short text', 'word ' * 1000], embed)
+        self.assertEqual(sent[0], 'short text')
+        self.assertLessEqual(count_tokens(sent[1]), 50)
+
+
+class EmbedInBatchesStubServerTests(SimpleTestCase):
+    """embed_in_batches through the OpenAI client against test_support.StubEmbeddingServer"""
+
+    def _embed(self, stub, texts, max_retries=0, **kwargs):
+        from openai import OpenAI
+        client = OpenAI(api_key='stub', base_url=stub.base_url, max_retries=max_retries)
+
+        def request(batch):
+            return [item.embedding for item in client.embeddings.create(model='stub', input=batch).data]
+
+        return embed_in_batches(texts, request, **kwargs)
+
+    def _texts(self, n):
+        rng = random.Random(1)
+        return [f"[{i}] " + paragraph(rng, rng.randint(1, 4)) for i in range(n)]
+
+    def _expected(self, stub, texts):
+        return np.vstack([fake_vector(text, stub.dim) for text in texts])
+
+    def test_concurrent_batches_keep_input_order(self):
+        texts = self._texts(300)
+        with StubEmbeddingServer(latency=0.01, per_item_latency=0) as stub:
+            vectors = self._embed(stub, texts, max_tokens=800, max_items=20, concurrency=4)
+        self.assertGreater(len(stub.batch_sizes), 10)
+        self.assertLessEqual(max(stub.batch_sizes), 20)
+        np.testing.assert_allclose(vectors, self._expected(stub, texts), rtol=1e-5)
+
+    def test_rejected_batch_is_split_and_retried(self):
+        texts = self._texts(64)
+        limit = max(len(t) for t in texts) * 5
+        with StubEmbeddingServer(latency=0, per_item_latency=0, max_chars_per_request=limit) as stub, \
+                self.assertLogs('ragapp.utils.embed_batcher', 'WARNING'):
+            vectors = self._embed(stub, texts, max_tokens=10 ** 6, max_items=64)
+        self.assertGreater(stub.rejected, 0)
+        self.assertEqual(sum(stub.batch_sizes), len(texts))
+        np.testing.assert_allclose(vectors, self._expected(stub, texts), rtol=1e-5)
+
+    def test_single_text_over_the_limit_fails(self):
+        with StubEmbeddingServer(latency=0, per_item_latency=0, max_chars_per_request=10) as stub:
+            with self.assertRaises(Exception):
+                self._embed(stub, ['a text longer than ten characters'])
+
+    def test_transient_errors_are_retried_by_the_client(self):
+        texts = self._texts(40)
+        with StubEmbeddingServer(latency=0, per_item_latency=0, transient_failures=2) as stub:
+            vectors = self._embed(stub, texts, max_retries=2, max_tokens=10 ** 6)
+        self.assertEqual(stub.requests, 3)
+        np.testing.assert_allclose(vectors, self._expected(stub, texts), rtol=1e-5)
+
+
+class ShardedIndexTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.corpus = sharded_index.ShardedIndex(os.path.join(tmp.name, 'corpus'))
+        self.rng = np.random.default_rng(0)
+        self.queries = self.rng.random((10, 16), dtype='float32')
+
+    def _add(self, document_id, n):
+        vectors = self.rng.random((n, 16), dtype='float32')
+        self.corpus.add_document(document_id, np.arange(document_id * 1000, document_id * 1000 + n), vectors)
+
+    def test_add_document_leaves_existing_shards_untouched(self):
+        self._add(1, 50)
+        first = self.corpus.manifest()['shards'][0]['name']
+        index_path = os.path.join(self.corpus.root, f"{first}.index")
+        mtime = os.stat(index_path).st_mtime_ns
+        self._add(2, 50)
+        self.assertEqual(os.stat(index_path).st_mtime_ns, mtime)
+        self.assertEqual(self.corpus.stats()['shards'], 2)
+
+    def test_merge_keeps_results_and_drops_removed_documents(self):
+        for document_id in range(1, 9):
+            self._add(document_id, 30)
+        self._add(3, 20)  # re-added: the first copy goes stale
+        self.corpus.remove_document(5)
+        before = self.corpus.search(self.queries, k=10)
+
+        with mock.patch.object(sharded_index, 'CORPUS_SHARD_MAX_VECTORS', 100):
+            self.assertEqual(self.corpus.merge_shards(), 6)
+            # Merged shards are at least half full, so a second merge has nothing to do
+            self.assertEqual(self.corpus.merge_shards(), 0)
+        stats = self.corpus.stats()
+        self.assertEqual((stats['shards'], stats['documents'], stats['vectors'], stats['stale_vectors']),
+                         (3, 7, 200, 0))
+        self.assertEqual(self.corpus.search(self.queries, k=10), before)
+        names = {shard['name'] for shard in self.corpus.manifest()['shards']}
+        self.assertEqual({f.split('.')[0].replace('_ids', '') for f in os.listdir(self.corpus.root)
+                          if f.startswith('shard_')}, names)
+
+
+class CorpusMergeTests(TestCase):
+    def test_ingest_merges_once_small_shards_pile_up(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        index = sharded_index.ShardedIndex(os.path.join(tmp.name, 'corpus'))
+        rng = np.random.default_rng(0)
+        with mock.patch.object(corpus, 'get_corpus_index', return_value=index), \
+                mock.patch.object(corpus, 'CORPUS_MERGE_SMALL_SHARDS', 3):
+            for i in range(10):
+                document = Document.objects.create(title=f"doc{i}.pdf", file=f"documents/doc{i}.pdf")
+                for page in range(5):
+                    chunk = Chunk(document=document, page_num=page, content=f"chunk {page}")
+                    chunk.set_embedding(rng.random(16, dtype='float32'))
+                    chunk.save()
+                self.assertTrue(corpus.add_document_to_corpus(document))
+                self.assertLessEqual(index.small_shard_count(), 3)
+        stats = index.stats()
+        self.assertEqual((stats['documents'], stats['vectors']), (10, 50))
+        self.assertLess(stats['shards'], 4)
+
+class FoldSummaryTests(TestCase):
+    def setUp(self):
+        document = Document.objects.create(title='manual.pdf', file='documents/manual.pdf')
+        self.session = ChatSession.objects.create(document=document, session_id='fold-test')
+        self.messages = [ChatMessage.objects.create(session=self.session, question=f"Question {i}?",
+                                                    answer=f"Answer number {i}.") for i in range(6)]
+        # No LLM client: update_summary falls back to the extractive summary
+        patcher = mock.patch.object(chat_history, 'get_llm_client', return_value=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _boundary(self):
+        return self.messages[-chat_history.HISTORY_RECENT_EXCHANGES - 1].id
+
+    def test_fold_summarizes_all_but_the_recent_exchanges(self):
+        self.assertTrue(chat_history.fold_summary(self.session.pk))
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.summarized_through, self._boundary())
+        self.assertIn('Question 0', self.session.summary)
+        # Nothing new since: a second fold is a no-op
+        self.assertFalse(chat_history.fold_summary(self.session.pk))
+
+    def test_concurrent_fold_that_saved_first_wins(self):
+        def racing_update(summary, exchanges, client=None, model=None):
+            ChatSession.objects.filter(pk=self.session.pk).update(summary='theirs', summarized_through=self._boundary())
+            return 'ours'
+
+        with mock.patch.object(chat_history, 'update_summary', side_effect=racing_update):
+            self.assertFalse(chat_history.fold_summary(self.session.pk))
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.summary, 'theirs')
+
+    def test_save_is_retried_while_the_database_is_locked(self):
+        save = chat_history._save_summary
+        calls = []
+
+        def locked_once(*args):
+            calls.append(args)
+            if len(calls) == 1:
+                raise OperationalError('database table is locked')
+            return save(*args)
+
+        with mock.patch.object(chat_history, '_save_summary', side_effect=locked_once), \
+                mock.patch.object(chat_history.time, 'sleep'):
+            self.assertTrue(chat_history.fold_summary(self.session.pk))
+        self.assertEqual(len(calls), 2)
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.summarized_through, self._boundary())
+
+
+class AskCorpusTopKTests(SimpleTestCase):
+    def _post(self, top_k):
+        return self.client.post('/ask/corpus/', data={'question': 'What is covered?', 'top_k': top_k},
+                                content_type='application/json')
+
+    def test_top_k_is_clamped(self):
+        with mock.patch.object(views, 'retrieve_corpus_context', return_value=('', [])) as retrieve, \
+                mock.patch.object(views, 'ask_llm', return_value='answer'):
+            for top_k, expected in ((10 ** 6, views.ASK_CORPUS_MAX_TOP_K), (0, 1), ('12', 12)):
+                self.assertEqual(self._post(top_k).status_code, 200)
+                self.assertEqual(retrieve.call_args.kwargs['top_k'], expected)
+
+    def test_non_integer_top_k_is_a_bad_request(self):
+        with mock.patch.object(views, 'retrieve_corpus_context') as retrieve:
+            for top_k in ('many', None, [5]):
+                response = self._post(top_k)
+                self.assertEqual(response.status_code, 400)
+                self.assertFalse(response.json()['ok'])
+        retrieve.assert_not_called()
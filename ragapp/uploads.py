@@ -0,0 +1,40 @@
+# ragapp/uploads.py - content hashing of uploaded files while Django streams them in
+import hashlib
+
+from django.core.files.uploadhandler import FileUploadHandler
+
+
+class HashingUploadHandler(FileUploadHandler):
+    """SHA-256 of each uploaded file, computed chunk by chunk as the upload arrives
+
+    Goes first in FILE_UPLOAD_HANDLERS and passes every chunk on unchanged to the
+    handlers that store the file, so hashing costs no extra read of the file.
+    Digests are left in request.upload_sha256, keyed by form field name.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self._sha256 = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        self._sha256.update(raw_data)
+        return raw_data
+
+    def file_complete(self, file_size):
+        if not hasattr(self.request, 'upload_sha256'):
+            self.request.upload_sha256 = {}
+        self.request.upload_sha256[self.field_name] = self._sha256.hexdigest()
+        return None  # let the next handler return the stored file
+
+
+def uploaded_file_sha256(request, field_name):
+    """SHA-256 of an uploaded file: from HashingUploadHandler, else by reading it once"""
+    digest = getattr(request, 'upload_sha256', {}).get(field_name)
+    if digest is not None:
+        return digest
+    uploaded = request.FILES[field_name]
+    sha256 = hashlib.sha256()
+    for chunk in uploaded.chunks():
+        sha256.update(chunk)
+    uploaded.seek(0)
+    return sha256.hexdigest()
@@ -5,5 +5,12 @@ from . import views
 urlpatterns = [
     path('', views.index, name='index'),
     path('upload/', views.upload_pdf, name='upload_pdf'),
-    path('ask/', views.ask, name='ask'),
+    path('status/<str:job_id>/', views.job_status_async if views.ASYNC_VIEWS else views.job_status,
+         name='job_status'),
+    path('ask/', views.ask_async if views.ASYNC_VIEWS else views.ask, name='ask'),
+    path('ask/stream/', views.ask_stream, name='ask_stream'),
+    path('ask/batch/', views.ask_batch, name='ask_batch'),
+    path('ask/corpus/', views.ask_corpus, name='ask_corpus'),
+    path('stats/cache/', views.cache_stats, name='cache_stats'),
+    path('metrics/', views.metrics, name='metrics'),
 ]
@@ -0,0 +1,150 @@
+# ragapp/utils/answer_cache.py - exact and semantic caches for generated answers
+import os
+import time
+import hashlib
+import threading
+import logging
+
+import numpy as np
+
+from .lru import LRUCache
+from .embedding_cache import normalize
+
+logger = logging.getLogger(__name__)
+
+ANSWER_CACHE_ENABLED = os.getenv('ANSWER_CACHE_ENABLED', 'True') == 'True'
+ANSWER_CACHE_TTL = int(os.getenv('ANSWER_CACHE_TTL', '3600'))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv('ANSWER_CACHE_MAX_ENTRIES', '2048'))
+# Reuse an answer for a differently-worded question at or above this cosine similarity,
+# when it retrieved exactly the same chunks; 0 turns the semantic tier off
+ANSWER_CACHE_SEMANTIC_THRESHOLD = float(os.getenv('ANSWER_CACHE_SEMANTIC_THRESHOLD', '0.95'))
+# Questions remembered per (scope, model, chunk set) for the semantic tier
+ANSWER_CACHE_SEMANTIC_PER_KEY = 16
+
+
+def context_hash(context):
+    return hashlib.sha256(context.encode('utf-8')).hexdigest()
+
+
+def history_hash(history):
+    """Digest of the chat history messages sent with a question; '' when there are none"""
+    if not history:
+        return ''
+    digest = hashlib.sha256()
+    for message in history:
+        digest.update(f"{message['role']}\0{message['content']}\0".encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _unit(vector):
+    vector = np.asarray(vector, dtype='float32')
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class AnswerCache:
+    """Answers keyed by (scope, model, normalized question, context hash, history hash).
+
+    `scope` is whatever identifies the source material (a document id, or a
+    tuple of them for corpus questions). The semantic tier is keyed by
+    (scope, model, retrieved chunk ids, history hash) and holds a few question
+    vectors per key; a lookup hits when a stored question is close enough in
+    cosine terms. The history hash keeps a follow-up ("what about the second
+    one?") from being answered with another conversation's answer.
+    """
+
+    def __init__(self, max_entries=None, ttl=None, threshold=None):
+        max_entries = max_entries or ANSWER_CACHE_MAX_ENTRIES
+        self.ttl = ANSWER_CACHE_TTL if ttl is None else ttl
+        self.threshold = ANSWER_CACHE_SEMANTIC_THRESHOLD if threshold is None else threshold
+        self._exact = LRUCache(max_entries=max_entries, ttl=self.ttl)
+        self._semantic = LRUCache(max_entries=max_entries, ttl=self.ttl)
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    def _semantic_key(self, scope, model, chunk_ids, history):
+        if self.threshold <= 0 or not chunk_ids or any(c is None for c in chunk_ids):
+            return None
+        return (scope, model, tuple(sorted(chunk_ids)), history_hash(history))
+
+    @staticmethod
+    def _exact_key(scope, model, question, context, history):
+        return (scope, model, normalize(question).casefold(), context_hash(context), history_hash(history))
+
+    def lookup(self, scope, model, question, context, chunk_ids=None, query_vector=None, history=None):
+        """Return (answer, 'exact' | 'semantic'), or (None, None) on a miss"""
+        answer = self._exact.get(self._exact_key(scope, model, question, context, history))
+        if answer is not None:
+            with self._lock:
+                self.exact_hits += 1
+            return answer, 'exact'
+
+        semantic_key = self._semantic_key(scope, model, chunk_ids, history)
+        if semantic_key is not None and query_vector is not None:
+            entries = self._semantic.get(semantic_key) or []
+            query = _unit(query_vector)
+            now = time.monotonic()
+            best = max(((float(vector @ query), answer) for expires_at, vector, answer in entries
+                        if expires_at > now), default=None, key=lambda item: item[0])
+            if best is not None and best[0] >= self.threshold:
+                with self._lock:
+                    self.semantic_hits += 1
+                return best[1], 'semantic'
+
+        with self._lock:
+            self.misses += 1
+        return None, None
+
+    def store(self, scope, model, question, context, answer, chunk_ids=None, query_vector=None, history=None):
+        self._exact.put(self._exact_key(scope, model, question, context, history), answer)
+
+        semantic_key = self._semantic_key(scope, model, chunk_ids, history)
+        if semantic_key is not None and query_vector is not None:
+            with self._lock:
+                now = time.monotonic()
+                entries = [entry for entry in (self._semantic.get(semantic_key) or []) if entry[0] > now]
+                entries.append((now + self.ttl, _unit(query_vector), answer))
+                self._semantic.put(semantic_key, entries[-ANSWER_CACHE_SEMANTIC_PER_KEY:])
+
+    def forget_document(self, document_id):
+        """Drop answers that may have drawn on the document: its own, and corpus-wide ones"""
+        def matches(key):
+            scope = key[0]
+            if isinstance(scope, tuple) and scope[0] == 'corpus':
+                return scope[1] is None or document_id in scope[1]
+            return scope == document_id
+        return self._exact.invalidate_where(matches) + self._semantic.invalidate_where(matches)
+
+    def clear(self):
+        self._exact.clear()
+        self._semantic.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.exact_hits + self.semantic_hits + self.misses
+            hits = self.exact_hits + self.semantic_hits
+            counters = {
+                'exact_hits': self.exact_hits,
+                'semantic_hits': self.semantic_hits,
+                'misses': self.misses,
+                'hit_rate': hits / lookups if lookups else 0.0,
+            }
+        exact, semantic = self._exact.stats(), self._semantic.stats()
+        return {
+            **counters,
+            'entries': exact['entries'],
+            'semantic_keys': semantic['entries'],
+            'evictions': exact['evictions'] + semantic['evictions'],
+            'max_entries': exact['max_entries'],
+            'ttl': self.ttl,
+            'semantic_threshold': self.threshold,
+        }
+
+
+_answer_cache = AnswerCache()
+
+
+def get_answer_cache():
+    return _answer_cache
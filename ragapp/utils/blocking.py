@@ -0,0 +1,39 @@
+# ragapp/utils/blocking.py - bounded thread pool for blocking work awaited by async views
+import os
+import asyncio
+import functools
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import close_old_connections
+
+# Threads for FAISS search, local encoding and index loads; caps CPU-bound work and DB connections
+BLOCKING_POOL_SIZE = int(os.getenv('BLOCKING_POOL_SIZE', '8'))
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=BLOCKING_POOL_SIZE, thread_name_prefix='ragapp-blocking')
+        return _pool
+
+
+def _call(fn, args, kwargs):
+    try:
+        return fn(*args, **kwargs)
+    finally:
+        # Pool threads never see request_finished, so expire their connections like a request would
+        close_old_connections()
+
+
+async def run_blocking(fn, *args, **kwargs):
+    """Run a blocking call in the shared pool without tying up the event loop"""
+    loop = asyncio.get_running_loop()
+    # Carry context variables (e.g. the request's timing collector) into the pool thread, like asyncio.to_thread
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(get_pool(), functools.partial(context.run, _call, fn, args, kwargs))
@@ -0,0 +1,111 @@
+# ragapp/utils/bm25.py - persisted BM25 inverted index over a document's chunks
+import os
+import re
+from collections import Counter
+
+import numpy as np
+
+BM25_K1 = float(os.getenv('BM25_K1', '1.2'))
+BM25_B = float(os.getenv('BM25_B', '0.75'))
+
+_TOKEN_RE = re.compile(r'\w+')
+STOPWORDS = frozenset("""
+a an and are as at be but by can could did do does for from had has have how i if in into is it
+its me my no not of on or our so than that the their them then there these they this to was we
+were what when where which who why will with would you your please tell about
+""".split())
+
+
+def tokenize(text):
+    return [t for t in _TOKEN_RE.findall(text.lower()) if len(t) > 1 and t not in STOPWORDS]
+
+
+def bm25_path(index_path):
+    return index_path.replace('.index', '_bm25.npz')
+
+
+class BM25Index:
+    """Okapi BM25 over a list of texts, addressed by position (the same positions as the FAISS index).
+
+    Postings are stored CSR-style: for term id t, doc_ids/tfs[offsets[t]:offsets[t + 1]].
+    Scoring a query is a handful of numpy gathers plus one bincount, with no Python loop
+    over documents.
+    """
+
+    def __init__(self, vocab, offsets, doc_ids, tfs, doc_lengths):
+        self.vocab = vocab  # term -> term id
+        self.offsets = offsets
+        self.doc_ids = doc_ids
+        self.tfs = tfs
+        self.doc_lengths = doc_lengths
+        self.avgdl = float(doc_lengths.mean()) if len(doc_lengths) else 0.0
+
+    def __len__(self):
+        return len(self.doc_lengths)
+
+    @classmethod
+    def build(cls, texts):
+        postings = {}  # term -> ([doc ids], [tfs])
+        doc_lengths = np.zeros(len(texts), dtype=np.int32)
+        for doc_id, text in enumerate(texts):
+            tokens = tokenize(text)
+            doc_lengths[doc_id] = len(tokens)
+            for term, tf in Counter(tokens).items():
+                entry = postings.get(term)
+                if entry is None:
+                    entry = postings[term] = ([], [])
+                entry[0].append(doc_id)
+                entry[1].append(tf)
+
+        terms = sorted(postings)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        np.cumsum([len(postings[t][0]) for t in terms], out=offsets[1:])
+        doc_ids = np.fromiter((d for t in terms for d in postings[t][0]), dtype=np.int32, count=int(offsets[-1]))
+        tfs = np.fromiter((f for t in terms for f in postings[t][1]), dtype=np.int32, count=int(offsets[-1]))
+        return cls({t: i for i, t in enumerate(terms)}, offsets, doc_ids, tfs, doc_lengths)
+
+    def scores(self, query):
+        """BM25 score of every document for a query (zeros where no term matches)"""
+        n = len(self.doc_lengths)
+        scores = np.zeros(n, dtype=np.float32)
+        if not n:
+            return scores
+        term_ids = {self.vocab[t] for t in tokenize(query) if t in self.vocab}
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_lengths / (self.avgdl or 1.0))
+        for term_id in term_ids:
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            docs, tf = self.doc_ids[start:end], self.tfs[start:end]
+            df = end - start
+            idf = np.log(1 + (n - df + 0.5) / (df + 0.5))
+            scores[docs] += idf * tf * (BM25_K1 + 1) / (tf + norm[docs])
+        return scores
+
+    def search(self, query, k=5):
+        """Top-k (position, score) pairs with a positive score, best first"""
+        scores = self.scores(query)
+        k = min(k, len(scores))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [(int(i), float(scores[i])) for i in top if scores[i] > 0]
+
+    def nbytes(self):
+        return self.offsets.nbytes + self.doc_ids.nbytes + self.tfs.nbytes + self.doc_lengths.nbytes
+
+    # -- persistence --
+
+    def save(self, path):
+        terms = sorted(self.vocab, key=self.vocab.get)
+        tmp_path = path + '.tmp.npz'
+        np.savez(tmp_path, vocab=np.frombuffer('\n'.join(terms).encode('utf-8'), dtype=np.uint8),
+                 offsets=self.offsets, doc_ids=self.doc_ids, tfs=self.tfs, doc_lengths=self.doc_lengths)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            blob = data['vocab'].tobytes().decode('utf-8')
+            terms = blob.split('\n') if blob else []
+            return cls({t: i for i, t in enumerate(terms)}, data['offsets'], data['doc_ids'],
+                       data['tfs'], data['doc_lengths'])
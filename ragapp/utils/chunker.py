@@ -1,122 +1,191 @@
-import tiktoken
+# ragapp/utils/chunker.py - single-pass chunking into (start, end) offsets of the page text
+import os
+import re
+from collections import deque
 
+from .tokens import APPROX_CHARS_PER_TOKEN, get_encoding
 
-# ragapp/utils/chunker.py
-# ragapp/utils/chunker.py - Enhanced chunking
-import re
+# Defaults used by ingestion. With CHUNK_UNIT=tokens the sizes are tiktoken tokens, so
+# chunk lengths can be matched to the embedding model's input limit
+CHUNK_UNIT = os.getenv('CHUNK_UNIT', 'chars')
+CHUNK_SIZE = int(os.getenv('CHUNK_SIZE', '800'))
+CHUNK_OVERLAP = int(os.getenv('CHUNK_OVERLAP', '150'))
+
+_PARAGRAPH_BREAK_RE = re.compile(r'\n[ \t]*\n\s*')
+_SENTENCE_BREAK_RE = re.compile(r'(?<=[.!?])\s+')
+
+
+def _strip(text, start, end):
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return start, end
+
+
+def _split_chars(text, start, end, size):
+    """Cut an over-long sentence into pieces of at most `size` chars, preferring spaces"""
+    while end - start > size:
+        cut = text.rfind(' ', start + size // 2, start + size)
+        if cut == -1:
+            cut = start + size
+        yield start, cut
+        start, end = _strip(text, cut, end)
+    if start < end:
+        yield start, end
+
+
+def _split_tokens(text, start, end, tokens, size):
+    """Cut an over-long sentence at token boundaries into pieces of at most `size` tokens"""
+    _, offsets = get_encoding().decode_with_offsets(tokens)
+    for i in range(0, len(tokens), size):
+        piece_end = start + offsets[i + size] if i + size < len(tokens) else end
+        yield start + offsets[i], piece_end, min(size, len(tokens) - i)
+
+
+def _segments(text, size, measure):
+    """(start, end, size) of the pieces chunks are packed from
+
+    Paragraphs are kept whole when they fit in a chunk; longer ones are split
+    into sentences, and over-long sentences are cut by _split_chars/_split_tokens.
+    """
+    pos = 0
+    breaks = [(m.start(), m.end()) for m in _PARAGRAPH_BREAK_RE.finditer(text)]
+    breaks.append((len(text), len(text)))
+    for para_end, next_pos in breaks:
+        start, end = _strip(text, pos, para_end)
+        pos = next_pos
+        if start == end:
+            continue
+        para_size = measure(text, start, end)
+        if para_size <= size:
+            yield start, end, para_size
+            continue
+        sentence_start = start
+        bounds = [(m.start(), m.end()) for m in _SENTENCE_BREAK_RE.finditer(text, start, end)]
+        bounds.append((end, end))
+        for sentence_end, next_start in bounds:
+            if measure is _measure_chars:
+                if sentence_end - sentence_start <= size:
+                    yield sentence_start, sentence_end, sentence_end - sentence_start
+                else:
+                    for piece in _split_chars(text, sentence_start, sentence_end, size):
+                        yield piece[0], piece[1], piece[1] - piece[0]
+            else:
+                tokens = _encode(text, sentence_start, sentence_end)
+                if len(tokens) <= size:
+                    yield sentence_start, sentence_end, len(tokens)
+                else:
+                    yield from _split_tokens(text, sentence_start, sentence_end, tokens, size)
+            sentence_start = next_start
+
+
+def _measure_chars(text, start, end):
+    return end - start
 
-def chunk_text(text, chunk_size=600, chunk_overlap=150):
-    """Improved chunking that preserves context and structure"""
-    # First, try to split by paragraphs
-    paragraphs = [p.strip() for p in text.split('\n\n') if p.strip()]
-    
-    chunks = []
-    current_chunk = []
-    current_length = 0
-    
-    for paragraph in paragraphs:
-        para_length = len(paragraph)
-        
-        # If paragraph is very long, split it
-        if para_length > chunk_size * 1.5:
-            sentences = re.split(r'(?<=[.!?])\s+', paragraph)
-            for sentence in sentences:
-                sentence = sentence.strip()
-                if not sentence:
-                    continue
-                    
-                if current_length + len(sentence) > chunk_size and current_chunk:
-                    chunks.append(' '.join(current_chunk))
-                    # Keep overlap
-                    current_chunk = current_chunk[-2:] if len(current_chunk) > 2 else []
-                    current_length = sum(len(s) for s in current_chunk)
-                
-                current_chunk.append(sentence)
-                current_length += len(sentence) + 1
+
+def _encode(text, start, end):
+    return get_encoding().encode(text[start:end], disallowed_special=())
+
+
+def _measure_tokens(text, start, end):
+    return len(_encode(text, start, end))
+
+
+def _coordinates(text, segments, measure):
+    """(start, end, before, after) per segment, where after - before is its size in a running
+    coordinate that also counts the gaps between segments: char offsets in chars mode, else token totals"""
+    if measure is _measure_chars:
+        for start, end, _ in segments:
+            yield start, end, start, end
+        return
+    total = 0
+    previous_end = None
+    gap_tokens = {}
+    for start, end, size in segments:
+        if previous_end is not None and start > previous_end:
+            gap = text[previous_end:start]
+            if gap not in gap_tokens:
+                gap_tokens[gap] = measure(gap, 0, len(gap))
+            total += gap_tokens[gap]
+        yield start, end, total, total + size
+        total += size
+        previous_end = end
+
+
+def iter_chunk_spans(text, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP, unit=None):
+    """Yield (start, end) character offsets of the chunks of `text`, in order
+
+    Paragraphs (or, for long paragraphs, sentences) are packed greedily up to
+    chunk_size (chars, or tokens with unit='tokens'). Each chunk after the
+    first starts with the end of the previous one: whole trailing segments
+    that fit in chunk_overlap, else its last sentences that do. One pass over
+    the text, each segment entering and leaving the window once (or twice, when
+    a token-mode chunk is re-measured and comes out too long), so the cost is
+    linear in its length.
+    """
+    unit = unit or CHUNK_UNIT
+    measure = _measure_chars
+    if unit == 'tokens':
+        if get_encoding() is not None:
+            measure = _measure_tokens
         else:
-            # Handle normal paragraphs
-            if current_length + para_length > chunk_size and current_chunk:
-                chunks.append(' '.join(current_chunk))
-                # Keep overlap
-                current_chunk = current_chunk[-1:] if current_chunk else []
-                current_length = sum(len(s) for s in current_chunk)
-            
-            current_chunk.append(paragraph)
-            current_length += para_length + 2  # +2 for paragraph spacing
-    
-    if current_chunk:
-        chunks.append(' '.join(current_chunk))
-    
-    return chunks
-
-def chunk_by_paragraphs(text, max_paragraphs=3):
-    """Chunk by paragraphs for better context preservation"""
-    paragraphs = [p.strip() for p in text.split('\n\n') if p.strip()]
-    chunks = []
-    
-    for i in range(0, len(paragraphs), max_paragraphs):
-        chunk = '\n\n'.join(paragraphs[i:i + max_paragraphs])
-        if chunk:
-            chunks.append(chunk)
-    
-    return chunks
-
-def chunk_text_by_sentences(text, sentences_per_chunk=5):
-    """Split text into chunks by sentences"""
-    import re
-    sentences = re.split(r'(?<!\w\.\w.)(?<![A-Z][a-z]\.)(?<=\.|\?|\!)\s', text)
-    
-    chunks = []
-    for i in range(0, len(sentences), sentences_per_chunk):
-        chunk = ' '.join(sentences[i:i + sentences_per_chunk])
-        chunks.append(chunk)
-    
-    return chunks
+            # No tokenizer available: approximate tokens by length
+            chunk_size *= APPROX_CHARS_PER_TOKEN
+            chunk_overlap *= APPROX_CHARS_PER_TOKEN
+    overlap_chars = chunk_overlap if measure is _measure_chars else chunk_overlap * APPROX_CHARS_PER_TOKEN
 
+    window = deque()
+    held = []  # segments to (re)process before the next incoming one, last first
+    emitted_end = 0
+    incoming = _coordinates(text, _segments(text, chunk_size, measure), measure)
+    while True:
+        segment = held.pop() if held else next(incoming, None)
+        if segment is not None and not (window and segment[3] - window[0][2] > chunk_size):
+            window.append(segment)
+            continue
+        if segment is None and not (window and window[-1][1] > emitted_end):
+            break
+        if segment is not None:
+            held.append(segment)
 
+        if measure is not _measure_chars:
+            # Summed segment and gap tokens only approximate the span's (BPE merges differ across
+            # boundaries): measure the span itself and carry trailing segments to the next chunk
+            while len(window) > 1 and measure(text, window[0][0], window[-1][1]) > chunk_size:
+                if window[-2][1] > emitted_end:
+                    held.append(window.pop())
+                else:
+                    window.popleft()  # only overlap would be left: drop it instead
+        last = window[-1]
+        yield window[0][0], last[1]
+        emitted_end = last[1]
+        while window and last[3] - window[0][2] > chunk_overlap:
+            window.popleft()
+        if not window and chunk_overlap > 0:
+            # The last segment alone is longer than the overlap: carry over its closing sentences
+            match = _SENTENCE_BREAK_RE.search(text, max(last[0], last[1] - overlap_chars), last[1])
+            if match is not None:
+                tail_size = measure(text, match.end(), last[1])
+                if tail_size <= chunk_overlap:
+                    window.append((match.end(), last[1], last[3] - tail_size, last[3]))
+        if held:
+            while window and held[-1][3] - window[0][2] > chunk_size:
+                window.popleft()
+
+
+def chunk_spans(text, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP, unit=None):
+    return list(iter_chunk_spans(text, chunk_size, chunk_overlap, unit))
+
+
+def chunk_text(text, chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP, unit=None):
+    """Chunk texts (slices of `text`) from iter_chunk_spans"""
+    return [text[start:end] for start, end in iter_chunk_spans(text, chunk_size, chunk_overlap, unit)]
 
-import re
 
 class TextChunker:
     @staticmethod
-    
+
     def chunk_text(text, chunk_size=1000, chunk_overlap=200):
-        """Split text into chunks with overlap"""
-        if not text.strip():
-            return []
-        
-        # Clean text
-        text = re.sub(r'\s+', ' ', text).strip()
-        
-        chunks = []
-        start = 0
-        text_length = len(text)
-        
-        while start < text_length:
-            end = start + chunk_size
-            
-            # Try to break at sentence boundaries
-            if end < text_length:
-                # Look for natural break points
-                sentence_end = text.rfind('. ', start, end)
-                if sentence_end != -1 and sentence_end > start + chunk_size // 2:
-                    end = sentence_end + 2  # Include the period and space
-                else:
-                    # Look for other break points
-                    for break_char in ['? ', '! ', '\n\n', '; ']:
-                        break_pos = text.rfind(break_char, start, end)
-                        if break_pos != -1:
-                            end = break_pos + len(break_char)
-                            break
-            
-            chunk = text[start:end].strip()
-            if chunk:
-                chunks.append(chunk)
-            
-            start = end - chunk_overlap
-            if start < 0:
-                start = 0
-            if start >= text_length:
-                break
-        
-        return chunks
\ No newline at end of file
+        """Split text into chunks with overlap (same engine as chunk_text)"""
+        return chunk_text(text, chunk_size, chunk_overlap, unit='chars')
@@ -0,0 +1,102 @@
+# ragapp/utils/context_builder.py - prompt context from retrieved chunks, deduplicated and token-budgeted
+import os
+import re
+
+from .tokens import count_tokens, truncate_tokens
+
+# Upper bound on the context block sent to the LLM
+CONTEXT_MAX_TOKENS = int(os.getenv('CONTEXT_MAX_TOKENS', '2000'))
+# Don't bother appending a truncated passage smaller than this
+CONTEXT_MIN_PASSAGE_TOKENS = 40
+# Sentences shorter than this are never treated as duplicates ("Yes.", "See below.")
+_MIN_DEDUP_CHARS = 20
+
+_SENTENCE_RE = re.compile(r'(?<=[.!?])\s+')
+
+
+def _sentences(text):
+    return [s for s in _SENTENCE_RE.split(text.replace('\n', ' ')) if s.strip()]
+
+
+def _dedup_key(sentence):
+    return ' '.join(sentence.split()).casefold()
+
+
+def _neighbour_key(result):
+    """Position of a chunk in its document, for spotting adjacent chunks (None if unknown)"""
+    if result.get('position') is not None:
+        return result['position']
+    return result.get('chunk_id')
+
+
+def assemble_context(results, max_tokens=None):
+    """Build the context block from retrieved chunks, best first
+
+    Each result is a dict with page, text and optionally position/chunk_id,
+    document_id and label (defaults to "p:<page>"). Chunks from the same page
+    that are neighbours in the document are merged into one passage in
+    reading order, sentences already included earlier (chunk overlap) are
+    dropped, and passages are added in score order until max_tokens is used.
+
+    Returns (context, used) where used lists the results that contributed text.
+    """
+    max_tokens = CONTEXT_MAX_TOKENS if max_tokens is None else max_tokens
+
+    # Group neighbouring chunks of the same page into passages, ranked by their best member
+    passages = []
+    for result in results:
+        key = _neighbour_key(result)
+        group = (result.get('document_id'), result['page'])
+        target = None
+        if key is not None:
+            for passage in passages:
+                if passage['group'] == group and any(abs(key - k) == 1 for k in passage['keys']):
+                    target = passage
+                    break
+        if target is None:
+            target = {'group': group, 'keys': [], 'members': [], 'label': result.get('label') or f"p:{result['page']}"}
+            passages.append(target)
+        if key is not None:
+            target['keys'].append(key)
+        target['members'].append(result)
+
+    context = ""
+    used = []
+    seen = set()
+    remaining = max_tokens
+    for passage in passages:
+        members = passage['members']
+        if all(_neighbour_key(m) is not None for m in members):
+            members = sorted(members, key=_neighbour_key)
+
+        contributed = []
+        kept = []
+        for member in members:
+            fresh = []
+            for sentence in _sentences(member['text']):
+                dedup_key = _dedup_key(sentence)
+                if len(dedup_key) >= _MIN_DEDUP_CHARS:
+                    if dedup_key in seen:
+                        continue
+                    seen.add(dedup_key)
+                fresh.append(sentence)
+            if fresh:
+                kept.extend(fresh)
+                contributed.append(member)
+        if not kept:
+            continue
+
+        block = f"[{passage['label']}] {' '.join(kept)}\n\n"
+        tokens = count_tokens(block)
+        if tokens > remaining:
+            if remaining < CONTEXT_MIN_PASSAGE_TOKENS:
+                break
+            block = truncate_tokens(block, remaining - 1).rstrip() + "...\n\n"
+            tokens = remaining
+        context += block
+        used.extend(contributed)
+        remaining -= tokens
+        if remaining <= 0:
+            break
+
+    return context, used
@@ -0,0 +1,108 @@
+# ragapp/utils/conversation.py - rolling conversation summary and the token-bounded history sent to the LLM
+import os
+import re
+import logging
+
+from .metrics import span
+from .tokens import count_tokens, truncate_tokens
+
+logger = logging.getLogger(__name__)
+
+# Tokens of history (summary + recent exchanges) sent with each question
+HISTORY_TOKEN_BUDGET = int(os.getenv('HISTORY_TOKEN_BUDGET', '800'))
+# Latest exchanges sent verbatim; older ones only reach the prompt through the summary
+HISTORY_RECENT_EXCHANGES = int(os.getenv('HISTORY_RECENT_EXCHANGES', '2'))
+SUMMARY_MAX_TOKENS = int(os.getenv('SUMMARY_MAX_TOKENS', '250'))
+# 'llm' has the chat model rewrite the summary; 'extractive' (also the fallback when there is
+# no client or the call fails) keeps one line per exchange: the question and the answer's opening
+SUMMARY_MODE = os.getenv('SUMMARY_MODE', 'llm')
+# Exchanges folded per summary update, so a long backlog never becomes one huge prompt
+SUMMARY_FOLD_BATCH = 8
+# Tokens of each answer kept by the extractive summary
+_EXTRACT_ANSWER_TOKENS = 40
+
+_SENTENCE_END_RE = re.compile(r'(?<=[.!?])\s')
+
+SUMMARY_PROMPT = """You maintain a running summary of a conversation about a document.
+Rewrite the summary so it also covers the new exchanges. Keep the facts, figures and page
+citations ([p:X]) the user may refer back to; drop pleasantries and repetition.
+Reply with the summary only, in at most {max_tokens} tokens."""
+
+
+def _extractive_summary(summary, exchanges):
+    lines = summary.splitlines() if summary else []
+    for question, answer in exchanges:
+        opening = _SENTENCE_END_RE.split(' '.join(answer.split()), 1)[0]
+        lines.append(f"- Q: {' '.join(question.split())} A: {truncate_tokens(opening, _EXTRACT_ANSWER_TOKENS)}")
+    # Keep the newest lines that fit
+    kept = []
+    used = 0
+    for line in reversed(lines):
+        used += count_tokens(line) + 1
+        if used > SUMMARY_MAX_TOKENS and kept:
+            break
+        kept.append(line)
+    return '\n'.join(reversed(kept))
+
+
+def update_summary(summary, exchanges, client=None, model=None):
+    """Fold (question, answer) exchanges, oldest first, into a running summary
+
+    With SUMMARY_MODE=llm and a chat client, the model rewrites the summary in
+    one call; otherwise (or if that call fails) the summary is extractive.
+    """
+    if not exchanges:
+        return summary
+    if SUMMARY_MODE != 'llm' or client is None:
+        return _extractive_summary(summary, exchanges)
+
+    transcript = '\n\n'.join(f"User: {question}\nAssistant: {answer}" for question, answer in exchanges)
+    try:
+        with span('summary'):
+            response = client.chat.completions.create(
+                model=model,
+                messages=[
+                    {"role": "system", "content": SUMMARY_PROMPT.format(max_tokens=SUMMARY_MAX_TOKENS)},
+                    {"role": "user", "content": f"Summary so far:\n{summary or '(none)'}\n\nNew exchanges:\n{transcript}"},
+                ],
+                max_tokens=SUMMARY_MAX_TOKENS,
+                temperature=0
+            )
+        return truncate_tokens(response.choices[0].message.content.strip(), SUMMARY_MAX_TOKENS)
+    except Exception as e:
+        logger.warning(f"Summary update failed ({e}); using an extractive summary")
+        return _extractive_summary(summary, exchanges)
+
+
+def history_messages(summary, exchanges, budget=None):
+    """Chat history for a prompt: the summary, then the latest exchanges, within `budget` tokens
+
+    `exchanges` are (question, answer) pairs, oldest first. The newest
+    HISTORY_RECENT_EXCHANGES are considered and kept newest-first while they
+    fit; if even the newest doesn't, its answer is truncated. Messages come
+    back in conversation order.
+    """
+    budget = HISTORY_TOKEN_BUDGET if budget is None else budget
+    used = 0
+    if summary:
+        summary = truncate_tokens(summary, budget)
+        used = count_tokens(summary)
+
+    kept = []
+    for question, answer in reversed(exchanges[-HISTORY_RECENT_EXCHANGES:] if HISTORY_RECENT_EXCHANGES > 0 else []):
+        cost = count_tokens(question) + count_tokens(answer)
+        if used + cost > budget:
+            remaining = budget - used - count_tokens(question)
+            if not kept and remaining > 0:
+                kept.append((question, truncate_tokens(answer, remaining)))
+            break
+        kept.append((question, answer))
+        used += cost
+
+    messages = []
+    if summary:
+        messages.append({'role': 'system', 'content': f"Summary of the earlier conversation:\n{summary}"})
+    for question, answer in reversed(kept):
+        messages.append({'role': 'user', 'content': question})
+        messages.append({'role': 'assistant', 'content': answer})
+    return messages
@@ -0,0 +1,76 @@
+# ragapp/utils/embed_batcher.py - pack texts into provider-sized requests and run them concurrently
+import os
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from .tokens import count_tokens, truncate_tokens
+
+logger = logging.getLogger(__name__)
+
+# OpenAI limits are 8191 tokens per input, 2048 inputs and ~300k tokens per request
+EMBED_MAX_TOKENS_PER_INPUT = int(os.getenv('EMBED_MAX_TOKENS_PER_INPUT', '8191'))
+EMBED_MAX_TOKENS_PER_REQUEST = int(os.getenv('EMBED_MAX_TOKENS_PER_REQUEST', '100000'))
+EMBED_MAX_ITEMS_PER_REQUEST = int(os.getenv('EMBED_MAX_ITEMS_PER_REQUEST', '512'))
+EMBED_CONCURRENCY = int(os.getenv('EMBED_CONCURRENCY', '4'))
+
+
+def pack_batches(token_counts, max_tokens=None, max_items=None):
+    """Split items into contiguous [start, end) ranges under the token and item budgets"""
+    max_tokens = max_tokens or EMBED_MAX_TOKENS_PER_REQUEST
+    max_items = max_items or EMBED_MAX_ITEMS_PER_REQUEST
+
+    ranges = []
+    start = 0
+    batch_tokens = 0
+    for i, tokens in enumerate(token_counts):
+        if i > start and (batch_tokens + tokens > max_tokens or i - start >= max_items):
+            ranges.append((start, i))
+            start = i
+            batch_tokens = 0
+        batch_tokens += tokens
+    if start < len(token_counts):
+        ranges.append((start, len(token_counts)))
+    return ranges
+
+
+def _is_request_rejected(error):
+    # OpenAI SDK errors carry the HTTP status: 400 for over-limit inputs, 413 for oversized bodies
+    return getattr(error, 'status_code', None) in (400, 413)
+
+
+def embed_in_batches(texts, embed_fn, max_tokens=None, max_items=None, concurrency=None):
+    """Embed texts with embed_fn over token-budgeted batches; output rows match input order
+
+    Inputs over EMBED_MAX_TOKENS_PER_INPUT are truncated. A batch rejected as
+    too large is split in two and retried, down to single texts.
+    """
+    if not texts:
+        return np.zeros((0, 0), dtype='float32')
+
+    # Oversized inputs would fail the whole request, so clip them to the per-input limit
+    texts = [truncate_tokens(text, EMBED_MAX_TOKENS_PER_INPUT) for text in texts]
+    ranges = pack_batches([count_tokens(text) for text in texts], max_tokens, max_items)
+
+    def run(batch_range):
+        start, end = batch_range
+        try:
+            return np.asarray(embed_fn(texts[start:end]), dtype='float32')
+        except Exception as e:
+            # A request the provider rejects as too large (token counts are estimates) is halved
+            # and retried; transient errors are left to the client's own retries
+            if end - start < 2 or not _is_request_rejected(e):
+                raise
+            middle = (start + end) // 2
+            logger.warning(f"Embedding request of {end - start} texts rejected ({e}); splitting it in two")
+            return np.vstack([run((start, middle)), run((middle, end))])
+
+    if len(ranges) == 1:
+        return run(ranges[0])
+
+    workers = min(concurrency or EMBED_CONCURRENCY, len(ranges))
+    logger.info(f"Embedding {len(texts)} texts in {len(ranges)} requests ({workers} concurrent)")
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        # map() yields in submission order, so rows stay aligned with texts
+        return np.vstack(list(pool.map(run, ranges)))
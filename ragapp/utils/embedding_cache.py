@@ -0,0 +1,171 @@
+# ragapp/utils/embedding_cache.py - persistent, content-addressed embedding cache
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import threading
+import logging
+
+import numpy as np
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_CACHE_ENABLED = os.getenv('EMBEDDING_CACHE_ENABLED', 'True') == 'True'
+EMBEDDING_CACHE_PATH = os.getenv('EMBEDDING_CACHE_PATH', '')
+_SQLITE_MAX_PARAMS = 500
+
+_local = threading.local()
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS embeddings (
+    key BLOB PRIMARY KEY,
+    model TEXT NOT NULL,
+    dim INTEGER NOT NULL,
+    vector BLOB NOT NULL,
+    created_at REAL NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS stats (
+    model TEXT PRIMARY KEY,
+    hits INTEGER NOT NULL DEFAULT 0,
+    misses INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+
+def cache_path():
+    return EMBEDDING_CACHE_PATH or os.path.join(settings.MEDIA_ROOT, 'embedding_cache.sqlite3')
+
+
+def _connection():
+    """One SQLite connection per thread (sqlite3 connections aren't shareable across threads)"""
+    path = cache_path()
+    conn = getattr(_local, 'conn', None)
+    if conn is None or getattr(_local, 'path', None) != path:
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        conn = sqlite3.connect(path, timeout=30)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.executescript(_SCHEMA)
+        _local.conn = conn
+        _local.path = path
+    return conn
+
+
+def normalize(text):
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+def cache_key(model_name, text):
+    return hashlib.sha256(f"{model_name}\0{normalize(text)}".encode('utf-8')).digest()
+
+
+def get_many(model_name, keys):
+    """Return {key: float32 vector} for the keys present in the cache"""
+    conn = _connection()
+    found = {}
+    for start in range(0, len(keys), _SQLITE_MAX_PARAMS):
+        batch = keys[start:start + _SQLITE_MAX_PARAMS]
+        rows = conn.execute(
+            f"SELECT key, vector FROM embeddings WHERE model = ? AND key IN ({','.join('?' * len(batch))})",
+            [model_name, *batch],
+        )
+        for key, vector in rows:
+            found[key] = np.frombuffer(vector, dtype='<f4')
+    return found
+
+
+def put_many(model_name, items):
+    """Store [(key, vector), ...]"""
+    now = time.time()
+    rows = []
+    for key, vector in items:
+        vector = np.asarray(vector, dtype='<f4')
+        rows.append((key, model_name, vector.shape[0], vector.tobytes(), now))
+    conn = _connection()
+    with conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO embeddings (key, model, dim, vector, created_at) VALUES (?, ?, ?, ?, ?)",
+            rows,
+        )
+
+
+def _record(model_name, hits, misses):
+    conn = _connection()
+    with conn:
+        conn.execute(
+            "INSERT INTO stats (model, hits, misses) VALUES (?, ?, ?) "
+            "ON CONFLICT(model) DO UPDATE SET hits = hits + excluded.hits, misses = misses + excluded.misses",
+            (model_name, hits, misses),
+        )
+
+
+def cached_embed(texts, model_name, embed_fn):
+    """Embed texts, serving repeats from the cache and sending only misses to embed_fn in one batch"""
+    if not EMBEDDING_CACHE_ENABLED or not texts:
+        return np.asarray(embed_fn(texts), dtype='float32')
+
+    keys = [cache_key(model_name, text) for text in texts]
+    try:
+        found = get_many(model_name, list(set(keys)))
+    except sqlite3.Error as e:
+        logger.warning(f"Embedding cache unavailable: {e}")
+        return np.asarray(embed_fn(texts), dtype='float32')
+
+    # Unique misses, in first-seen order
+    missing = {}
+    for key, text in zip(keys, texts):
+        if key not in found and key not in missing:
+            missing[key] = text
+
+    if missing:
+        vectors = np.asarray(embed_fn(list(missing.values())), dtype='float32')
+        new_items = list(zip(missing.keys(), vectors))
+        found.update(new_items)
+        try:
+            put_many(model_name, new_items)
+        except sqlite3.Error as e:
+            logger.warning(f"Embedding cache write failed: {e}")
+
+    try:
+        _record(model_name, len(texts) - len(missing), len(missing))
+    except sqlite3.Error:
+        pass
+
+    return np.vstack([found[key] for key in keys]).astype('float32', copy=False)
+
+
+def stats():
+    """Per-model entry count, stored bytes and lifetime hit rate, plus the file size"""
+    conn = _connection()
+    models = {}
+    for model, entries, nbytes in conn.execute(
+            "SELECT model, COUNT(*), SUM(LENGTH(vector)) FROM embeddings GROUP BY model"):
+        models[model] = {'entries': entries, 'bytes': nbytes or 0, 'hits': 0, 'misses': 0}
+    for model, hits, misses in conn.execute("SELECT model, hits, misses FROM stats"):
+        entry = models.setdefault(model, {'entries': 0, 'bytes': 0})
+        entry['hits'] = hits
+        entry['misses'] = misses
+    for entry in models.values():
+        lookups = entry['hits'] + entry['misses']
+        entry['hit_rate'] = entry['hits'] / lookups if lookups else 0.0
+
+    path = cache_path()
+    return {
+        'path': path,
+        'file_bytes': os.path.getsize(path) if os.path.exists(path) else 0,
+        'models': models,
+    }
+
+
+def clear(model_name=None):
+    conn = _connection()
+    with conn:
+        if model_name:
+            conn.execute("DELETE FROM embeddings WHERE model = ?", (model_name,))
+            conn.execute("DELETE FROM stats WHERE model = ?", (model_name,))
+        else:
+            conn.execute("DELETE FROM embeddings")
+            conn.execute("DELETE FROM stats")
+    conn.execute("VACUUM")
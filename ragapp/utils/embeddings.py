@@ -1,18 +1,11 @@
 import os, numpy as np
-from openai import OpenAI
-from sentence_transformers import SentenceTransformer
+from .model_registry import get_local_model, get_openai_client
 
-_client = None
 EMBED_MODEL = os.getenv('EMBEDDING_MODEL', 'text-embedding-3-small')
 LOCAL_EMBED_MODEL = 'all-MiniLM-L6-v2'
 
 def get_client():
-    global _client
-    if _client is None:
-        api_key = os.getenv('OPENAI_API_KEY')
-        if api_key and api_key != 'dummy_key_for_testing':
-            _client = OpenAI(api_key=api_key)
-    return _client
+    return get_openai_client()
 
 def embed_texts(texts):
     """Generate embeddings using OpenAI or fallback to local model"""
@@ -28,37 +21,24 @@ def embed_texts(texts):
             pass
     
     # Use local model as fallback
-    model = SentenceTransformer(LOCAL_EMBED_MODEL)
+    model = get_local_model(LOCAL_EMBED_MODEL)
     embeddings = model.encode(texts, convert_to_numpy=True)
     return embeddings.astype('float32')
 
 
 
 
-import os
-import numpy as np
-from sentence_transformers import SentenceTransformer
-from openai import OpenAI
 import logging
 
 logger = logging.getLogger(__name__)
 
 class EmbeddingGenerator:
     def __init__(self):
-        self.local_model = SentenceTransformer('all-MiniLM-L6-v2')
-        self.openai_client = None
-        self.use_openai = False
-        
-        # Check if OpenAI API key is available
-        api_key = os.getenv('OPENAI_API_KEY')
-        if api_key and not api_key.startswith('your_'):
-            try:
-                self.openai_client = OpenAI(api_key=api_key)
-                self.use_openai = True
-                logger.info("Using OpenAI for embeddings")
-            except Exception as e:
-                logger.warning(f"OpenAI initialization failed: {e}. Using local model.")
-                self.use_openai = False
+        self.local_model = get_local_model(LOCAL_EMBED_MODEL)
+        self.openai_client = get_openai_client()
+        self.use_openai = self.openai_client is not None
+        if self.use_openai:
+            logger.info("Using OpenAI for embeddings")
     
     def generate_embedding(self, text):
         """Generate embedding for text using either OpenAI or local model"""
@@ -0,0 +1,106 @@
+# ragapp/utils/fake_providers.py - deterministic offline stand-ins for the embedding model and the chat API
+import os
+import re
+import time
+import asyncio
+import hashlib
+from types import SimpleNamespace
+
+import numpy as np
+
+from .tokens import count_tokens
+
+FAKE_EMBEDDING_DIM = int(os.getenv('FAKE_EMBEDDING_DIM', '384'))
+# Simulated chat completion time, in seconds, plus a prompt-processing share per 1000 prompt tokens
+FAKE_LLM_LATENCY = float(os.getenv('FAKE_LLM_LATENCY', '0'))
+FAKE_LLM_LATENCY_PER_1K_TOKENS = float(os.getenv('FAKE_LLM_LATENCY_PER_1K_TOKENS', '0'))
+
+_TOKEN_RE = re.compile(r'\w+')
+
+
+def _token_slot(token, dim):
+    digest = hashlib.blake2b(token.encode('utf-8'), digest_size=8).digest()
+    value = int.from_bytes(digest, 'little')
+    return value % dim, 1.0 if (value >> 63) else -1.0
+
+
+class FakeEmbedder:
+    """SentenceTransformer-compatible encoder: feature-hashed bag of words, L2-normalized.
+
+    Deterministic across processes and runs, needs no download, and texts that
+    share words get nearby vectors, so retrieval over it behaves sensibly.
+    """
+
+    def __init__(self, dim=None):
+        self.dim = dim or FAKE_EMBEDDING_DIM
+        self._slots = {}
+
+    def encode(self, texts, **kwargs):
+        if isinstance(texts, str):
+            texts = [texts]
+        vectors = np.zeros((len(texts), self.dim), dtype='float32')
+        for row, text in enumerate(texts):
+            for token in _TOKEN_RE.findall(text.lower()):
+                slot = self._slots.get(token)
+                if slot is None:
+                    slot = self._slots[token] = _token_slot(token, self.dim)
+                vectors[row, slot[0]] += slot[1]
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        np.divide(vectors, norms, out=vectors, where=norms > 0)
+        return vectors
+
+
+def _fake_answer(messages):
+    prompt = messages[-1]['content']
+    question = prompt.split('Question:', 1)[-1].split('\n', 1)[0].strip()
+    pages = re.findall(r'\[p:(\d+)\]', prompt)[:2]
+    cites = ' '.join(f"[p:{page}]" for page in pages)
+    return f"Based on the document, the answer to \"{question}\" is in the cited pages. {cites}".strip()
+
+
+def _latency(messages):
+    if not FAKE_LLM_LATENCY_PER_1K_TOKENS:
+        return FAKE_LLM_LATENCY
+    prompt_tokens = sum(count_tokens(message['content']) for message in messages)
+    return FAKE_LLM_LATENCY + prompt_tokens / 1000 * FAKE_LLM_LATENCY_PER_1K_TOKENS
+
+
+def _completion(content):
+    return SimpleNamespace(choices=[SimpleNamespace(index=0, finish_reason='stop',
+                                                    message=SimpleNamespace(role='assistant', content=content))])
+
+
+def _stream_chunks(content):
+    for piece in re.findall(r'\S+\s*', content):
+        yield SimpleNamespace(choices=[SimpleNamespace(index=0, delta=SimpleNamespace(content=piece))])
+
+
+class _FakeCompletions:
+    def create(self, model=None, messages=None, stream=False, **kwargs):
+        latency = _latency(messages)
+        if latency:
+            time.sleep(latency)
+        content = _fake_answer(messages)
+        return _stream_chunks(content) if stream else _completion(content)
+
+
+class _AsyncFakeCompletions:
+    async def create(self, model=None, messages=None, stream=False, **kwargs):
+        latency = _latency(messages)
+        if latency:
+            await asyncio.sleep(latency)
+        return _completion(_fake_answer(messages))
+
+
+class FakeChatClient:
+    """Just enough of the OpenAI client for ask_llm / stream_llm: chat.completions.create"""
+
+    def __init__(self):
+        self.chat = SimpleNamespace(completions=_FakeCompletions())
+
+
+class AsyncFakeChatClient:
+    """Just enough of the AsyncOpenAI client for aask_llm"""
+
+    def __init__(self):
+        self.chat = SimpleNamespace(completions=_AsyncFakeCompletions())
@@ -0,0 +1,213 @@
+# ragapp/utils/metrics.py - per-stage timing spans, aggregated into histograms for Prometheus
+import os
+import bisect
+import inspect
+import functools
+import threading
+import contextvars
+from time import perf_counter
+
+# Record timing spans; with False every span is a shared no-op context manager
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'True') == 'True'
+# Add a `timings` field (ms per stage) to every ask response; a request can also ask with "timings": true
+TIMINGS_IN_RESPONSE = os.getenv('TIMINGS_IN_RESPONSE', 'False') == 'True'
+
+# Histogram upper bounds in seconds: sub-millisecond FAISS searches up to multi-second LLM calls
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+STAGE_METRIC = 'ragapp_stage_duration_seconds'
+REQUEST_METRIC = 'ragapp_request_duration_seconds'
+_HELP = {
+    STAGE_METRIC: ('stage', 'Time spent in one stage of answering or ingesting'),
+    REQUEST_METRIC: ('view', 'Time spent handling a request, by view'),
+}
+
+
+class Histogram:
+    """Cumulative-bucket histogram with a sum and count, safe to observe from any thread"""
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        slot = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[slot] += 1
+            self.sum += value
+            self.count += 1
+
+    def snapshot(self):
+        """(cumulative bucket counts incl. +Inf, sum, count)"""
+        with self._lock:
+            counts, total, count = list(self.counts), self.sum, self.count
+        cumulative = []
+        running = 0
+        for c in counts:
+            running += c
+            cumulative.append(running)
+        return cumulative, total, count
+
+
+# metric name -> {label value -> Histogram}
+_histograms = {name: {} for name in _HELP}
+_histograms_lock = threading.Lock()
+
+# Collector of the request being handled (see collect_timings)
+_request_timings = contextvars.ContextVar('ragapp_request_timings', default=None)
+
+
+def observe(name, seconds, metric=STAGE_METRIC):
+    family = _histograms[metric]
+    histogram = family.get(name)
+    if histogram is None:
+        with _histograms_lock:
+            histogram = family.setdefault(name, Histogram())
+    histogram.observe(seconds)
+
+    collector = _request_timings.get()
+    if collector is not None and metric == STAGE_METRIC:
+        collector.add(name, seconds)
+
+
+class _Span:
+    __slots__ = ('name', 'metric', 'start')
+
+    def __init__(self, name, metric):
+        self.name = name
+        self.metric = metric
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        observe(self.name, perf_counter() - self.start, self.metric)
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(name, metric=STAGE_METRIC):
+    """Context manager timing a block into the `name` histogram (and the request's timings)"""
+    if not METRICS_ENABLED:
+        return _NULL_SPAN
+    return _Span(name, metric)
+
+
+class collect_timings:
+    """Collect the stage durations recorded by spans inside the block (including run_blocking calls)
+
+        with collect_timings() as timings:
+            ...
+        timings.as_ms()  # {'embed_query': 3.1, 'faiss_search': 0.4, ..., 'total': 52.0}
+
+    Spans running in other threads (e.g. ask_llm_batch's pool) only reach the histograms.
+    """
+
+    def __init__(self):
+        self.timings = {}
+        self.started = None
+        self.finished = None
+        self._token = None
+
+    def add(self, name, seconds):
+        self.timings[name] = self.timings.get(name, 0.0) + seconds
+
+    def __enter__(self):
+        self.started = perf_counter()
+        self._token = _request_timings.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.finished = perf_counter()
+        _request_timings.reset(self._token)
+        return False
+
+    def as_ms(self):
+        timings = {name: round(seconds * 1000, 2) for name, seconds in self.timings.items()}
+        timings['total'] = round(((self.finished or perf_counter()) - self.started) * 1000, 2)
+        return timings
+
+
+def request_timings():
+    """Stage timings (ms) of the request being handled by a timed_view so far, or None"""
+    collector = _request_timings.get()
+    return collector.as_ms() if collector is not None else None
+
+
+def timed_view(name):
+    """Decorator for views: time the whole request and collect its stage timings
+
+    The view can read them with request_timings(). With metrics disabled the
+    view is returned unchanged.
+    """
+    def decorator(view):
+        if not METRICS_ENABLED:
+            return view
+
+        if inspect.iscoroutinefunction(view):
+            @functools.wraps(view)
+            async def async_wrapper(*args, **kwargs):
+                with span(name, REQUEST_METRIC), collect_timings():
+                    return await view(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            with span(name, REQUEST_METRIC), collect_timings():
+                return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels):
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + '}' if labels else ''
+
+
+def _format_bound(bound):
+    return '+Inf' if bound == float('inf') else repr(float(bound))
+
+
+def render_histograms():
+    """Prometheus text exposition of every timing histogram"""
+    lines = []
+    for metric, (label, help_text) in _HELP.items():
+        with _histograms_lock:
+            family = sorted(_histograms[metric].items())
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} histogram")
+        for value, histogram in family:
+            cumulative, total, count = histogram.snapshot()
+            for bound, c in zip(histogram.buckets + (float('inf'),), cumulative):
+                lines.append(f"{metric}_bucket{_labels({label: value, 'le': _format_bound(bound)})} {c}")
+            lines.append(f"{metric}_sum{_labels({label: value})} {total}")
+            lines.append(f"{metric}_count{_labels({label: value})} {count}")
+    return lines
+
+
+def render_samples(metric, metric_type, help_text, samples):
+    """Prometheus lines for one counter/gauge family; samples are (labels dict, value) pairs"""
+    lines = [f"# HELP {metric} {help_text}", f"# TYPE {metric} {metric_type}"]
+    for labels, value in samples:
+        lines.append(f"{metric}{_labels(labels)} {value}")
+    return lines
+
@@ -0,0 +1,138 @@
+# ragapp/utils/model_registry.py
+import os
+import asyncio
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+# One entry per (provider, model name); each worker process loads an encoder once
+_models = {}
+_key_locks = {}
+_registry_lock = threading.Lock()
+# AsyncOpenAI clients by event loop: the httpx pool inside one only works on the loop that
+# first used it, and ASGI workers or async_to_sync can run several loops in a process
+_async_clients = {}
+
+
+def _openai_api_key():
+    api_key = os.getenv('OPENAI_API_KEY')
+    if api_key and not api_key.startswith(('your_', 'dummy_')):
+        return api_key
+    return None
+
+
+def _load_local(model_name):
+    from sentence_transformers import SentenceTransformer
+    logger.info(f"Loading local embedding model {model_name}")
+    return SentenceTransformer(model_name)
+
+
+def _load_openai(model_name):
+    from openai import OpenAI
+    api_key = _openai_api_key()
+    if not api_key:
+        raise RuntimeError("OPENAI_API_KEY is not configured")
+    return OpenAI(api_key=api_key)
+
+
+def _load_openai_async(model_name):
+    from openai import AsyncOpenAI
+    api_key = _openai_api_key()
+    if not api_key:
+        raise RuntimeError("OPENAI_API_KEY is not configured")
+    return AsyncOpenAI(api_key=api_key)
+
+
+def _load_fake(model_name):
+    from .fake_providers import FakeEmbedder
+    return FakeEmbedder()
+
+
+def _load_fake_llm(model_name):
+    from .fake_providers import FakeChatClient
+    return FakeChatClient()
+
+
+def _load_fake_llm_async(model_name):
+    from .fake_providers import AsyncFakeChatClient
+    return AsyncFakeChatClient()
+
+
+_LOADERS = {
+    'local': _load_local,
+    'openai': _load_openai,
+    # Deterministic offline stand-ins for benchmarks (EMBEDDING_PROVIDER / LLM_PROVIDER=fake)
+    'fake': _load_fake,
+    'fake_llm': _load_fake_llm,
+    'fake_llm_async': _load_fake_llm_async,
+}
+
+
+def get_model(provider, model_name=None):
+    """Return the shared model/client for (provider, model_name), loading it on first use"""
+    key = (provider, model_name)
+    model = _models.get(key)
+    if model is not None:
+        return model
+
+    if provider not in _LOADERS:
+        raise ValueError(f"Unknown embedding provider: {provider}")
+
+    # Per-key lock so a slow model load doesn't block lookups of other models
+    with _registry_lock:
+        lock = _key_locks.setdefault(key, threading.Lock())
+
+    with lock:
+        model = _models.get(key)
+        if model is None:
+            model = _LOADERS[provider](model_name)
+            _models[key] = model
+    return model
+
+
+def get_local_model(model_name):
+    """Shared SentenceTransformer instance for model_name"""
+    return get_model('local', model_name)
+
+
+def get_openai_client():
+    """Shared OpenAI client, or None when no usable API key is configured"""
+    if not _openai_api_key():
+        return None
+    try:
+        return get_model('openai')
+    except Exception as e:
+        logger.warning(f"OpenAI client init failed: {e}")
+        return None
+
+
+def get_async_openai_client():
+    """AsyncOpenAI client for the running event loop, or None when no usable API key is configured"""
+    if not _openai_api_key():
+        return None
+    loop = asyncio.get_running_loop()
+    with _registry_lock:
+        entry = _async_clients.get(id(loop))
+        if entry is not None and entry[0] is loop:
+            return entry[1]
+        # Drop clients of loops that have finished (async_to_sync runs a loop per call)
+        for key, (other_loop, _) in list(_async_clients.items()):
+            if other_loop.is_closed():
+                del _async_clients[key]
+        try:
+            client = _load_openai_async(None)
+        except Exception as e:
+            logger.warning(f"AsyncOpenAI client init failed: {e}")
+            return None
+        # Holding the loop keeps its id from being reused while the entry exists
+        _async_clients[id(loop)] = (loop, client)
+        return client
+
+
+def clear():
+    """Drop every cached model (used by benchmarks and after config changes)"""
+    with _registry_lock:
+        _models.clear()
+        _key_locks.clear()
+        _async_clients.clear()
@@ -0,0 +1,139 @@
+# ragapp/utils/payload_store.py - compact, mmap-friendly storage for per-vector chunk metadata
+import os
+import json
+import mmap
+import struct
+
+import numpy as np
+
+MAGIC = b'RAGPAY01'
+VERSION = 1
+# magic, version, (padding), count, text bytes -- 32 bytes keeps the arrays 8-byte aligned
+_HEADER = struct.Struct('<8sI4xQQ')
+
+
+def payloads_path(index_path):
+    return index_path.replace('.index', '_payloads.bin')
+
+
+def legacy_payloads_path(index_path):
+    return index_path.replace('.index', '_payloads.json')
+
+
+class PayloadStore:
+    """Page number, Chunk id and text for each vector, addressed by index position.
+
+    Built up in memory with extend() during ingestion. Saved as one file:
+    offsets (int64, n+1) | chunk ids (int64, n) | pages (int32, n) | UTF-8 text blob.
+    Loaded files are memory-mapped, so opening is O(1) and worker processes
+    share the pages through the OS page cache.
+    """
+
+    def __init__(self):
+        self._pages = []
+        self._chunk_ids = []
+        self._texts = []
+        self._mmap = None
+        self._offsets = None
+        self._blob = None
+
+    # -- sequence interface used by FaissStore.search --
+
+    def __len__(self):
+        if self._mmap is not None:
+            return len(self._chunk_ids)
+        return len(self._texts)
+
+    def __getitem__(self, idx):
+        if idx < 0:
+            idx += len(self)
+        if self._mmap is not None:
+            start, end = int(self._offsets[idx]), int(self._offsets[idx + 1])
+            text = str(self._blob[start:end], 'utf-8')
+        else:
+            text = self._texts[idx]
+        chunk_id = int(self._chunk_ids[idx])
+        return {
+            'page': int(self._pages[idx]),
+            'text': text,
+            'chunk_id': chunk_id if chunk_id >= 0 else None,
+        }
+
+    def __iter__(self):
+        for idx in range(len(self)):
+            yield self[idx]
+
+    def extend(self, payloads):
+        if self._mmap is not None:
+            raise ValueError("Loaded payload stores are read-only")
+        for payload in payloads:
+            self._pages.append(payload['page'])
+            self._chunk_ids.append(payload.get('chunk_id') or -1)
+            self._texts.append(payload['text'])
+
+    def chunk_ids(self):
+        return np.asarray(self._chunk_ids, dtype=np.int64)
+
+    def nbytes(self):
+        if self._mmap is not None:
+            return len(self._mmap)
+        return sum(len(text) for text in self._texts) + len(self._texts) * 20
+
+    # -- persistence --
+
+    def save(self, path):
+        tmp_path = path + '.tmp'
+        if self._mmap is not None:
+            # A loaded store is already in the file format: copy it (e.g. when re-encoding its index)
+            with open(tmp_path, 'wb') as f:
+                f.write(self._mmap)
+            os.replace(tmp_path, path)
+            return
+        encoded = [text.encode('utf-8') for text in self._texts]
+        offsets = np.zeros(len(encoded) + 1, dtype='<i8')
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+        with open(tmp_path, 'wb') as f:
+            f.write(_HEADER.pack(MAGIC, VERSION, len(encoded), int(offsets[-1])))
+            f.write(offsets.tobytes())
+            f.write(np.asarray(self._chunk_ids, dtype='<i8').tobytes())
+            f.write(np.asarray(self._pages, dtype='<i4').tobytes())
+            for b in encoded:
+                f.write(b)
+        # Atomic swap so readers (and the index cache) never see a half-written file
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        store = cls()
+        with open(path, 'rb') as f:
+            store._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, count, text_bytes = _HEADER.unpack_from(store._mmap, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"Unsupported payload file: {path}")
+        pos = _HEADER.size
+        store._offsets = np.frombuffer(store._mmap, dtype='<i8', count=count + 1, offset=pos)
+        pos += (count + 1) * 8
+        store._chunk_ids = np.frombuffer(store._mmap, dtype='<i8', count=count, offset=pos)
+        pos += count * 8
+        store._pages = np.frombuffer(store._mmap, dtype='<i4', count=count, offset=pos)
+        pos += count * 4
+        store._blob = memoryview(store._mmap)[pos:pos + text_bytes]
+        return store
+
+    @classmethod
+    def from_list(cls, payloads):
+        store = cls()
+        store.extend(payloads)
+        return store
+
+
+def load_payloads(index_path):
+    """Payloads for an index: the binary file, else the legacy JSON file, else None"""
+    path = payloads_path(index_path)
+    if os.path.exists(path):
+        return PayloadStore.load(path)
+    legacy_path = legacy_payloads_path(index_path)
+    if os.path.exists(legacy_path):
+        with open(legacy_path, 'r') as f:
+            return PayloadStore.from_list(json.load(f))
+    return None
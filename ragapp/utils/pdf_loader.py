@@ -1,42 +1,141 @@
 # ragapp/utils/pdf_loader.py
-import PyPDF2
+import os
 import logging
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import pymupdf as fitz  # PyMuPDF >= 1.24.3
+except ImportError:
+    try:
+        import fitz
+    except ImportError:
+        fitz = None
+
+try:
+    import PyPDF2
+except ImportError:
+    PyPDF2 = None
 
 logger = logging.getLogger(__name__)
 
-def extract_pdf_text_with_pages(pdf_path):
-    """Extract text from PDF with page numbers"""
+# Extraction backend: 'pymupdf' (fast, preferred when installed) or 'pypdf2'
+PDF_BACKEND = os.getenv('PDF_BACKEND', 'pymupdf' if fitz is not None else 'pypdf2')
+# Worker processes for page extraction; 1 extracts serially in-process
+PDF_WORKERS = int(os.getenv('PDF_WORKERS', '1'))
+PDF_PAGES_PER_TASK = int(os.getenv('PDF_PAGES_PER_TASK', '32'))
+
+
+def _pages_pypdf2(pdf_path, start=0, end=None):
+    with open(pdf_path, 'rb') as file:
+        pdf_reader = PyPDF2.PdfReader(file)
+        end = len(pdf_reader.pages) if end is None else end
+        for page_num in range(start, end):
+            yield page_num + 1, pdf_reader.pages[page_num].extract_text() or ''
+
+
+def _count_pypdf2(pdf_path):
+    with open(pdf_path, 'rb') as file:
+        return len(PyPDF2.PdfReader(file).pages)
+
+
+def _pages_pymupdf(pdf_path, start=0, end=None):
+    with fitz.open(pdf_path) as doc:
+        end = doc.page_count if end is None else end
+        for page_num in range(start, end):
+            yield page_num + 1, doc.load_page(page_num).get_text()
+
+
+def _count_pymupdf(pdf_path):
+    with fitz.open(pdf_path) as doc:
+        return doc.page_count
+
+
+# name -> (page iterator, page counter, module availability)
+_BACKENDS = {
+    'pypdf2': (_pages_pypdf2, _count_pypdf2, lambda: PyPDF2 is not None),
+    'pymupdf': (_pages_pymupdf, _count_pymupdf, lambda: fitz is not None),
+}
+
+
+def _resolve_backend(backend):
+    backend = (backend or PDF_BACKEND).lower()
+    if backend not in _BACKENDS:
+        raise ValueError(f"Unknown PDF backend: {backend}")
+    if not _BACKENDS[backend][2]():
+        raise ImportError(f"PDF backend '{backend}' is not installed")
+    return backend
+
+
+def _extract_range(pdf_path, backend, start, end):
+    """Process-pool task: extract pages [start, end) and keep the non-empty ones"""
+    pages, _, _ = _BACKENDS[backend]
+    return [(page_num, text) for page_num, text in pages(pdf_path, start, end) if text.strip()]
+
+
+def _extract_parallel(pdf_path, backend, workers, pages_per_task):
+    total = _BACKENDS[backend][1](pdf_path)
+    ranges = iter([(start, min(start + pages_per_task, total))
+                   for start in range(0, total, pages_per_task)])
+
+    pool = ProcessPoolExecutor(max_workers=workers)
+    try:
+        # Keep a bounded number of ranges in flight so results don't pile up in memory,
+        # and consume them in submission order so pages come out in order
+        pending = deque()
+        for start, end in ranges:
+            pending.append(pool.submit(_extract_range, pdf_path, backend, start, end))
+            if len(pending) >= workers * 2:
+                break
+        while pending:
+            for item in pending.popleft().result():
+                yield item
+            next_range = next(ranges, None)
+            if next_range is not None:
+                pending.append(pool.submit(_extract_range, pdf_path, backend, *next_range))
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def extract_pdf_text_with_pages(pdf_path, backend=None, workers=None, pages_per_task=None):
+    """Extract text from PDF with page numbers
+
+    Yields (page_num, text) in page order for every page that has text. With
+    workers > 1 the PDF is split into page ranges extracted in a process pool.
+    """
     try:
-        with open(pdf_path, 'rb') as file:
-            pdf_reader = PyPDF2.PdfReader(file)
-            
-            for page_num in range(len(pdf_reader.pages)):
-                page = pdf_reader.pages[page_num]
-                text = page.extract_text()
-                
+        backend = _resolve_backend(backend)
+        workers = PDF_WORKERS if workers is None else workers
+        if workers > 1:
+            yield from _extract_parallel(pdf_path, backend, workers, pages_per_task or PDF_PAGES_PER_TASK)
+        else:
+            pages, _, _ = _BACKENDS[backend]
+            for page_num, text in pages(pdf_path):
                 if text.strip():  # Only yield pages with text
-                    yield page_num + 1, text
-                    
+                    yield page_num, text
+
     except Exception as e:
         logger.error(f"Error reading PDF {pdf_path}: {e}")
         raise Exception(f"Failed to extract text from PDF: {str(e)}")
 
+def count_pdf_pages(pdf_path, backend=None):
+    """Number of pages in a PDF, without extracting any text"""
+    backend = _resolve_backend(backend)
+    return _BACKENDS[backend][1](pdf_path)
+
 class PDFLoader:
     @staticmethod
     def extract_text_from_pdf(file_path):
         """Extract text from PDF file"""
         text = ""
         try:
-            with open(file_path, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                for page_num in range(len(pdf_reader.pages)):
-                    page = pdf_reader.pages[page_num]
-                    text += page.extract_text() + "\n"
+            for _, page_text in extract_pdf_text_with_pages(file_path):
+                text += page_text + "\n"
         except Exception as e:
             logger.error(f"Error reading PDF: {str(e)}")
             raise Exception(f"Error reading PDF: {str(e)}")
-        
+
         if not text.strip():
             raise Exception("No text could be extracted from the PDF")
-        
-        return text
\ No newline at end of file
+
+        return text
@@ -1,125 +1,523 @@
 import os
 import numpy as np
 import faiss
-import json
 import re
-from openai import OpenAI
-from sentence_transformers import SentenceTransformer
+import threading
+from time import perf_counter
+from concurrent.futures import ThreadPoolExecutor
 from django.conf import settings
 import logging
+from .model_registry import get_model, get_local_model, get_openai_client, get_async_openai_client
+from .lru import LRUCache
+from . import embedding_cache
+from .embed_batcher import embed_in_batches
+from .answer_cache import ANSWER_CACHE_ENABLED, get_answer_cache
+from .blocking import run_blocking
+from .bm25 import BM25Index, bm25_path
+from .context_builder import assemble_context
+from .payload_store import PayloadStore, load_payloads, payloads_path, legacy_payloads_path
+from .metrics import METRICS_ENABLED, observe, span
 
 logger = logging.getLogger(__name__)
 
 # Configuration
 CHAT_MODEL = os.getenv('CHAT_MODEL', 'gpt-3.5-turbo')
 EMBEDDING_MODEL = os.getenv('EMBEDDING_MODEL', 'all-MiniLM-L6-v2')
+OPENAI_EMBEDDING_MODEL = 'text-embedding-ada-002'
+# 'auto' uses OpenAI when a key is configured, else the local model; 'fake' uses the
+# deterministic offline stand-ins in fake_providers (benchmarks, offline development)
+EMBEDDING_PROVIDER = os.getenv('EMBEDDING_PROVIDER', 'auto')
+LLM_PROVIDER = os.getenv('LLM_PROVIDER', 'auto')
+FAKE_EMBEDDING_MODEL = 'fake-hashing'
+INDEX_CACHE_MAX_ENTRIES = int(os.getenv('INDEX_CACHE_MAX_ENTRIES', '32'))
+INDEX_CACHE_MAX_MB = int(os.getenv('INDEX_CACHE_MAX_MB', '512'))
+# Index type: 'flat' (exact), 'ivf', 'hnsw', or 'auto' (flat below FAISS_ANN_MIN_VECTORS, else IVF)
+FAISS_INDEX_TYPE = os.getenv('FAISS_INDEX_TYPE', 'auto')
+FAISS_ANN_MIN_VECTORS = int(os.getenv('FAISS_ANN_MIN_VECTORS', '20000'))
+FAISS_NPROBE = int(os.getenv('FAISS_NPROBE', '16'))
+FAISS_EF_SEARCH = int(os.getenv('FAISS_EF_SEARCH', '64'))
+FAISS_HNSW_M = int(os.getenv('FAISS_HNSW_M', '32'))
+# Vector storage: 'none' (float32), 'fp16' (half), 'sq8' (int8 scalar quantizer) or 'pq' (product quantizer)
+FAISS_QUANTIZATION = os.getenv('FAISS_QUANTIZATION', 'none')
+# PQ sub-quantizers (bytes per vector); 0 picks about dim / 8
+FAISS_PQ_M = int(os.getenv('FAISS_PQ_M', '0'))
+# PQ needs this many vectors to train its 256-entry codebooks; smaller indexes use sq8 instead
+FAISS_PQ_MIN_VECTORS = int(os.getenv('FAISS_PQ_MIN_VECTORS', str(256 * 39)))
+# Re-rank quantized search results by exact distance to the stored Chunk.embedding vectors,
+# over FAISS_RERANK_FACTOR times as many candidates
+FAISS_RERANK = os.getenv('FAISS_RERANK', 'False') == 'True'
+FAISS_RERANK_FACTOR = int(os.getenv('FAISS_RERANK_FACTOR', '4'))
+# Open saved indexes with mmap so load is O(1) and workers share pages via the OS cache
+FAISS_MMAP = os.getenv('FAISS_MMAP', 'True') == 'True'
+# Retrieval: 'hybrid' (FAISS + BM25 fused by reciprocal rank), 'dense' or 'bm25'
+RETRIEVAL_MODE = os.getenv('RETRIEVAL_MODE', 'hybrid')
+RRF_K = int(os.getenv('RRF_K', '60'))
+# Each leg of a hybrid search ranks this many times top_k candidates before fusion
+HYBRID_CANDIDATES = int(os.getenv('HYBRID_CANDIDATES', '4'))
+# Chat completions in flight at once when answering a batch of questions
+BATCH_LLM_CONCURRENCY = int(os.getenv('BATCH_LLM_CONCURRENCY', '8'))
+# Query vectors kept per embedding model for repeated questions; 0 disables
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv('QUERY_EMBEDDING_CACHE_SIZE', '1024'))
+
+def choose_index_type(num_vectors, index_type=None):
+    """Resolve 'auto' to a concrete index type for a given collection size"""
+    index_type = (index_type or FAISS_INDEX_TYPE).lower()
+    if index_type == 'auto':
+        return 'flat' if num_vectors < FAISS_ANN_MIN_VECTORS else 'ivf'
+    if index_type not in ('flat', 'ivf', 'hnsw'):
+        raise ValueError(f"Unknown FAISS index type: {index_type}")
+    return index_type
+
+def choose_quantization(num_vectors, quantization=None):
+    """Resolve the vector storage mode for a collection size (pq needs enough vectors to train)"""
+    quantization = (quantization or FAISS_QUANTIZATION).lower()
+    if quantization not in ('none', 'fp16', 'sq8', 'pq'):
+        raise ValueError(f"Unknown FAISS quantization: {quantization}")
+    if quantization == 'pq' and num_vectors < FAISS_PQ_MIN_VECTORS:
+        return 'sq8'
+    return quantization
+
+def pq_subquantizers(dim):
+    """FAISS_PQ_M, or the largest divisor of dim up to dim / 8"""
+    if FAISS_PQ_M:
+        return FAISS_PQ_M
+    return max(m for m in range(1, max(1, dim // 8) + 1) if dim % m == 0)
+
+def make_index(dim, index_type, num_vectors=0, quantization='none'):
+    """Empty (untrained) FAISS index of the given type and vector storage"""
+    # 'np' skips polysemous training, which costs ~10x the PQ k-means and only helps Hamming-filtered search
+    codec = {'none': 'Flat', 'fp16': 'SQfp16', 'sq8': 'SQ8', 'pq': f"PQ{pq_subquantizers(dim)}np"}[quantization]
+    if index_type == 'ivf':
+        # ~4*sqrt(n) lists, keeping at least 39 training points per centroid
+        nlist = max(1, min(int(4 * np.sqrt(num_vectors)), num_vectors // 39))
+        return faiss.index_factory(dim, f"IVF{nlist},{codec}")
+    if index_type == 'hnsw':
+        separator = '_' if quantization == 'pq' else ','
+        return faiss.index_factory(dim, f"HNSW{FAISS_HNSW_M}{separator}{codec}")
+    if quantization == 'none':
+        return faiss.IndexFlatL2(dim)
+    return faiss.index_factory(dim, codec)
+
+def _vector_storage(index):
+    """The index that holds the vector codes (HNSW keeps them in a separate storage index)"""
+    if isinstance(index, faiss.IndexHNSW):
+        return faiss.downcast_index(index.storage)
+    return index
+
+def index_quantization(index):
+    storage = _vector_storage(index)
+    if isinstance(storage, (faiss.IndexScalarQuantizer, faiss.IndexIVFScalarQuantizer)):
+        return 'fp16' if storage.sq.qtype == faiss.ScalarQuantizer.QT_fp16 else 'sq8'
+    if isinstance(storage, (faiss.IndexPQ, faiss.IndexIVFPQ)):
+        return 'pq'
+    return 'none'
+
+def index_code_size(index):
+    """Bytes stored per vector (IVF lists also keep an 8-byte id per vector)"""
+    storage = _vector_storage(index)
+    ivf = faiss.try_extract_index_ivf(storage)
+    if ivf is not None:
+        return ivf.code_size + 8
+    return storage.sa_code_size()
+
+def _training_sample_size(index, num_vectors, quantization):
+    """Training points: 40 per IVF list for the coarse quantizer, plus enough for the vector codec"""
+    ivf = faiss.try_extract_index_ivf(index)
+    size = 40 * ivf.nlist if ivf is not None else 0
+    if quantization == 'pq':
+        size = max(size, FAISS_PQ_MIN_VECTORS)  # k-means per sub-quantizer; cost grows with the sample
+    elif quantization != 'none':
+        size = max(size, 50000)  # scalar quantizer value ranges: cheap to fit
+    return min(num_vectors, size)
+
+def _reconstruct_all(index):
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.make_direct_map()
+    return index.reconstruct_n(0, index.ntotal)
+
+# Optional callable: chunk ids -> {chunk_id: float32 vector}, set by the app to serve re-ranking
+_exact_vector_source = None
+
+def set_exact_vector_source(source):
+    global _exact_vector_source
+    _exact_vector_source = source
 
 class FaissStore:
-    def __init__(self, dim=384, index_path=None):
+    def __init__(self, dim=384, index_path=None, nprobe=None, ef_search=None):
         self.dim = dim
         self.index = faiss.IndexFlatL2(dim)
-        self.payloads = []  # Store metadata for each vector
+        self.payloads = PayloadStore()  # Store metadata for each vector
+        self.bm25 = None  # BM25Index over the payload texts, same positions as the vectors
         self.index_path = index_path
+        self.nprobe = nprobe or FAISS_NPROBE
+        self.ef_search = ef_search or FAISS_EF_SEARCH
+    
+    @property
+    def quantization(self):
+        return index_quantization(self.index)
+    
+    @property
+    def index_type(self):
+        if isinstance(self.index, faiss.IndexIVF):
+            return 'ivf'
+        if isinstance(self.index, faiss.IndexHNSW):
+            return 'hnsw'
+        return 'flat'
     
     def add(self, vectors, payloads):
         """Add vectors and their metadata to the index"""
         if len(vectors) != len(payloads):
             raise ValueError("Vectors and payloads must have the same length")
         
-        vectors_np = np.array(vectors).astype('float32')
+        # No copy when the caller already hands us contiguous float32
+        vectors_np = np.ascontiguousarray(vectors, dtype='float32')
         self.index.add(vectors_np)
         self.payloads.extend(payloads)
     
-    def search(self, query_vec, k=5):
-        """Search for similar vectors"""
-        query_vec_np = np.array([query_vec]).astype('float32')
-        distances, indices = self.index.search(query_vec_np, k)
+    def optimize(self, index_type=None, quantization=None):
+        """Convert the index to the configured ANN type and vector storage for its size, training if needed
+
+        Vectors are always added to an exact flat index first (incrementally, during
+        ingestion); this rebuilds it once all of them are known. Converting an index
+        that is already quantized starts from its approximate vectors.
+        """
+        n = self.index.ntotal
+        target = choose_index_type(n, index_type)
+        target_quantization = choose_quantization(n, quantization)
+        if (target, target_quantization) == (self.index_type, self.quantization) or n == 0:
+            return self
+        if self.quantization != 'none':
+            logger.warning(f"Re-encoding a {self.quantization} index as {target_quantization}: "
+                           f"vectors are approximate; rebuild from stored embeddings for exact ones")
+        
+        vectors = _reconstruct_all(self.index)
+        index = make_index(self.dim, target, len(vectors), target_quantization)
+        if not index.is_trained:
+            sample_size = _training_sample_size(index, len(vectors), target_quantization)
+            sample = np.random.default_rng(0).choice(len(vectors), sample_size, replace=False)
+            index.train(vectors[np.sort(sample)])
+        index.add(vectors)
+        self.index = index
+        return self
+    
+    def _search_params(self, nprobe=None, ef_search=None):
+        if self.index_type == 'ivf':
+            return faiss.SearchParametersIVF(nprobe=nprobe or self.nprobe)
+        if self.index_type == 'hnsw':
+            return faiss.SearchParametersHNSW(efSearch=ef_search or self.ef_search)
+        return None
+    
+    def search(self, query_vec, k=5, nprobe=None, ef_search=None):
+        """Search for similar vectors (nprobe/ef_search override the store's ANN settings)"""
+        return self.search_many([query_vec], k, nprobe, ef_search)[0]
+    
+    def search_many(self, query_vecs, k=5, nprobe=None, ef_search=None):
+        """search() for a matrix of queries in one FAISS call; one result list per row"""
+        query_vecs_np = np.ascontiguousarray(np.atleast_2d(query_vecs), dtype='float32')
+        rerank = FAISS_RERANK and _exact_vector_source is not None and self.quantization != 'none'
+        fetch = k * FAISS_RERANK_FACTOR if rerank else k
+        params = self._search_params(nprobe, ef_search)
+        if params is None:
+            distances, indices = self.index.search(query_vecs_np, fetch)
+        else:
+            distances, indices = self.index.search(query_vecs_np, fetch, params=params)
+        if rerank:
+            distances, indices = self._rerank(query_vecs_np, distances, indices, k)
+        
+        all_results = []
+        for row in range(len(query_vecs_np)):
+            results = []
+            for i, idx in enumerate(indices[row]):
+                if idx < len(self.payloads) and idx >= 0:
+                    payload = self.payloads[idx]
+                    results.append({
+                        'page': payload['page'],
+                        'chunk': payload['text'],
+                        'chunk_id': payload['chunk_id'],
+                        'position': int(idx),
+                        'distance': float(distances[row][i])
+                    })
+            all_results.append(results)
+        return all_results
+    
+    def _rerank(self, query_vecs, distances, indices, k):
+        """Exact L2 distances for the candidates whose stored embedding is available; top k of each row"""
+        chunk_ids = {self.payloads[idx]['chunk_id'] for idx in indices.ravel()
+                     if 0 <= idx < len(self.payloads)}
+        chunk_ids.discard(None)
+        try:
+            exact = _exact_vector_source(sorted(chunk_ids)) if chunk_ids else {}
+        except Exception as e:
+            logger.warning(f"Loading vectors for re-ranking failed ({e}); using quantized distances")
+            exact = {}
         
-        results = []
-        for i, idx in enumerate(indices[0]):
-            if idx < len(self.payloads) and idx >= 0:
-                results.append({
-                    'page': self.payloads[idx]['page'],
-                    'chunk': self.payloads[idx]['text'],
-                    'distance': float(distances[0][i])
-                })
-        return results
+        distances = distances.copy()
+        for row, query in enumerate(query_vecs):
+            for i, idx in enumerate(indices[row]):
+                if 0 <= idx < len(self.payloads):
+                    vector = exact.get(self.payloads[idx]['chunk_id'])
+                    if vector is not None:
+                        diff = query - vector
+                        distances[row, i] = float(diff @ diff)
+        # Unfilled slots (-1) sort last
+        order = np.argsort(np.where(indices < 0, np.inf, distances), axis=1, kind='stable')[:, :k]
+        return np.take_along_axis(distances, order, axis=1), np.take_along_axis(indices, order, axis=1)
     
     def save(self, path):
         """Save index to file"""
-        faiss.write_index(self.index, path)
-        # Save payloads separately
-        payloads_path = path.replace('.index', '_payloads.json')
-        with open(payloads_path, 'w') as f:
-            json.dump(self.payloads, f)
+        faiss.write_index(self.index, path + '.tmp')
+        os.replace(path + '.tmp', path)
+        # Save payloads separately, in the compact binary layout
+        self.payloads.save(payloads_path(path))
+        if self.bm25 is not None:
+            self.bm25.save(bm25_path(path))
+        legacy_path = legacy_payloads_path(path)
+        if os.path.exists(legacy_path):
+            os.remove(legacy_path)
     
     def load(self, path):
-        """Load index from file"""
+        """Load index from file (memory-mapped when FAISS_MMAP is on)"""
         if os.path.exists(path):
-            self.index = faiss.read_index(path)
-            payloads_path = path.replace('.index', '_payloads.json')
-            if os.path.exists(payloads_path):
-                with open(payloads_path, 'r') as f:
-                    self.payloads = json.load(f)
+            self.index = None
+            if FAISS_MMAP:
+                try:
+                    flags = getattr(faiss, 'IO_FLAG_MMAP_IFC', faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+                    self.index = faiss.read_index(path, flags)
+                except RuntimeError as e:
+                    logger.warning(f"mmap load of {path} failed ({e}); reading into memory")
+            if self.index is None:
+                self.index = faiss.read_index(path)
+            self.dim = self.index.d
+            self.index_path = path
+            payloads = load_payloads(path)
+            if payloads is not None:
+                self.payloads = payloads
+            if os.path.exists(bm25_path(path)):
+                self.bm25 = BM25Index.load(bm25_path(path))
+    
+    def nbytes(self):
+        """Approximate in-memory size: vector codes plus payload text"""
+        vector_bytes = self.index.ntotal * index_code_size(self.index)
+        if self.index_type == 'hnsw':
+            # Graph links: ~2*M neighbour ids per vector on the base layer
+            vector_bytes += self.index.ntotal * self.index.hnsw.nb_neighbors(0) * 4
+        bm25_bytes = self.bm25.nbytes() if self.bm25 is not None else 0
+        return vector_bytes + self.payloads.nbytes() + bm25_bytes
+
+# Loaded stores keyed by document id, validated against the index files' mtime/size
+_index_cache = LRUCache(
+    max_entries=INDEX_CACHE_MAX_ENTRIES,
+    max_bytes=INDEX_CACHE_MAX_MB * 1024 * 1024,
+    sizeof=lambda store: store.nbytes(),
+)
+
+def index_cache_stats():
+    """Hit/miss/eviction counters of the loaded-index cache"""
+    return _index_cache.stats()
 
 def get_embedding_model():
     """Get embedding model (OpenAI or local fallback)"""
-    api_key = os.getenv('OPENAI_API_KEY')
+    if EMBEDDING_PROVIDER == 'fake':
+        return get_model('fake', FAKE_EMBEDDING_MODEL), 'fake'
+    if EMBEDDING_PROVIDER == 'local':
+        return get_local_model(EMBEDDING_MODEL), 'local'
     
-    if api_key and not api_key.startswith(('your_', 'dummy_')):
-        try:
-            client = OpenAI(api_key=api_key)
-            logger.info("Using OpenAI for embeddings")
-            return client, 'openai'
-        except Exception as e:
-            logger.warning(f"OpenAI failed: {e}. Using local model.")
+    client = get_openai_client()
+    if client is not None:
+        return client, 'openai'
     
-    # Fallback to local model
-    model = SentenceTransformer(EMBEDDING_MODEL)
-    return model, 'local'
+    # Fallback to local model, loaded once per process
+    return get_local_model(EMBEDDING_MODEL), 'local'
 
 def get_llm_client():
     """Get OpenAI client for LLM"""
-    api_key = os.getenv('OPENAI_API_KEY')
-    if api_key and not api_key.startswith(('your_', 'dummy_')):
-        try:
-            return OpenAI(api_key=api_key)
-        except Exception as e:
-            logger.error(f"OpenAI client failed: {e}")
-    return None
+    if LLM_PROVIDER == 'fake':
+        return get_model('fake_llm')
+    return get_openai_client()
+
+def get_async_llm_client():
+    """Get AsyncOpenAI client for LLM calls from async views (one per event loop)"""
+    if LLM_PROVIDER == 'fake':
+        return get_model('fake_llm_async')
+    return get_async_openai_client()
+
+def embedding_model_name(model_type):
+    """Name the vectors of a provider are cached and keyed under"""
+    if model_type == 'openai':
+        return OPENAI_EMBEDDING_MODEL
+    if model_type == 'fake':
+        return FAKE_EMBEDDING_MODEL
+    return EMBEDDING_MODEL
 
-def embed_texts(texts):
-    """Generate embeddings for multiple texts"""
+def embed_texts(texts, cache=True):
+    """Generate embeddings for multiple texts
+
+    With cache=True, texts already embedded by the same model (in any document)
+    are served from the persistent embedding cache and only misses are sent
+    to the model, in one batch.
+    """
+    with span('embed_texts'):
+        return _embed_with_model(texts, cache)[0]
+
+def _embed_with_model(texts, cache=True):
+    """embed_texts, also returning the name of the model that produced the vectors"""
     model, model_type = get_embedding_model()
     
+    def embed(model_name, embed_fn):
+        if cache:
+            return embedding_cache.cached_embed(texts, model_name, embed_fn), model_name
+        return np.asarray(embed_fn(texts), dtype='float32'), model_name
+    
     if model_type == 'openai':
         try:
-            response = model.embeddings.create(
-                model="text-embedding-ada-002",
-                input=texts
-            )
-            return np.array([item.embedding for item in response.data])
+            def openai_request(batch):
+                response = model.embeddings.create(
+                    model=OPENAI_EMBEDDING_MODEL,
+                    input=batch
+                )
+                return np.array([item.embedding for item in response.data])
+            
+            def openai_embed(batch):
+                # Split into token-budgeted requests so large documents don't exceed API limits
+                return embed_in_batches(batch, openai_request)
+            return embed(OPENAI_EMBEDDING_MODEL, openai_embed)
         except Exception as e:
-            logger.warning(f"OpenAI embedding failed: {e}. Falling back to local model.")
-            model = SentenceTransformer(EMBEDDING_MODEL)
-            return model.encode(texts)
-    else:
-        # Local model
-        return model.encode(texts)
+            logger.error(f"OpenAI embedding of {len(texts)} texts failed: {e}. Falling back to local model.")
+    
+    if model_type == 'fake':
+        return embed(FAKE_EMBEDDING_MODEL, model.encode)
+    
+    # Local model
+    local_model = get_local_model(EMBEDDING_MODEL)
+    return embed(EMBEDDING_MODEL, local_model.encode)
 
-def build_or_load_index(document, chunks):
-    """Build or load FAISS index for a document"""
+# Question vectors, one LRU per embedding model name
+_query_caches = {}
+_query_caches_lock = threading.Lock()
+
+def _query_cache(model_name):
+    with _query_caches_lock:
+        cache = _query_caches.get(model_name)
+        if cache is None:
+            cache = _query_caches[model_name] = LRUCache(max_entries=QUERY_EMBEDDING_CACHE_SIZE)
+        return cache
+
+def normalize_question(question):
+    return embedding_cache.normalize(question).casefold()
+
+def embed_query(question):
+    """Embedding of a question, served from the per-model query cache when asked before"""
+    return embed_queries([question])[0]
+
+def embed_queries(questions):
+    """Embeddings of several questions (one row each): cached ones from the query cache,
+    the rest in a single embedding call"""
+    if QUERY_EMBEDDING_CACHE_SIZE <= 0:
+        return embed_texts(questions, cache=False)
+    
+    _, model_type = get_embedding_model()
+    cache = _query_cache(embedding_model_name(model_type))
+    keys = [normalize_question(question) for question in questions]
+    vectors = [cache.get(key) for key in keys]
+    
+    # Unique misses, in first-seen order
+    missing = {}
+    for key, question, vector in zip(keys, questions, vectors):
+        if vector is None and key not in missing:
+            missing[key] = question
+    
+    if missing:
+        # One-off texts, not worth a persistent cache write
+        with span('embed_query'):
+            embedded, used_model = _embed_with_model(list(missing.values()), cache=False)
+        fresh = {}
+        for key, vector in zip(missing, embedded):
+            vector = np.array(vector, dtype='float32')
+            vector.setflags(write=False)  # shared between requests
+            # Keyed by the model that actually answered, so a local fallback never poisons the OpenAI entries
+            _query_cache(used_model).put(key, vector)
+            fresh[key] = vector
+        vectors = [fresh[key] if vector is None else vector for key, vector in zip(keys, vectors)]
+    
+    return np.vstack(vectors).astype('float32', copy=False)
+
+def query_cache_stats():
+    """Hit/miss counters of the query embedding cache, per embedding model"""
+    with _query_caches_lock:
+        caches = dict(_query_caches)
+    return {model_name: cache.stats() for model_name, cache in caches.items()}
+
+def get_index_path(document):
     index_dir = os.path.join(settings.MEDIA_ROOT, 'indices')
     os.makedirs(index_dir, exist_ok=True)
+    return _index_path(document.id)
+
+def _index_path(document_id):
+    return os.path.join(settings.MEDIA_ROOT, 'indices', f"{document_id}.index")
+
+# <document id>.index and its side files, plus the .tmp files of an interrupted save
+INDEX_FILE_RE = re.compile(r'^(\d+)(\.index|_payloads\.bin|_payloads\.json|_bm25\.npz)(\.tmp(\.npz)?)?$')
+
+def index_files(index_path):
+    """Every file a saved index may have on disk"""
+    parts = [index_path, payloads_path(index_path), legacy_payloads_path(index_path), bm25_path(index_path)]
+    return parts + [index_path + '.tmp', payloads_path(index_path) + '.tmp', bm25_path(index_path) + '.tmp.npz']
+
+def delete_index(document_id):
+    """Remove a document's index files and drop it from the index cache; returns the bytes freed"""
+    _index_cache.invalidate(document_id)
+    freed = 0
+    for path in index_files(_index_path(document_id)):
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except FileNotFoundError:
+            continue
+        freed += size
+    return freed
+
+def _index_version(index_path):
+    """Cache version of an index: mtime and size of its files, or None if missing"""
+    try:
+        index_stat = os.stat(index_path)
+        try:
+            payload_stat = os.stat(payloads_path(index_path))
+        except FileNotFoundError:
+            payload_stat = os.stat(legacy_payloads_path(index_path))
+    except FileNotFoundError:
+        return None
+    return (index_stat.st_mtime_ns, index_stat.st_size,
+            payload_stat.st_mtime_ns, payload_stat.st_size)
+
+def load_index(document):
+    """Return the document's index from the in-process cache or disk, or None if not built"""
+    index_path = get_index_path(document)
+    version = _index_version(index_path)
+    if version is None:
+        return None
     
-    index_path = os.path.join(index_dir, f"{document.id}.index")
+    store = _index_cache.get(document.id, version)
+    if store is not None:
+        return store
     
-    # Check if index already exists
-    if os.path.exists(index_path):
-        store = FaissStore()
+    with span('index_load'):
+        store = FaissStore(index_path=index_path)
         store.load(index_path)
-        if len(store.payloads) > 0:
-            return store
+        if not store.payloads:
+            return None
+        if store.bm25 is None:
+            # Saved before BM25 existed: build it in memory (it is persisted on the next save)
+            store.bm25 = BM25Index.build([payload['text'] for payload in store.payloads])
+    _index_cache.put(document.id, store, version)
+    return store
+
+def build_or_load_index(document, chunks):
+    """Build or load FAISS index for a document"""
+    # Check if index already exists
+    store = load_index(document)
+    if store is not None:
+        return store
     
     # Build new index
     if not chunks:
@@ -127,48 +525,100 @@ def build_or_load_index(document, chunks):
     
     # Prepare texts and payloads
     texts = [chunk['text'] for chunk in chunks]
-    payloads = [{'page': chunk['page'], 'text': chunk['text']} for chunk in chunks]
+    payloads = [{'page': chunk['page'], 'text': chunk['text'], 'chunk_id': chunk.get('chunk_id')}
+                for chunk in chunks]
     
     # Generate embeddings
     vectors = embed_texts(texts)
     
+    return build_index(document, payloads, vectors)
+
+def build_index(document, payloads, vectors):
+    """Create, save and cache a document's index from precomputed vectors"""
+    vectors = np.asarray(vectors, dtype='float32')
+    
     # Create and populate index
     dim = vectors.shape[1]
-    store = FaissStore(dim=dim, index_path=index_path)
-    store.add(vectors.tolist(), payloads)
-    store.save(index_path)
-    
+    store = FaissStore(dim=dim)
+    store.add(vectors, payloads)
+    return save_index(document, store)
+
+def save_index(document, store, quantization=None):
+    """Write a populated store to the document's index path and cache it"""
+    index_path = get_index_path(document)
+    with span('index_save'):
+        store.optimize(quantization=quantization)
+        if store.bm25 is None or len(store.bm25) != len(store.payloads):
+            store.bm25 = BM25Index.build([payload['text'] for payload in store.payloads])
+        store.index_path = index_path
+        store.save(index_path)
+    _index_cache.put(document.id, store, _index_version(index_path))
     return store
 
-def retrieve_context(store, question, top_k=7):
-    """Retrieve relevant context for a question"""
-    # Embed the question
-    query_embedding = embed_texts([question])[0]
-    
-    # Search for similar content
-    results = store.search(query_embedding, k=top_k)
+def reciprocal_rank_fusion(rankings, k=None):
+    """Fuse ranked lists of positions: score = sum of 1 / (k + rank) over the lists"""
+    k = RRF_K if k is None else k
+    scores = {}
+    for ranking in rankings:
+        for rank, position in enumerate(ranking):
+            scores[position] = scores.get(position, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)
+
+def retrieve_context(store, question, top_k=7, mode=None, max_tokens=None):
+    """Retrieve relevant context for a question
+
+    In 'hybrid' mode the FAISS and BM25 rankings are fused with reciprocal rank
+    fusion; if the question can't be embedded (no embedding model available)
+    BM25 is used alone. The context is assembled by assemble_context: overlap
+    removed, neighbouring chunks merged, capped at max_tokens.
+    """
+    return retrieve_contexts(store, [question], top_k, mode, max_tokens)[0]
+
+def retrieve_contexts(store, questions, top_k=7, mode=None, max_tokens=None):
+    """retrieve_context for many questions: one embedding call and one FAISS search for all of them
+
+    Returns a (context, citations) pair per question, in order.
+    """
+    mode = (mode or RETRIEVAL_MODE).lower()
+    candidates = top_k * HYBRID_CANDIDATES if mode == 'hybrid' else top_k
     
-    # Prepare context and citations
-    context = ""
-    citations = []
+    rankings = [[] for _ in questions]
+    if mode in ('hybrid', 'dense'):
+        try:
+            query_embeddings = embed_queries(questions)
+            with span('faiss_search'):
+                results_per_question = store.search_many(query_embeddings, k=candidates)
+            for ranking, results in zip(rankings, results_per_question):
+                ranking.append([r['position'] for r in results])
+        except Exception as e:
+            if mode == 'dense' or store.bm25 is None:
+                raise
+            logger.warning(f"Query embedding failed ({e}); retrieving with BM25 only")
+    if mode in ('hybrid', 'bm25') and store.bm25 is not None:
+        with span('bm25_search'):
+            for ranking, question in zip(rankings, questions):
+                ranking.append([position for position, _ in store.bm25.search(question, k=candidates)])
     
-    for i, result in enumerate(results):
-        context += f"[p:{result['page']}] {result['chunk']}\n\n"
-        citations.append({
-            'page': result['page'],
-            'snippet': result['chunk'][:200] + '...' if len(result['chunk']) > 200 else result['chunk']
-        })
+    contexts = []
+    for ranking in rankings:
+        results = [{**store.payloads[position], 'position': position}
+                   for position in reciprocal_rank_fusion(ranking)[:top_k]]
+        with span('context_assembly'):
+            context, used = assemble_context(results, max_tokens)
+        
+        citations = []
+        for result in used:
+            citations.append({
+                'page': result['page'],
+                'chunk_id': result.get('chunk_id'),
+                'snippet': result['text'][:200] + '...' if len(result['text']) > 200 else result['text']
+            })
+        contexts.append((context, citations))
     
-    return context, citations
+    return contexts
 
-def ask_llm(question, context, history=None):
-    """Generate answer using OpenAI LLM with RAG context"""
-    client = get_llm_client()
-    
-    if not client:
-        return get_fallback_response(question, context)
-    
-    # Prepare messages
+def build_messages(question, context, history=None):
+    """Chat messages for a RAG question: system rules, recent history, context + question"""
     messages = [
         {
             "role": "system", 
@@ -182,9 +632,9 @@ def ask_llm(question, context, history=None):
         }
     ]
     
-    # Add conversation history
+    # Add conversation history (summary + latest exchanges, already bounded by conversation.history_messages)
     if history:
-        messages.extend(history[-6:])  # Last 3 exchanges
+        messages.extend(history)
     
     # Add current context and question
     messages.append({
@@ -196,41 +646,184 @@ Question: {question}
 
 Please answer based only on the document context above."""
     })
+    return messages
+
+def _cached_answer(question, context, history, cache_scope, chunk_ids, use_cache):
+    """(cache, query vector, cached answer or None) for an answer-cache lookup"""
+    if not (use_cache and ANSWER_CACHE_ENABLED and cache_scope is not None):
+        return None, None, None
+    cache = get_answer_cache()
+    query_vector = None
+    with span('answer_cache'):
+        if chunk_ids and cache.threshold > 0:
+            # Usually a query-cache hit after dense retrieval; BM25-only retrieval never embedded it
+            try:
+                query_vector = embed_query(question)
+            except Exception as e:
+                logger.warning(f"Query embedding failed ({e}); answer cache lookup is exact-match only")
+        answer, tier = cache.lookup(cache_scope, CHAT_MODEL, question, context, chunk_ids, query_vector, history)
+    if answer is not None:
+        logger.debug(f"Answer cache hit ({tier}) for {cache_scope!r}")
+    return cache, query_vector, answer
+
+def ask_llm(question, context, history=None, cache_scope=None, chunk_ids=None, use_cache=True):
+    """Generate answer using OpenAI LLM with RAG context
+
+    With a cache_scope (e.g. the document id), answers are served from and
+    stored in the answer cache: exactly, by question, context and history, or
+    semantically, by a close question vector over the same chunk_ids and history.
+    Fallback responses are never cached.
+    """
+    client = get_llm_client()
+    
+    if not client:
+        return get_fallback_response(question, context)
+    
+    cache, query_vector, answer = _cached_answer(question, context, history, cache_scope, chunk_ids, use_cache)
+    if answer is not None:
+        return answer
     
     try:
-        response = client.chat.completions.create(
-            model=CHAT_MODEL,
-            messages=messages,
-            max_tokens=500,
-            temperature=0.1
-        )
+        with span('llm'):
+            response = client.chat.completions.create(
+                model=CHAT_MODEL,
+                messages=build_messages(question, context, history),
+                max_tokens=500,
+                temperature=0.1
+            )
         
-        return response.choices[0].message.content.strip()
+        answer = response.choices[0].message.content.strip()
+        if cache is not None:
+            cache.store(cache_scope, CHAT_MODEL, question, context, answer, chunk_ids, query_vector, history)
+        return answer
     
     except Exception as e:
         logger.error(f"LLM error: {e}")
         return get_fallback_response(question, context, str(e))
 
+def ask_llm_batch(questions, contexts, cache_scope=None, chunk_ids=None, use_cache=True, concurrency=None):
+    """ask_llm for many (question, context) pairs, at most `concurrency` LLM calls at a time
+
+    chunk_ids, if given, is one list per question. Answers come back in question order.
+    """
+    chunk_ids = chunk_ids or [None] * len(questions)
+    concurrency = max(1, min(concurrency or BATCH_LLM_CONCURRENCY, len(questions) or 1))
+    
+    def answer(item):
+        question, context, ids = item
+        return ask_llm(question, context, cache_scope=cache_scope, chunk_ids=ids, use_cache=use_cache)
+    
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return list(pool.map(answer, zip(questions, contexts, chunk_ids)))
+
+async def aask_llm(question, context, history=None, cache_scope=None, chunk_ids=None, use_cache=True):
+    """ask_llm for async views: awaits AsyncOpenAI instead of holding a thread for the whole call"""
+    client = get_async_llm_client()
+    
+    if not client:
+        return get_fallback_response(question, context)
+    
+    cache, query_vector, answer = await run_blocking(_cached_answer, question, context, history,
+                                                     cache_scope, chunk_ids, use_cache)
+    if answer is not None:
+        return answer
+    
+    try:
+        with span('llm'):
+            response = await client.chat.completions.create(
+                model=CHAT_MODEL,
+                messages=build_messages(question, context, history),
+                max_tokens=500,
+                temperature=0.1
+            )
+        
+        answer = response.choices[0].message.content.strip()
+        if cache is not None:
+            cache.store(cache_scope, CHAT_MODEL, question, context, answer, chunk_ids, query_vector, history)
+        return answer
+    
+    except Exception as e:
+        logger.error(f"LLM error: {e}")
+        return get_fallback_response(question, context, str(e))
+
+def stream_llm(question, context, history=None, cache_scope=None, chunk_ids=None, use_cache=True):
+    """Like ask_llm, but yields the answer in pieces as the model produces them
+
+    Cached and fallback answers are yielded whole. If the stream breaks after
+    some text was sent, a short note is yielded instead of starting over.
+    """
+    client = get_llm_client()
+    
+    if not client:
+        yield get_fallback_response(question, context)
+        return
+    
+    cache, query_vector, answer = _cached_answer(question, context, history, cache_scope, chunk_ids, use_cache)
+    if answer is not None:
+        yield answer
+        return
+    
+    parts = []
+    started = perf_counter()
+    try:
+        stream = client.chat.completions.create(
+            model=CHAT_MODEL,
+            messages=build_messages(question, context, history),
+            max_tokens=500,
+            temperature=0.1,
+            stream=True
+        )
+        for event in stream:
+            if not event.choices:
+                continue
+            delta = event.choices[0].delta.content
+            if delta:
+                if not parts and METRICS_ENABLED:
+                    observe('llm_first_token', perf_counter() - started)
+                parts.append(delta)
+                yield delta
+    except Exception as e:
+        logger.error(f"LLM streaming error: {e}")
+        if parts:
+            yield f"\n\n[Note: answer interrupted - {e}]"
+        else:
+            yield get_fallback_response(question, context, str(e))
+        return
+    
+    if METRICS_ENABLED:
+        observe('llm_stream', perf_counter() - started)
+    answer = ''.join(parts).strip()
+    if cache is not None and answer:
+        cache.store(cache_scope, CHAT_MODEL, question, context, answer, chunk_ids, query_vector, history)
+
+def _best_sentences(passage, question, limit=2):
+    """The passage's sentences that best match the question (by BM25), in their original order"""
+    sentences = [x for x in re.split(r'(?<=[.!?])\s+', passage.replace('\n', ' ')) if x.strip()]
+    if len(sentences) <= limit:
+        return ' '.join(sentences)
+    ranked = BM25Index.build(sentences).search(question, k=limit)
+    keep = sorted(i for i, _ in ranked) or list(range(limit))
+    return ' '.join(sentences[i] for i in keep)
+
 def get_fallback_response(question, context, error_msg=None):
-    """Generate intelligent fallback response without OpenAI"""
-    # Simple keyword-based response
-    lines = context.split('\n')
-    relevant_info = []
-    
-    question_lower = question.lower()
-    for line in lines:
-        if any(keyword in line.lower() for keyword in question_lower.split()):
-            relevant_info.append(line)
-        elif len(relevant_info) < 3:  # Show some context
-            relevant_info.append(line)
+    """Generate intelligent fallback response without OpenAI
+
+    Ranks the context passages against the question with BM25 and quotes the
+    best sentences of the top few, keeping their [p:X] citations.
+    """
+    passages = [p.strip() for p in context.split('\n\n') if p.strip()]
+    ranked = BM25Index.build(passages).search(question, k=3) if passages else []
+    picked = [passages[i] for i, _ in ranked] or passages[:3]
     
     response = f"Based on the document:\n\n"
-    for info in relevant_info[:5]:
-        response += f"• {info}\n"
+    for passage in picked:
+        match = re.match(r'(\[[^\]]*\])\s*', passage)
+        cite, body = (match.group(1) + ' ', passage[match.end():]) if match else ('', passage)
+        response += f"• {cite}{_best_sentences(body, question)}\n"
     
     if error_msg:
         response += f"\n[Note: Fallback mode - {error_msg}]"
     else:
         response += "\n[Note: Using enhanced document analysis]"
     
-    return response
\ No newline at end of file
+    return response
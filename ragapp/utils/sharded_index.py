@@ -0,0 +1,349 @@
+# ragapp/utils/sharded_index.py - corpus-wide vector index keyed by Chunk primary key
+import os
+import json
+import heapq
+import threading
+import logging
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import faiss
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to the in-process lock only
+    fcntl = None
+
+from .lru import LRUCache
+
+logger = logging.getLogger(__name__)
+
+# A document always lives in one shard. merge_shards() packs small shards into shards of up
+# to this many vectors; shards with at least half as many are left alone
+CORPUS_SHARD_MAX_VECTORS = int(os.getenv('CORPUS_SHARD_MAX_VECTORS', '200000'))
+CORPUS_SEARCH_THREADS = int(os.getenv('CORPUS_SEARCH_THREADS', '4'))
+MANIFEST = 'manifest.json'
+
+
+class ShardedIndex:
+    """Vectors from many documents in IndexIDMap2 shards, searched with fan-out + top-k merge.
+
+    Layout under `root`:
+        manifest.json             dim and, per shard, {document id: vector count} and stale count
+        shard_0000.index          IndexIDMap2(IndexFlatL2) keyed by Chunk id
+        shard_0000_ids.npy        (chunk id, document id) rows sorted by chunk id
+
+    Each added document gets a shard of its own, so an ingest writes only its
+    own vectors and never rewrites a big shard. merge_shards() packs the small
+    shards together; corpus.add_document_to_corpus runs it once more than
+    CORPUS_MERGE_SMALL_SHARDS have piled up, so search fans out over few shards.
+
+    Removing a document only drops it from the manifest; its vectors stay in the
+    shard (filtered out at query time) until compact() or merge_shards() rewrites it.
+    """
+
+    _write_lock = threading.Lock()
+
+    def __init__(self, root):
+        self.root = root
+        self._shards = LRUCache(max_entries=64)
+
+    # -- manifest --
+
+    def _manifest_path(self):
+        return os.path.join(self.root, MANIFEST)
+
+    def manifest(self):
+        try:
+            with open(self._manifest_path()) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {'dim': None, 'shards': []}
+
+    def _write_manifest(self, manifest):
+        tmp_path = self._manifest_path() + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, self._manifest_path())
+
+    @contextmanager
+    def _locked(self):
+        """Serialize writers across threads and (where fcntl exists) across processes"""
+        os.makedirs(self.root, exist_ok=True)
+        with self._write_lock:
+            with open(os.path.join(self.root, MANIFEST + '.lock'), 'w') as lock_file:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    if fcntl:
+                        fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _shard_paths(self, name):
+        return (os.path.join(self.root, f"{name}.index"),
+                os.path.join(self.root, f"{name}_ids.npy"))
+
+    def _shard_bytes(self, name):
+        return sum(os.path.getsize(path) for path in self._shard_paths(name) if os.path.exists(path))
+
+    @staticmethod
+    def _next_shard_name(shards):
+        # Not len(shards): compaction drops emptied shards, so names can have gaps
+        last = max((int(shard['name'].rsplit('_', 1)[1]) for shard in shards), default=-1)
+        return f"shard_{last + 1:04d}"
+
+    # -- shard I/O --
+
+    def _load_shard(self, name):
+        index_path, ids_path = self._shard_paths(name)
+        stat = os.stat(index_path)
+        version = (stat.st_mtime_ns, stat.st_size)
+        shard = self._shards.get(name, version)
+        if shard is None:
+            flags = getattr(faiss, 'IO_FLAG_MMAP_IFC', faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+            index = faiss.read_index(index_path, flags)
+            ids = np.load(ids_path, mmap_mode='r')
+            shard = (index, ids)
+            self._shards.put(name, shard, version)
+        return shard
+
+    def _read_shard_for_write(self, name):
+        index_path, ids_path = self._shard_paths(name)
+        if not os.path.exists(index_path):
+            return None, np.zeros((0, 2), dtype=np.int64)
+        return faiss.read_index(index_path), np.load(ids_path)
+
+    def _write_shard(self, name, index, ids):
+        index_path, ids_path = self._shard_paths(name)
+        order = np.argsort(ids[:, 0], kind='stable')
+        np.save(ids_path + '.tmp.npy', np.ascontiguousarray(ids[order]))
+        faiss.write_index(index, index_path + '.tmp')
+        os.replace(ids_path + '.tmp.npy', ids_path)
+        os.replace(index_path + '.tmp', index_path)
+        self._shards.invalidate(name)
+
+    # -- writes --
+
+    def add_document(self, document_id, chunk_ids, vectors):
+        """Add (or replace) one document's vectors, keyed by their Chunk ids, in a new shard"""
+        vectors = np.ascontiguousarray(vectors, dtype='float32')
+        chunk_ids = np.asarray(chunk_ids, dtype=np.int64)
+        key = str(document_id)
+        with self._locked():
+            manifest = self.manifest()
+            if manifest['dim'] is None:
+                manifest['dim'] = int(vectors.shape[1])
+            elif manifest['dim'] != vectors.shape[1]:
+                raise ValueError(f"Corpus index holds {manifest['dim']}-d vectors, "
+                                 f"document {document_id} has {vectors.shape[1]}-d")
+            shards = manifest['shards']
+            # Re-adding a document: its old vectors become stale wherever they are
+            for shard in shards:
+                if key in shard['documents']:
+                    shard['stale'] += shard['documents'].pop(key)
+
+            name = self._next_shard_name(shards)
+            index = faiss.IndexIDMap2(faiss.IndexFlatL2(manifest['dim']))
+            index.add_with_ids(vectors, chunk_ids)
+            self._write_shard(name, index, np.column_stack([chunk_ids, np.full(len(chunk_ids), document_id)]))
+            shards.append({'name': name, 'documents': {key: len(chunk_ids)}, 'ntotal': int(index.ntotal), 'stale': 0})
+            self._write_manifest(manifest)
+
+    def remove_document(self, document_id):
+        """Hide a document from search; its vectors stay in the shard until it is rewritten"""
+        key = str(document_id)
+        if not os.path.exists(self._manifest_path()):
+            return False
+        with self._locked():
+            manifest = self.manifest()
+            removed = False
+            for shard in manifest['shards']:
+                if key in shard['documents']:
+                    shard['stale'] += shard['documents'].pop(key)
+                    removed = True
+            if removed:
+                self._write_manifest(manifest)
+            return removed
+
+    def compact(self, min_stale_fraction=0.0):
+        """Rewrite shards without the vectors of removed documents; returns the bytes reclaimed
+
+        Only shards whose stale share of vectors is above min_stale_fraction are
+        rewritten. Shards left with no live documents are deleted.
+        """
+        if not os.path.exists(self._manifest_path()):
+            return 0
+        reclaimed = 0
+        with self._locked():
+            manifest = self.manifest()
+            kept = []
+            for shard in manifest['shards']:
+                if not shard['stale'] or shard['stale'] <= min_stale_fraction * shard['ntotal']:
+                    kept.append(shard)
+                    continue
+                before = self._shard_bytes(shard['name'])
+                if not shard['documents']:
+                    for path in self._shard_paths(shard['name']):
+                        if os.path.exists(path):
+                            os.remove(path)
+                    self._shards.invalidate(shard['name'])
+                    reclaimed += before
+                    continue
+                index, ids = self._read_shard_for_write(shard['name'])
+                if index is None:
+                    kept.append(shard)
+                    continue
+                live = np.isin(ids[:, 1], [int(d) for d in shard['documents']])
+                index.remove_ids(faiss.IDSelectorBatch(np.ascontiguousarray(ids[~live, 0])))
+                self._write_shard(shard['name'], index, ids[live])
+                shard['ntotal'] = int(index.ntotal)
+                shard['stale'] = 0
+                reclaimed += before - self._shard_bytes(shard['name'])
+                kept.append(shard)
+            manifest['shards'] = kept
+            self._write_manifest(manifest)
+        if reclaimed:
+            logger.info(f"Compacted corpus index {self.root}: {reclaimed / 1024 / 1024:.1f} MiB reclaimed")
+        return reclaimed
+
+    def _live_vectors(self, shard):
+        """(chunk ids, document ids, vectors) of a shard's live documents"""
+        index, ids = self._read_shard_for_write(shard['name'])
+        if index is None:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), None
+        chunk_ids = faiss.vector_to_array(index.id_map)
+        vectors = faiss.downcast_index(index.index).reconstruct_n(0, index.ntotal)
+        document_ids = ids[np.searchsorted(ids[:, 0], chunk_ids), 1]
+        live = np.isin(document_ids, [int(d) for d in shard['documents']])
+        return chunk_ids[live], document_ids[live], vectors[live]
+
+    @staticmethod
+    def _is_small(shard):
+        return sum(shard['documents'].values()) < CORPUS_SHARD_MAX_VECTORS // 2
+
+    def small_shard_count(self):
+        """Shards merge_shards() would pack together"""
+        return sum(1 for shard in self.manifest()['shards'] if self._is_small(shard))
+
+    def merge_shards(self):
+        """Pack shards under half of CORPUS_SHARD_MAX_VECTORS into full ones; returns the shard count saved
+
+        Vectors of removed documents are dropped on the way. Shards at or above
+        the half-way mark are never rewritten, so repeated merges stay cheap.
+        """
+        if not os.path.exists(self._manifest_path()):
+            return 0
+        with self._locked():
+            manifest = self.manifest()
+            small = [shard for shard in manifest['shards'] if self._is_small(shard)]
+            if len(small) < 2:
+                return 0
+
+            groups, group, group_size = [], [], 0
+            for shard in small:
+                size = sum(shard['documents'].values())
+                if group and group_size + size > CORPUS_SHARD_MAX_VECTORS:
+                    groups.append(group)
+                    group, group_size = [], 0
+                group.append(shard)
+                group_size += size
+            groups.append(group)
+
+            shards = [shard for shard in manifest['shards'] if shard not in small]
+            retired = []
+            for group in groups:
+                if len(group) == 1 and not group[0]['stale']:
+                    shards.append(group[0])
+                    continue
+                parts = [self._live_vectors(shard) for shard in group]
+                parts = [part for part in parts if len(part[0])]
+                retired.extend(shard['name'] for shard in group)
+                if not parts:
+                    continue
+                chunk_ids = np.concatenate([part[0] for part in parts])
+                document_ids = np.concatenate([part[1] for part in parts])
+                index = faiss.IndexIDMap2(faiss.IndexFlatL2(manifest['dim']))
+                index.add_with_ids(np.vstack([part[2] for part in parts]), chunk_ids)
+                name = self._next_shard_name(manifest['shards'] + shards)
+                self._write_shard(name, index, np.column_stack([chunk_ids, document_ids]))
+                documents = {}
+                for shard in group:
+                    documents.update(shard['documents'])
+                shards.append({'name': name, 'documents': documents, 'ntotal': int(index.ntotal), 'stale': 0})
+
+            saved = len(manifest['shards']) - len(shards)
+            manifest['shards'] = shards
+            self._write_manifest(manifest)
+            for name in retired:
+                for path in self._shard_paths(name):
+                    if os.path.exists(path):
+                        os.remove(path)
+                self._shards.invalidate(name)
+        if saved:
+            logger.info(f"Merged {len(retired)} small corpus shards of {self.root} into {len(retired) - saved}")
+        return saved
+
+    # -- reads --
+
+    def _search_shard(self, shard, queries, k, wanted):
+        index, ids = self._load_shard(shard['name'])
+        live_docs = {int(d) for d in shard['documents']}
+        params = None
+        # Restrict to live, requested documents only when the shard holds anything else
+        if shard['stale'] or (wanted is not None and not live_docs <= wanted):
+            allowed_docs = live_docs if wanted is None else live_docs & wanted
+            allowed = ids[np.isin(ids[:, 1], list(allowed_docs)), 0]
+            if not len(allowed):
+                return []
+            params = faiss.SearchParameters(sel=faiss.IDSelectorBatch(np.ascontiguousarray(allowed)))
+        distances, found = index.search(queries, k, params=params)
+
+        results = []
+        for q in range(len(queries)):
+            hits = []
+            for distance, chunk_id in zip(distances[q], found[q]):
+                if chunk_id < 0:
+                    continue
+                row = np.searchsorted(ids[:, 0], chunk_id)
+                hits.append((float(distance), int(chunk_id), int(ids[row, 1])))
+            results.append(hits)
+        return results
+
+    def search(self, queries, k=5, document_ids=None):
+        """Top-k (distance, chunk id, document id) per query row, across every relevant shard"""
+        queries = np.ascontiguousarray(np.atleast_2d(queries), dtype='float32')
+        wanted = None if document_ids is None else {int(d) for d in document_ids}
+
+        jobs = []
+        for shard in self.manifest()['shards']:
+            live_docs = {int(d) for d in shard['documents']}
+            if not live_docs or (wanted is not None and not live_docs & wanted):
+                continue
+            jobs.append(shard)
+        if not jobs:
+            return [[] for _ in queries]
+
+        if len(jobs) == 1:
+            per_shard = [self._search_shard(jobs[0], queries, k, wanted)]
+        else:
+            # FAISS releases the GIL during search, so shards really run in parallel
+            with ThreadPoolExecutor(max_workers=min(CORPUS_SEARCH_THREADS, len(jobs))) as pool:
+                per_shard = list(pool.map(lambda shard: self._search_shard(shard, queries, k, wanted), jobs))
+
+        merged = []
+        for q in range(len(queries)):
+            candidates = (hit for shard_hits in per_shard if shard_hits for hit in shard_hits[q])
+            merged.append(heapq.nsmallest(k, candidates))
+        return merged
+
+    def stats(self):
+        manifest = self.manifest()
+        return {
+            'dim': manifest['dim'],
+            'shards': len(manifest['shards']),
+            'documents': sum(len(s['documents']) for s in manifest['shards']),
+            'vectors': sum(s['ntotal'] for s in manifest['shards']),
+            'stale_vectors': sum(s['stale'] for s in manifest['shards']),
+        }
@@ -0,0 +1,53 @@
+# ragapp/utils/tokens.py - token counting shared by batching, chunking and prompt budgets
+import os
+import threading
+import logging
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+TOKEN_ENCODING = os.getenv('TOKEN_ENCODING', 'cl100k_base')
+# Rough chars-per-token used when no tiktoken encoding can be loaded
+APPROX_CHARS_PER_TOKEN = 4
+
+_encoding = None
+_encoding_loaded = False
+_lock = threading.Lock()
+
+
+def get_encoding():
+    """Shared tiktoken encoding, or None if tiktoken (or its BPE file) is unavailable"""
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        with _lock:
+            if not _encoding_loaded:
+                if tiktoken is not None:
+                    try:
+                        _encoding = tiktoken.get_encoding(TOKEN_ENCODING)
+                    except Exception as e:
+                        logger.warning(f"tiktoken encoding {TOKEN_ENCODING} unavailable: {e}. "
+                                       f"Estimating token counts from length.")
+                _encoding_loaded = True
+    return _encoding
+
+
+def count_tokens(text):
+    encoding = get_encoding()
+    if encoding is None:
+        return max(1, len(text) // APPROX_CHARS_PER_TOKEN) if text else 0
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text, max_tokens):
+    """Cut text down to at most max_tokens tokens"""
+    encoding = get_encoding()
+    if encoding is None:
+        return text[:max_tokens * APPROX_CHARS_PER_TOKEN]
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max_tokens])
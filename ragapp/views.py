@@ -125,63 +125,74 @@ from .utils.rag import build_or_load_index, retrieve_context, ask_llm
 import os
 import uuid
 import json
+import time
+import logging
 from django.shortcuts import render
 from django.views.decorators.http import require_http_methods
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.conf import settings
+from django.urls import reverse
 from .forms import UploadForm
-from .models import Document, Chunk, ChatSession, ChatMessage
+from .models import Document, Chunk, ChatSession, ChatMessage, IngestionJob
+from .corpus import retrieve_corpus_context
+from .uploads import uploaded_file_sha256
+from .chat_history import load_history, aload_history, schedule_summary_update
+from .ingest import enqueue, run_job, rebuild_index_from_db, find_ingested_copy, reuse_document, job_status as ingest_job_status, INGEST_INLINE
 from .utils.pdf_loader import extract_pdf_text_with_pages
 from .utils.chunker import chunk_text
-from .utils.rag import build_or_load_index, retrieve_context, ask_llm
+from .utils.rag import build_or_load_index, load_index, retrieve_context, retrieve_contexts, ask_llm, ask_llm_batch, aask_llm, stream_llm, index_cache_stats, query_cache_stats
+from .utils.answer_cache import get_answer_cache
+from .utils.blocking import run_blocking
+from .utils.metrics import TIMINGS_IN_RESPONSE, span, timed_view, request_timings, render_histograms, render_samples
+
+logger = logging.getLogger(__name__)
+
+# Route /ask/ and /status/ to the async views; set when serving through pdfqa.asgi
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', 'False') == 'True'
+ASK_BATCH_MAX_QUESTIONS = int(os.getenv('ASK_BATCH_MAX_QUESTIONS', '100'))
+# Upper bound on a client-supplied top_k; each shard search and the context assembly scale with it
+ASK_CORPUS_MAX_TOP_K = int(os.getenv('ASK_CORPUS_MAX_TOP_K', '50'))
 
 @require_http_methods(["GET"])
 def index(request):
     return render(request, 'ragapp/index.html')
 
 @require_http_methods(["POST"])
+@timed_view('upload_pdf')
 def upload_pdf(request):
+    """Persist the PDF and queue it for ingestion; progress is polled via /status/<job>/"""
     form = UploadForm(request.POST, request.FILES)
     if form.is_valid():
         try:
-            doc = form.save()
-            os.makedirs(settings.MEDIA_ROOT, exist_ok=True)
-            
-            chunks = []
-            page_count = 0
+            # Hashed while the upload streamed in (see ragapp.uploads)
+            sha256 = uploaded_file_sha256(request, 'file')
+            existing = find_ingested_copy(sha256)
+            if existing is not None:
+                # Same PDF as an ingested document: share its chunks and index, new chat session
+                job = reuse_document(existing)
+                logger.info(f"Upload matches document {existing.id} ({sha256[:12]}); reusing its index")
+                return JsonResponse({
+                    'ok': True,
+                    'job_id': job.job_id,
+                    'status_url': reverse('job_status', args=[job.job_id]),
+                    'title': existing.title,
+                    'duplicate_of': existing.id,
+                    'session_id': job.session_id,
+                })
             
-            # Process PDF
-            for page_num, text in extract_pdf_text_with_pages(doc.file.path):
-                page_count = page_num
-                
-                # Smart chunking
-                text_chunks = chunk_text(text, chunk_size=800, chunk_overlap=150)
-                
-                for chunk_text_content in text_chunks:
-                    if chunk_text_content.strip():
-                        chunks.append({'page': page_num, 'text': chunk_text_content})
-                        Chunk.objects.create(
-                            document=doc, 
-                            page_num=page_num, 
-                            content=chunk_text_content
-                        )
-            
-            doc.num_pages = page_count
-            doc.save()
-            
-            # Build vector index
-            store = build_or_load_index(doc, chunks)
-            
-            # Start chat session
-            sid = uuid.uuid4().hex[:16]
-            ChatSession.objects.create(document=doc, session_id=sid)
+            with span('upload_save'):
+                doc = form.save(commit=False)
+                doc.sha256 = sha256
+                doc.save()
+            job = enqueue(doc)
+            if INGEST_INLINE:
+                run_job(job)
             
             return JsonResponse({
                 'ok': True, 
-                'session_id': sid, 
-                'title': doc.title, 
-                'num_pages': page_count,
-                'chunk_count': len(chunks)
+                'job_id': job.job_id, 
+                'status_url': reverse('job_status', args=[job.job_id]),
+                'title': doc.title
             })
             
         except Exception as e:
@@ -189,7 +200,7 @@ def upload_pdf(request):
                 doc.delete()
             return JsonResponse({
                 'ok': False, 
-                'error': f'PDF processing failed: {str(e)}'
+                'error': f'PDF upload failed: {str(e)}'
             })
     
     return JsonResponse({
@@ -197,7 +208,64 @@ def upload_pdf(request):
         'error': 'Invalid form data'
     })
 
+@require_http_methods(["GET"])
+def job_status(request, job_id):
+    """Per-stage progress of an ingestion job"""
+    try:
+        job = IngestionJob.objects.select_related('document').get(job_id=job_id)
+    except IngestionJob.DoesNotExist:
+        return JsonResponse({'ok': False, 'error': 'Unknown job'}, status=404)
+    return JsonResponse({'ok': True, **ingest_job_status(job)})
+
+@require_http_methods(["GET"])
+async def job_status_async(request, job_id):
+    """job_status for ASGI deployments"""
+    job = await IngestionJob.objects.select_related('document').filter(job_id=job_id).afirst()
+    if job is None:
+        return JsonResponse({'ok': False, 'error': 'Unknown job'}, status=404)
+    return JsonResponse({'ok': True, **ingest_job_status(job)})
+
+def _load_store(document):
+    """The document's index, loading or rebuilding it as needed"""
+    # Load index (cached in-process); only hit the chunk table if it must be rebuilt,
+    # preferring stored embeddings over calling the embedding model again
+    store = load_index(document)
+    if store is None:
+        with span('chunk_load'):
+            store = rebuild_index_from_db(document)
+    if store is None:
+        with span('chunk_load'):
+            chunks = []
+            for chunk in Chunk.objects.filter(document=document):
+                chunks.append({'page': chunk.page_num, 'text': chunk.content, 'chunk_id': chunk.id})
+        store = build_or_load_index(document, chunks)
+    
+    return store
+
+def _retrieve(document, question):
+    """Context and citations for a question"""
+    return retrieve_context(_load_store(document), question, top_k=5)
+
+def _prepare_answer(session, question):
+    """Retrieve context and recent history for a question in a chat session"""
+    document = session.document
+    context, citations = _retrieve(document, question)
+    
+    # Rolling summary plus the latest exchanges, within the history token budget
+    chat_history = load_history(session)
+    
+    return document, context, citations, chat_history
+
+def _with_timings(data, payload):
+    """Add the request's stage timings to a response payload if configured or asked for"""
+    if TIMINGS_IN_RESPONSE or data.get('timings') is True:
+        timings = request_timings()
+        if timings is not None:
+            payload['timings'] = timings
+    return payload
+
 @require_http_methods(["POST"])
+@timed_view('ask')
 def ask(request):
     """Handle chat questions using RAG"""
     try:
@@ -208,44 +276,257 @@ def ask(request):
         if not session_id or not question:
             return JsonResponse({'ok': False, 'error': 'Missing parameters'})
         
-        # Get session and document
         session = ChatSession.objects.get(session_id=session_id)
-        document = session.document
+        document, context, citations, chat_history = _prepare_answer(session, question)
         
-        # Get chunks from database
-        chunks = []
-        for chunk in Chunk.objects.filter(document=document):
-            chunks.append({'page': chunk.page_num, 'text': chunk.content})
+        # Generate answer ("cache": false in the request skips the answer cache)
+        answer = ask_llm(question, context, chat_history, cache_scope=document.id,
+                         chunk_ids=[c['chunk_id'] for c in citations],
+                         use_cache=data.get('cache', True) is not False)
         
-        # Build or load index
-        store = build_or_load_index(document, chunks)
+        # Save conversation
+        with span('save_message'):
+            ChatMessage.objects.create(
+                session=session,
+                question=question,
+                answer=answer
+            )
+        
+        response = JsonResponse(_with_timings(data, {
+            'ok': True, 
+            'answer': answer, 
+            'citations': citations
+        }))
+        # Summarizing older exchanges happens on the summary worker, after the answer is ready
+        schedule_summary_update(session)
+        return response
+        
+    except ChatSession.DoesNotExist:
+        return JsonResponse({'ok': False, 'error': 'Invalid session'})
+    except Exception as e:
+        return JsonResponse({'ok': False, 'error': str(e)})
+
+@require_http_methods(["POST"])
+@timed_view('ask')
+async def ask_async(request):
+    """ask for ASGI deployments: async ORM and LLM calls, blocking retrieval in a bounded pool"""
+    try:
+        data = json.loads(request.body)
+        session_id = data.get('session_id')
+        question = data.get('question')
         
-        # Retrieve context
-        context, citations = retrieve_context(store, question, top_k=5)
+        if not session_id or not question:
+            return JsonResponse({'ok': False, 'error': 'Missing parameters'})
         
-        # Get chat history
-        chat_history = []
-        for msg in ChatMessage.objects.filter(session=session).order_by('-created_at')[:6]:
-            chat_history.append({'role': 'user', 'content': msg.question})
-            chat_history.append({'role': 'assistant', 'content': msg.answer})
+        session = await ChatSession.objects.select_related('document').aget(session_id=session_id)
+        document = session.document
         
-        # Generate answer
-        answer = ask_llm(question, context, chat_history)
+        # FAISS search (and any index load or local encoding) runs off the event loop
+        context, citations = await run_blocking(_retrieve, document, question)
         
-        # Save conversation
-        ChatMessage.objects.create(
-            session=session,
-            question=question,
-            answer=answer
-        )
+        chat_history = await aload_history(session)
+        
+        answer = await aask_llm(question, context, chat_history, cache_scope=document.id,
+                                chunk_ids=[c['chunk_id'] for c in citations],
+                                use_cache=data.get('cache', True) is not False)
         
-        return JsonResponse({
+        with span('save_message'):
+            await ChatMessage.objects.acreate(
+                session=session,
+                question=question,
+                answer=answer
+            )
+        
+        response = JsonResponse(_with_timings(data, {
             'ok': True, 
             'answer': answer, 
             'citations': citations
-        })
+        }))
+        # Summarizing older exchanges happens on the summary worker, after the answer is ready
+        schedule_summary_update(session)
+        return response
         
     except ChatSession.DoesNotExist:
         return JsonResponse({'ok': False, 'error': 'Invalid session'})
     except Exception as e:
-        return JsonResponse({'ok': False, 'error': str(e)})
\ No newline at end of file
+        return JsonResponse({'ok': False, 'error': str(e)})
+
+def _sse(event, payload):
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+@require_http_methods(["POST"])
+def ask_stream(request):
+    """Like ask, but streams Server-Sent Events: citations, then answer tokens, then timings
+
+    Events: `citations` {citations}, `token` {text} (repeated), then `done`
+    {ttft_ms, total_ms} once the message is saved, or `error` {error}.
+    """
+    started = time.perf_counter()
+    try:
+        data = json.loads(request.body)
+        session_id = data.get('session_id')
+        question = data.get('question')
+        
+        if not session_id or not question:
+            return JsonResponse({'ok': False, 'error': 'Missing parameters'})
+        
+        session = ChatSession.objects.get(session_id=session_id)
+        document, context, citations, chat_history = _prepare_answer(session, question)
+    except ChatSession.DoesNotExist:
+        return JsonResponse({'ok': False, 'error': 'Invalid session'})
+    except Exception as e:
+        return JsonResponse({'ok': False, 'error': str(e)})
+    
+    tokens = stream_llm(question, context, chat_history, cache_scope=document.id,
+                        chunk_ids=[c['chunk_id'] for c in citations],
+                        use_cache=data.get('cache', True) is not False)
+    
+    def events():
+        yield _sse('citations', {'citations': citations})
+        parts = []
+        first_token_at = None
+        try:
+            for text in tokens:
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                parts.append(text)
+                yield _sse('token', {'text': text})
+            
+            # Save conversation once the whole answer is known
+            ChatMessage.objects.create(
+                session=session,
+                question=question,
+                answer=''.join(parts).strip()
+            )
+        except Exception as e:
+            logger.error(f"Streaming answer for session {session_id} failed: {e}")
+            yield _sse('error', {'error': str(e)})
+            return
+        
+        finished = time.perf_counter()
+        timings = {
+            'ttft_ms': round(((first_token_at or finished) - started) * 1000, 1),
+            'total_ms': round((finished - started) * 1000, 1),
+        }
+        logger.info(f"Streamed answer for session {session_id}: {timings}")
+        yield _sse('done', timings)
+        schedule_summary_update(session)
+    
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # don't let nginx buffer the stream
+    return response
+
+@require_http_methods(["POST"])
+@timed_view('ask_batch')
+def ask_batch(request):
+    """Answer many questions about a session's document in one request
+
+    Questions are retrieved together (one embedding call, one index search) and
+    answered with bounded LLM concurrency. Each question is answered on its
+    own: chat history is not used and nothing is added to it.
+    """
+    try:
+        data = json.loads(request.body)
+        session_id = data.get('session_id')
+        questions = data.get('questions')
+        
+        if not session_id or not questions:
+            return JsonResponse({'ok': False, 'error': 'Missing parameters'})
+        if not isinstance(questions, list) or not all(isinstance(q, str) and q.strip() for q in questions):
+            return JsonResponse({'ok': False, 'error': 'questions must be a list of non-empty strings'})
+        if len(questions) > ASK_BATCH_MAX_QUESTIONS:
+            return JsonResponse({'ok': False, 'error': f'At most {ASK_BATCH_MAX_QUESTIONS} questions per batch'})
+        
+        session = ChatSession.objects.select_related('document').get(session_id=session_id)
+        document = session.document
+        store = _load_store(document)
+        
+        retrieved = retrieve_contexts(store, questions, top_k=5)
+        answers = ask_llm_batch(questions, [context for context, _ in retrieved], cache_scope=document.id,
+                                chunk_ids=[[c['chunk_id'] for c in citations] for _, citations in retrieved],
+                                use_cache=data.get('cache', True) is not False)
+        
+        return JsonResponse(_with_timings(data, {
+            'ok': True,
+            'results': [
+                {'question': question, 'answer': answer, 'citations': citations}
+                for question, answer, (_, citations) in zip(questions, answers, retrieved)
+            ]
+        }))
+        
+    except ChatSession.DoesNotExist:
+        return JsonResponse({'ok': False, 'error': 'Invalid session'})
+    except Exception as e:
+        return JsonResponse({'ok': False, 'error': str(e)})
+
+@require_http_methods(["POST"])
+@timed_view('ask_corpus')
+def ask_corpus(request):
+    """Answer a question from a set of documents (or the whole library) via the corpus index"""
+    try:
+        data = json.loads(request.body)
+        question = data.get('question')
+        document_ids = data.get('document_ids')  # omit for every document
+        
+        if not question:
+            return JsonResponse({'ok': False, 'error': 'Missing parameters'})
+        if document_ids is not None and not isinstance(document_ids, list):
+            return JsonResponse({'ok': False, 'error': 'document_ids must be a list'})
+        try:
+            top_k = max(1, min(int(data.get('top_k', 7)), ASK_CORPUS_MAX_TOP_K))
+        except (TypeError, ValueError):
+            return JsonResponse({'ok': False, 'error': 'top_k must be an integer'}, status=400)
+        
+        context, citations = retrieve_corpus_context(question, document_ids=document_ids, top_k=top_k)
+        scope = ('corpus', tuple(sorted(int(d) for d in document_ids)) if document_ids else None)
+        answer = ask_llm(question, context, cache_scope=scope,
+                         chunk_ids=[c['chunk_id'] for c in citations],
+                         use_cache=data.get('cache', True) is not False)
+        
+        return JsonResponse(_with_timings(data, {
+            'ok': True, 
+            'answer': answer, 
+            'citations': citations
+        }))
+        
+    except Exception as e:
+        return JsonResponse({'ok': False, 'error': str(e)})
+
+@require_http_methods(["GET"])
+def cache_stats(request):
+    """Expose in-process cache counters for monitoring"""
+    return JsonResponse({
+        'ok': True,
+        'index_cache': index_cache_stats(),
+        'query_embedding_cache': query_cache_stats(),
+        'answer_cache': get_answer_cache().stats(),
+    })
+
+def _cache_samples():
+    """(labels, stats) for every in-process cache, answer cache hits split by tier"""
+    samples = [({'cache': 'index'}, index_cache_stats())]
+    for model_name, stats in query_cache_stats().items():
+        samples.append(({'cache': 'query_embedding', 'model': model_name}, stats))
+    answer = get_answer_cache().stats()
+    samples.append(({'cache': 'answer'}, {**answer, 'hits': answer['exact_hits'] + answer['semantic_hits']}))
+    return samples
+
+@require_http_methods(["GET"])
+def metrics(request):
+    """Stage/request latency histograms and cache counters in the Prometheus text format"""
+    caches = _cache_samples()
+    lines = render_histograms()
+    for field, metric_type, help_text in (
+        ('hits', 'counter', 'Cache lookups that found an entry'),
+        ('misses', 'counter', 'Cache lookups that found nothing'),
+        ('evictions', 'counter', 'Entries evicted to stay within the cache limits'),
+        ('entries', 'gauge', 'Entries currently cached'),
+    ):
+        metric = f"ragapp_cache_{field}_total" if metric_type == 'counter' else f"ragapp_cache_{field}"
+        lines += render_samples(metric, metric_type, help_text,
+                                [(labels, stats[field]) for labels, stats in caches if field in stats])
+    answer = caches[-1][1]
+    lines += render_samples('ragapp_answer_cache_hits_total', 'counter', 'Answer cache hits by tier',
+                            [({'tier': 'exact'}, answer['exact_hits']), ({'tier': 'semantic'}, answer['semantic_hits'])])
+    return HttpResponse('\n'.join(lines) + '\n', content_type='text/plain; version=0.0.4; charset=utf-8')